@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import pandas as pd
+from sqlmodel import Session, select, text
+from models import CursoAgregado
+from colunar import assinatura_aluno
+from contexto import calcular_referencial_nacional
+from motor_correcao import N_QUESTOES, ANULADAS
+from metricas import contar_linhas
+
+# --- BACKEND ANALÍTICO (SQLITE OU DUCKDB/PARQUET) ---
+# Ranking, benchmark e referencial nacional saem de um backend escolhido por
+# P360_BACKEND_ANALITICO. "sqlite" (padrão) lê as tabelas agregadas gravadas
+# pelo db_creator. "duckdb" lê aluno, gabarito, questaomapeamento e localidade
+# de arquivos Parquet (exportados pelo db_creator) e faz a correção - resposta
+# x gabarito por posição, anuladas contando como acerto - e os agrupamentos em
+# SQL colunar dentro de um DuckDB embutido, uma vez por versão dos dados.
+# duckdb é opcional (pip install -r requirements-duckdb.txt): sem o pacote ou
+# sem os arquivos (ou com eles desatualizados), a API segue no SQLite; qualquer
+# outro erro ao montar o DuckDB sobe e impede a inicialização.
+
+BACKEND_ANALITICO = os.environ.get("P360_BACKEND_ANALITICO", "sqlite").strip().lower()
+DIRETORIO_PARQUET = os.environ.get("P360_DIR_PARQUET", "dados_parquet")
+MANIFESTO = "manifesto.json"
+TABELAS_PARQUET = {
+    "aluno": "SELECT id, nu_ano, co_curso, co_caderno, ies_nome, enamed_ies, respostas FROM aluno ORDER BY id",
+    "gabarito": "SELECT id, co_caderno, respostas_gabarito FROM gabarito ORDER BY id",
+    "questaomapeamento": "SELECT co_caderno, nu_questao, grande_area, subespecialidade, diagnostico FROM questaomapeamento",
+    "localidade": "SELECT co_curso, sigla_estado FROM localidade",
+}
+
+class BackendSQLite:
+    nome = "sqlite"
+
+    def linhas_ranking(self, session: Session):
+        """(co_curso, ies_nome, acertos, total, sigla_estado) em ordem de importação - entrada do IndiceRanking."""
+        statement = select(CursoAgregado.co_curso, CursoAgregado.ies_nome, CursoAgregado.acertos,
+                           CursoAgregado.total, CursoAgregado.sigla_estado).order_by(CursoAgregado.id)
+        return session.exec(statement).all()
+
+    def somas_benchmark(self, cursos, session: Session):
+        """
+        ((acertos, total) nacional, (acertos, total) conceito 5, {co_curso: (acertos, total)});
+        None se não houver agregados.
+        """
+        statement = select(CursoAgregado.co_curso, CursoAgregado.enamed_ies, CursoAgregado.acertos, CursoAgregado.total)
+        agregados = session.exec(statement).all()
+        contar_linhas("cursoagregado", len(agregados))
+        if not agregados: return None
+        soma = lambda linhas: (sum(a[2] for a in linhas), sum(a[3] for a in linhas))
+        por_curso = {}
+        for a in agregados:
+            por_curso.setdefault(a[0], []).append(a)
+        return (soma(agregados), soma([a for a in agregados if a[1] == '5']),
+                {co_curso: soma(por_curso.get(co_curso, [])) for co_curso in cursos})
+
+    def referencial_nacional(self, session: Session):
+        return calcular_referencial_nacional(session)
+
+# Mesma correção de motor_correcao: só a-z vira maiúscula, respostas valem
+# com 100 posições (brancos à direita), posição em branco no gabarito vira " ",
+# anuladas contam como acerto e posições além do gabarito entram no total mas
+# nunca são acerto. As variantes aceitas de cada posição (letra maiúscula ou
+# minúscula, "" = resposta curta diante de um branco) saem do gabarito, que é
+# pequeno: a resposta do aluno é comparada crua, sem normalizar milhões de strings.
+_MINUSCULAS = "abcdefghijklmnopqrstuvwxyz"
+_MAIUSCULAS = _MINUSCULAS.upper()
+_POSICOES_GABARITO = ", ".join(
+    f"CASE WHEN {i} <= length(gab) THEN substr(gab, {i}, 1) END AS g{i}, "
+    f"CASE WHEN {i} > length(gab) THEN NULL WHEN substr(gab, {i}, 1) = ' ' THEN '' "
+    f"ELSE translate(substr(gab, {i}, 1), '{_MAIUSCULAS}', '{_MINUSCULAS}') END AS v{i}, "
+    f"{i} <= length(gab) AND contains('{ANULADAS.decode()}', substr(gab, {i}, 1)) AS n{i}"
+    for i in range(1, N_QUESTOES + 1))
+# Uma coluna de soma por questão (q1..q100) em uma única passada pelos alunos,
+# depois UNPIVOT para o formato longo: bem mais rápido que explodir alunos x 100 linhas.
+_ACERTOS_POR_QUESTAO = ", ".join(
+    f"sum(CASE WHEN g.n{i} OR substr(a.resp, {i}, 1) IN (g.g{i}, g.v{i}) THEN 1 ELSE 0 END) AS q{i}"
+    for i in range(1, N_QUESTOES + 1))
+SQL_CORRECAO = f"""
+CREATE TABLE gabarito_n AS
+SELECT co_caderno, left(regexp_replace(translate(respostas_gabarito, '{_MINUSCULAS}', '{_MAIUSCULAS}'), '\\s', ' ', 'g'), {N_QUESTOES}) AS gab
+FROM gabarito QUALIFY row_number() OVER (PARTITION BY co_caderno ORDER BY id DESC) = 1;
+
+CREATE TABLE gabarito_posicoes AS SELECT co_caderno, {_POSICOES_GABARITO} FROM gabarito_n;
+
+CREATE TABLE correcao_larga AS
+SELECT a.co_curso, trim(a.enamed_ies) AS enamed_ies, a.co_caderno, count(*) AS alunos, {_ACERTOS_POR_QUESTAO}
+FROM (SELECT co_curso, enamed_ies, co_caderno, coalesce(respostas, '') AS resp FROM aluno) AS a
+JOIN gabarito_posicoes AS g USING (co_caderno)
+GROUP BY ALL;
+
+CREATE TABLE correcao_questao AS
+SELECT co_curso, enamed_ies, co_caderno, CAST(substr(questao, 2) AS INTEGER) AS nu_questao, alunos, acertos
+FROM (UNPIVOT correcao_larga ON COLUMNS('^q[0-9]+$') INTO NAME questao VALUE acertos);
+DROP TABLE correcao_larga;
+DROP TABLE gabarito_posicoes;
+
+CREATE TABLE agregado_curso AS
+SELECT c.co_curso, c.enamed_ies, c.ies_nome, c.primeiro_id, coalesce(q.acertos, 0) AS acertos, c.total,
+       coalesce(l.sigla_estado, '') AS sigla_estado
+FROM (SELECT a.co_curso, trim(a.enamed_ies) AS enamed_ies, arg_min(a.ies_nome, a.id) AS ies_nome,
+             min(a.id) AS primeiro_id, count(g.co_caderno) * {N_QUESTOES} AS total
+      FROM aluno AS a LEFT JOIN gabarito_n AS g USING (co_caderno) GROUP BY ALL) AS c
+LEFT JOIN (SELECT co_curso, enamed_ies, sum(acertos) AS acertos FROM correcao_questao GROUP BY ALL) AS q
+       USING (co_curso, enamed_ies)
+LEFT JOIN (SELECT co_curso, any_value(sigla_estado) AS sigla_estado FROM localidade GROUP BY co_curso) AS l
+       USING (co_curso);
+"""
+
+class BackendDuckDB:
+    nome = "duckdb"
+
+    def __init__(self, diretorio=DIRETORIO_PARQUET):
+        import duckdb
+        self.diretorio = diretorio
+        self._conexao = duckdb.connect(":memory:")
+        self._lock = threading.Lock()  # a conexão DuckDB não é compartilhável entre threads
+        for tabela in TABELAS_PARQUET:
+            caminho = os.path.join(diretorio, f"{tabela}.parquet").replace("'", "''")
+            self._conexao.execute(f"CREATE VIEW {tabela} AS SELECT * FROM read_parquet('{caminho}')")
+        self._conexao.execute(SQL_CORRECAO)
+
+    def consultar(self, sql, parametros=None):
+        with self._lock:
+            return self._conexao.execute(sql, parametros or []).fetchall()
+
+    def linhas_ranking(self, session=None):
+        # Uma linha por curso, na ordem do primeiro aluno importado (a ordem de CursoAgregado)
+        return self.consultar("""
+            SELECT co_curso, arg_min(ies_nome, primeiro_id), sum(acertos), sum(total), arg_min(sigla_estado, primeiro_id)
+            FROM agregado_curso GROUP BY co_curso ORDER BY min(primeiro_id)""")
+
+    def somas_benchmark(self, cursos, session=None):
+        nacional = self.consultar("""
+            SELECT sum(acertos), sum(total), sum(acertos) FILTER (WHERE enamed_ies = '5'),
+                   sum(total) FILTER (WHERE enamed_ies = '5'), count(*)
+            FROM agregado_curso""")[0]
+        if not nacional[4]: return None
+        linhas = self.consultar("""
+            SELECT co_curso, sum(acertos), sum(total) FROM agregado_curso
+            WHERE co_curso IN (SELECT unnest(?::BIGINT[])) GROUP BY co_curso""", [list(cursos)])
+        por_curso = {co_curso: (int(a), int(t)) for co_curso, a, t in linhas}
+        inteiro = lambda v: int(v or 0)
+        return ((inteiro(nacional[0]), inteiro(nacional[1])), (inteiro(nacional[2]), inteiro(nacional[3])),
+                {co_curso: por_curso.get(co_curso, (0, 0)) for co_curso in cursos})
+
+    def referencial_nacional(self, session=None):
+        # Acertos por (caderno, questão) projetados no mapeamento; questão mapeada duas vezes conta duas vezes
+        linhas = self.consultar("""
+            SELECT m.grande_area, m.subespecialidade, m.diagnostico, sum(q.acertos), sum(q.alunos)
+            FROM (SELECT co_caderno, nu_questao, sum(acertos) AS acertos, sum(alunos) AS alunos
+                  FROM correcao_questao GROUP BY ALL) AS q
+            JOIN questaomapeamento AS m USING (co_caderno, nu_questao)
+            WHERE m.grande_area IS NOT NULL AND m.subespecialidade IS NOT NULL AND m.diagnostico IS NOT NULL
+            GROUP BY ALL ORDER BY ALL""")
+        if not linhas:
+            print("⚠️ Referencial vazio no DuckDB - confira os arquivos Parquet.")
+            return pd.DataFrame()
+        df = pd.DataFrame([(g, s, d, int(a), int(t)) for g, s, d, a, t in linhas],
+                          columns=['grande_area', 'subespecialidade', 'diagnostico', 'acerto', 'total'])
+        df = df[df['total'] > 0]
+        df['acerto'] = df['acerto'] / df['total']
+        return df.drop(columns='total')
+
+def exportar_parquet(session: Session, diretorio=DIRETORIO_PARQUET, chunksize=100_000):
+    """Grava as tabelas do backend DuckDB em Parquet (aluno em lotes, memória constante)."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    print("🦆 Exportando Parquet do backend analítico...")
+    linhas, max_id = assinatura_aluno(session)
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_manifesto = os.path.join(diretorio, MANIFESTO)
+    if os.path.exists(caminho_manifesto): os.remove(caminho_manifesto)
+    for tabela, sql in TABELAS_PARQUET.items():
+        temporario = os.path.join(diretorio, f"{tabela}.parquet.tmp")
+        escritor = None
+        for chunk in pd.read_sql(text(sql), session.connection(), chunksize=chunksize):
+            lote = pa.Table.from_pandas(chunk, preserve_index=False)
+            if escritor is None: escritor = pq.ParquetWriter(temporario, lote.schema)
+            escritor.write_table(lote.cast(escritor.schema))
+        if escritor is None:  # tabela vazia: arquivo só com o schema da query
+            colunas = session.connection().exec_driver_sql(sql + " LIMIT 0").keys()
+            pq.write_table(pa.table({c: pa.array([], pa.string()) for c in colunas}), temporario)
+        else:
+            escritor.close()
+        os.replace(temporario, os.path.join(diretorio, f"{tabela}.parquet"))
+    with open(caminho_manifesto, "w") as f:
+        json.dump({"linhas": linhas, "max_id": max_id}, f)
+    print(f"✅ {linhas} alunos exportados para {diretorio}/")
+
+def abrir_backend(session: Session, nome=BACKEND_ANALITICO, diretorio=DIRETORIO_PARQUET):
+    """O backend configurado; cai para o SQLite se o DuckDB não estiver instalado ou o Parquet não estiver em dia."""
+    if nome != "duckdb": return BackendSQLite()
+    try:
+        with open(os.path.join(diretorio, MANIFESTO)) as f:
+            manifesto = json.load(f)
+        if (manifesto["linhas"], manifesto["max_id"]) != assinatura_aluno(session):
+            print("⚠️ Parquet do backend analítico desatualizado - usando SQLite.")
+            return BackendSQLite()
+        return BackendDuckDB(diretorio)
+    except FileNotFoundError:
+        print(f"⚠️ Sem Parquet em {diretorio}/ (rode db_creator.py --parquet) - usando SQLite.")
+    except ImportError:
+        print("⚠️ Pacote duckdb não instalado (pip install -r requirements-duckdb.txt) - usando SQLite.")
+    return BackendSQLite()
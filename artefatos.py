@@ -0,0 +1,139 @@
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+# --- CACHE DE ARTEFATOS (PDF / EXCEL) ---
+# Relatórios só mudam quando o db_creator publica uma nova versão dos dados, então
+# ficam em disco com chave (endpoint, co_curso, versão). O diretório é compartilhado
+# entre workers; a remoção é LRU pelo mtime (atualizado a cada leitura) até caber
+# no limite de bytes.
+
+DIRETORIO_ARTEFATOS = os.environ.get("P360_DIR_ARTEFATOS", "cache_artefatos")
+LIMITE_ARTEFATOS_MB = int(os.environ.get("P360_CACHE_ARTEFATOS_MB", "512"))
+VERSAO_FORMATO = 2  # incrementar quando o layout do PDF/Excel mudar
+
+class CacheArtefatos:
+    def __init__(self, diretorio=DIRETORIO_ARTEFATOS, limite_bytes=LIMITE_ARTEFATOS_MB * 1024 * 1024):
+        self.diretorio = diretorio
+        self.limite_bytes = limite_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def etag(self, endpoint, co_curso, versao):
+        return f'"{endpoint}-{co_curso}-v{versao}-f{VERSAO_FORMATO}"'
+
+    def caminho(self, endpoint, co_curso, versao):
+        return os.path.join(self.diretorio, f"{endpoint}_{co_curso}_v{versao}_f{VERSAO_FORMATO}.bin")
+
+    def obter(self, endpoint, co_curso, versao):
+        """
+        Conteúdo do artefato se estiver no cache (e marca o uso para o LRU). Lê os
+        bytes de uma vez: a remoção LRU de outro worker não derruba uma resposta em curso.
+        """
+        caminho = self.caminho(endpoint, co_curso, versao)
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            os.utime(caminho)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dados
+
+    def gravar(self, endpoint, co_curso, versao, dados: bytes):
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = self.caminho(endpoint, co_curso, versao)
+        # Temporário único por gravação: threads do mesmo worker podem gravar o mesmo artefato
+        descritor, temporario = tempfile.mkstemp(dir=self.diretorio, prefix=os.path.basename(caminho) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(descritor, "wb") as f:
+                f.write(dados)
+            os.replace(temporario, caminho)
+        except BaseException:
+            try:
+                os.remove(temporario)
+            except FileNotFoundError:
+                pass
+            raise
+        self.evictar()
+        return caminho
+
+    def evictar(self):
+        arquivos = []
+        try:
+            with os.scandir(self.diretorio) as it:
+                for entrada in it:
+                    if entrada.name.endswith(".bin"):
+                        try:
+                            st = entrada.stat()
+                            arquivos.append((st.st_mtime, st.st_size, entrada.path))
+                        except FileNotFoundError:
+                            continue
+        except FileNotFoundError:
+            return
+        total = sum(a[1] for a in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_bytes: break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+def etag_confere(if_none_match, etag):
+    if not if_none_match: return False
+    candidatos = [t.strip() for t in if_none_match.split(",")]
+    return "*" in candidatos or etag in candidatos or f"W/{etag}" in candidatos
+
+def pregerar_pdfs(processos=None, cursos=None):
+    """
+    Gera o PDF de todos os cursos para a versão atual dos dados: os dados saem em
+    blocos (dados_pdf_lote, uma correção por bloco) e cada bloco é renderizado
+    em um processo do pool enquanto o próximo é preparado.
+    """
+    import main  # carrega contexto/caches da versão publicada
+    from sqlmodel import Session, select
+    from models import CursoAgregado
+    from relatorio_pdf import carregar_modelo, renderizar_lote
+
+    main.aquecer()
+    cache = main.CACHE_ARTEFATOS
+    versao = main.VERSAO_DADOS
+    with Session(main.engine) as session:
+        if cursos is None:
+            cursos = sorted(set(session.exec(select(CursoAgregado.co_curso)).all()))
+    pendentes = [c for c in cursos if not os.path.exists(cache.caminho("pdf", c, versao))]
+    print(f"🖨️ Pré-gerando {len(pendentes)} PDFs (versão {versao}, {len(cursos) - len(pendentes)} já em cache)...")
+
+    inicio, gerados, total = time.perf_counter(), 0, 0
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=processos or os.cpu_count(), mp_context=contexto,
+                             initializer=carregar_modelo) as pool:
+        futuros = {}
+        for i in range(0, len(pendentes), main.TAMANHO_BLOCO_LOTE):
+            bloco = pendentes[i:i + main.TAMANHO_BLOCO_LOTE]
+            try:
+                lista = main.com_sessao(main.dados_pdf_lote, bloco)
+            except Exception as e:
+                print(f"   ⚠️ Cursos {bloco[0]}..{bloco[-1]} ignorados: {e}")
+                continue
+            if not lista: continue
+            futuros[pool.submit(renderizar_lote, lista)] = [dados["co_curso"] for dados in lista]
+            total += len(lista)
+        for futuro in as_completed(futuros):
+            for co_curso, pdf in zip(futuros[futuro], futuro.result()):
+                cache.gravar("pdf", co_curso, versao, pdf)
+                gerados += 1
+            print(f"   Progresso: {gerados}/{total}...", end="\r")
+    print(f"\n✅ {gerados} PDFs gerados em {time.perf_counter() - inicio:.1f}s.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache de artefatos P360")
+    parser.add_argument("--processos", type=int, default=None, help="processos de renderização (padrão: nº de CPUs)")
+    parser.add_argument("--cursos", type=int, nargs="*", help="co_curso específicos (padrão: todos)")
+    args = parser.parse_args()
+    pregerar_pdfs(args.processos, args.cursos)
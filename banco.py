@@ -0,0 +1,85 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlmodel import SQLModel, create_engine
+from normalizacao import normalizar_municipio
+import models  # registra as tabelas no metadata
+
+# --- ENGINE DE LEITURA E MIGRAÇÃO DO SCHEMA ---
+
+SQLITE_MMAP_BYTES = int(os.environ.get("P360_SQLITE_MMAP", str(256 * 1024 * 1024)))
+SQLITE_CACHE_KB = int(os.environ.get("P360_SQLITE_CACHE_KB", str(64 * 1024)))
+POOL_SIZE = int(os.environ.get("P360_POOL_SIZE", "8"))
+POOL_OVERFLOW = int(os.environ.get("P360_POOL_OVERFLOW", "8"))
+
+def ativar_wal(engine):
+    """WAL é persistente no arquivo: leitores não bloqueiam (nem são bloqueados pelo) db_creator."""
+    with engine.connect() as conn:
+        return conn.exec_driver_sql("PRAGMA journal_mode=WAL").scalar()
+
+def exigir_banco(url):
+    """Falha com uma mensagem clara se o arquivo do banco não existe (conectar criaria um banco vazio)."""
+    caminho = make_url(url).database
+    if caminho and caminho != ":memory:" and not os.path.exists(caminho):
+        raise FileNotFoundError(f"Banco {os.path.abspath(caminho)} não encontrado - rode db_creator.py antes de subir a API.")
+
+def criar_engine_leitura(url):
+    """
+    Engine da API: pool de conexões somente-leitura (query_only) com mmap e
+    cache de páginas ajustados, para que requests concorrentes não se serializem.
+    """
+    exigir_banco(url)
+    temporaria = create_engine(url)
+    try:
+        ativar_wal(temporaria)
+    except Exception as e:
+        print(f"⚠️ Não foi possível ativar WAL: {e}")
+    finally:
+        temporaria.dispose()
+
+    engine = create_engine(
+        url,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_OVERFLOW,
+        pool_pre_ping=False,
+        connect_args={"check_same_thread": False, "timeout": 30},
+    )
+
+    @event.listens_for(engine, "connect")
+    def _pragmas_leitura(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+        cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA query_only=ON")
+        cur.close()
+
+    return engine
+
+def migrar(engine):
+    """
+    Cria tabelas/índices ausentes em bases antigas (create_all não mexe em tabelas
+    existentes), adiciona as colunas localidade.ies_munic_norm, aluno.acertos_bits e
+    gabarito.anuladas_bits e ativa WAL.
+    """
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        colunas = {linha[1] for linha in conn.exec_driver_sql("PRAGMA table_info(localidade)")}
+        if "ies_munic_norm" not in colunas:
+            print("🛠️ Adicionando localidade.ies_munic_norm...")
+            conn.exec_driver_sql("ALTER TABLE localidade ADD COLUMN ies_munic_norm VARCHAR NOT NULL DEFAULT ''")
+        for tabela, coluna in [("aluno", "acertos_bits"), ("gabarito", "anuladas_bits")]:
+            if coluna not in {linha[1] for linha in conn.exec_driver_sql(f"PRAGMA table_info({tabela})")}:
+                # Ficam NULL até o próximo db_creator.py --agregados; a API corrige na hora enquanto isso
+                print(f"🛠️ Adicionando {tabela}.{coluna}...")
+                conn.exec_driver_sql(f"ALTER TABLE {tabela} ADD COLUMN {coluna} BLOB")
+        pendentes = conn.exec_driver_sql("SELECT co_curso, ies_munic FROM localidade WHERE ies_munic_norm = ''").all()
+        if pendentes:
+            conn.exec_driver_sql("UPDATE localidade SET ies_munic_norm = ? WHERE co_curso = ?",
+                                 [(normalizar_municipio(munic), co_curso) for co_curso, munic in pendentes])
+
+        for tabela in SQLModel.metadata.sorted_tables:
+            for indice in tabela.indexes:
+                indice.create(conn, checkfirst=True)
+        conn.exec_driver_sql("ANALYZE")
+    ativar_wal(engine)
@@ -0,0 +1,224 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+import numpy as np
+
+# --- SUÍTE DE BENCHMARK ---
+# Mede a carga (db_creator), o aquecimento, o referencial nacional, cada rota
+# /ies/{co_curso}/* e a geração de Excel/PDF sobre uma base (de preferência a
+# do gerar_dados_sinteticos.py). Reporta percentis de latência, vazão e pico de
+# RSS e grava um JSON que pode ser comparado com o de outro commit (--comparar).
+
+DIRETORIO_REPO = os.path.dirname(os.path.abspath(__file__))
+
+def estatisticas(tempos):
+    tempos = np.asarray(tempos, dtype=float)
+    ms = lambda v: round(float(v) * 1000, 3)
+    return {
+        "n": int(len(tempos)),
+        "p50_ms": ms(np.percentile(tempos, 50)),
+        "p95_ms": ms(np.percentile(tempos, 95)),
+        "p99_ms": ms(np.percentile(tempos, 99)),
+        "media_ms": ms(tempos.mean()),
+        "min_ms": ms(tempos.min()),
+        "max_ms": ms(tempos.max()),
+        "vazao_ops_s": round(len(tempos) / tempos.sum(), 2) if tempos.sum() > 0 else None,
+    }
+
+def medir(fn, repeticoes, aquecimento=1):
+    for _ in range(aquecimento): fn()
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - inicio)
+    return tempos
+
+def alocacao_pico_kb(fn):
+    """Pico de memória alocada pelo Python durante uma chamada (tracemalloc)."""
+    tracemalloc.start()
+    try:
+        fn()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+def rss_pico_mb(quem=resource.RUSAGE_SELF):
+    return round(resource.getrusage(quem).ru_maxrss / 1024, 1)  # Linux: ru_maxrss em KB
+
+def commit_atual():
+    try:
+        return subprocess.run(["git", "-C", DIRETORIO_REPO, "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def etapa_carga(dados):
+    """db_creator completo em subprocesso (isola o pico de RSS da carga)."""
+    print("📦 Carga completa (db_creator)...")
+    inicio = time.perf_counter()
+    subprocess.run([sys.executable, os.path.join(DIRETORIO_REPO, "db_creator.py")], cwd=dados, check=True,
+                   stdout=subprocess.DEVNULL)
+    return {"tempo_s": round(time.perf_counter() - inicio, 3), "rss_pico_mb": rss_pico_mb(resource.RUSAGE_CHILDREN)}
+
+def escolher_cursos(session, quantidade):
+    """Cursos espalhados pelos quantis de tamanho (o maior, a mediana, os pequenos...)."""
+    from sqlmodel import select, func
+    from models import CursoAgregado
+    linhas = session.exec(select(CursoAgregado.co_curso, func.sum(CursoAgregado.alunos))
+                          .group_by(CursoAgregado.co_curso).order_by(func.sum(CursoAgregado.alunos).desc())).all()
+    if not linhas: return []
+    posicoes = np.unique(np.linspace(0, len(linhas) - 1, min(quantidade, len(linhas))).round().astype(int))
+    return [int(linhas[p][0]) for p in posicoes]
+
+def etapas_api(quantidade_cursos, repeticoes):
+    """Importa a API no diretório da base e mede cada etapa (a rota HTTP e a função por trás)."""
+    from fastapi.testclient import TestClient
+    from sqlmodel import Session
+    inicio = time.perf_counter()
+    import main
+    from relatorio_pdf import renderizar_pdf, renderizar_lote, ModeloRelatorio
+    resultados = {"importacao_main_s": round(time.perf_counter() - inicio, 3)}
+
+    with TestClient(main.app) as cliente:  # roda o lifespan (aquecimento)
+        resultados["inicializacao"] = main.METRICAS_INICIALIZACAO.copy()
+        with Session(main.engine) as session:
+            cursos = escolher_cursos(session, quantidade_cursos)
+            resultados["cursos"] = cursos
+            print(f"⏱️ Medindo {len(cursos)} cursos x {repeticoes} repetições...")
+
+            def referencial():
+                main.REFERENCIAL_CACHE = None
+                main.carregar_referencial_nacional(session)
+            def ranking():
+                main.RANKING_CACHE = None
+                main.carregar_indice_ranking(session)
+            def questoes():
+                main.QUESTOES_CACHE = None
+                main.carregar_estatisticas_questoes(session)
+            tempos = {"referencial_nacional": medir(referencial, repeticoes),
+                      "indice_ranking": medir(ranking, repeticoes),
+                      "estatisticas_questoes_carga": medir(questoes, max(repeticoes // 4, 1))}
+
+        def sem_memo(fn):
+            # Custo real de calcular: esvazia a memoização por curso antes de cada chamada
+            def chamar():
+                main.CACHE_RESULTADOS.limpar(main.VERSAO_DADOS)
+                return fn()
+            return chamar
+
+        def rota(caminho):
+            def chamar():
+                r = cliente.get(caminho)
+                if r.status_code != 200: raise RuntimeError(f"{caminho}: HTTP {r.status_code}")
+            return chamar
+
+        pdfs_dados = []
+        for co_curso in cursos:
+            for endpoint in ["matriz", "benchmark", "dashboard", "questoes"]:
+                tempos.setdefault(f"GET /ies/{{co_curso}}/{endpoint}", []).extend(
+                    medir(sem_memo(rota(f"/ies/{co_curso}/{endpoint}")), repeticoes))
+            tempos.setdefault("dashboard_memoizado", []).extend(
+                medir(rota(f"/ies/{co_curso}/dashboard"), repeticoes))
+            tempos.setdefault("GET /ranking", []).extend(medir(rota(f"/ranking?co_curso={co_curso}"), repeticoes))
+            # Artefatos medidos sem o cache em disco: o custo real de gerar
+            tempos.setdefault("excel_geracao", []).extend(
+                medir(sem_memo(lambda: main.com_sessao(main.exportar_excel, co_curso)), repeticoes))
+            dados = main.com_sessao(main.dados_pdf, co_curso)
+            tempos.setdefault("pdf_dados", []).extend(medir(sem_memo(lambda: main.com_sessao(main.dados_pdf, co_curso)), repeticoes))
+            tempos.setdefault("pdf_renderizacao", []).extend(medir(lambda: renderizar_pdf(dados), repeticoes))
+            # Custo sem o modelo do processo (imagens decodificadas a cada PDF, como antes do modelo)
+            tempos.setdefault("pdf_renderizacao_sem_modelo", []).extend(
+                medir(lambda: renderizar_pdf(dados, ModeloRelatorio()), max(repeticoes // 4, 1)))
+            pdfs_dados.append(dados)
+        resultados["pdf_alocacao_pico_kb"] = {
+            "modelo": alocacao_pico_kb(lambda: renderizar_pdf(pdfs_dados[0])),
+            "sem_modelo": alocacao_pico_kb(lambda: renderizar_pdf(pdfs_dados[0], ModeloRelatorio())),
+        } if pdfs_dados else {}
+        # Lote: tempo por PDF renderizando todos os cursos medidos com o mesmo modelo
+        tempos["pdf_lote_por_pdf"] = [t / len(pdfs_dados) for t in medir(lambda: renderizar_lote(pdfs_dados), repeticoes)] if pdfs_dados else []
+        tempos["GET /questoes/estatisticas"] = medir(rota("/questoes/estatisticas"), repeticoes)
+        tempos["GET /filtros/ufs"] = medir(rota("/filtros/ufs"), repeticoes)
+        tempos["GET /filtros/ies"] = medir(rota("/filtros/ies"), repeticoes)
+        tempos["GET /filtros/ies/buscar"] = medir(rota("/filtros/ies/buscar?q=univ%20fed"), repeticoes)
+
+        resultados["cache_resultados"] = main.CACHE_RESULTADOS.estatisticas()
+
+    resultados["etapas"] = {nome: estatisticas(t) for nome, t in tempos.items() if t}
+    resultados["rss_pico_mb"] = rss_pico_mb()
+    return resultados
+
+def comparar(atual, anterior):
+    print(f"\n📈 Comparação com {anterior['meta'].get('commit')} (p50 / p95, negativo = mais rápido)")
+    if anterior.get("api", {}).get("cursos") != atual.get("api", {}).get("cursos"):
+        print("   ⚠️ Conjuntos de cursos diferentes: use a mesma base e o mesmo --cursos para comparar.")
+    etapas_ant = anterior.get("api", {}).get("etapas", {})
+    for nome, est in atual.get("api", {}).get("etapas", {}).items():
+        ant = etapas_ant.get(nome)
+        if not ant: continue
+        delta = lambda k: (est[k] - ant[k]) / ant[k] * 100 if ant[k] else 0.0
+        print(f"   {nome:<32} {ant['p50_ms']:>9.2f} → {est['p50_ms']:>9.2f} ms ({delta('p50_ms'):+6.1f}%)"
+              f"   p95 {delta('p95_ms'):+6.1f}%")
+    for chave in ["carga", "api"]:
+        a, b = anterior.get(chave) or {}, atual.get(chave) or {}
+        if "rss_pico_mb" in a and "rss_pico_mb" in b:
+            print(f"   RSS pico ({chave}): {a['rss_pico_mb']} → {b['rss_pico_mb']} MB")
+
+def main(args):
+    dados = os.path.abspath(args.dados)
+    saida = os.path.abspath(args.saida)  # antes do chdir para a base
+    anterior = os.path.abspath(args.comparar) if args.comparar else None
+    if args.gerar:
+        from gerar_dados_sinteticos import gerar
+        gerar(dados, alunos=args.gerar, cadernos=args.cadernos, cursos=args.cursos_base)
+
+    resultado = {"meta": {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+        "dados": dados,
+        "repeticoes": args.repeticoes,
+    }}
+    if not args.sem_carga:
+        resultado["carga"] = etapa_carga(dados)
+        print(f"   Carga: {resultado['carga']['tempo_s']}s, pico {resultado['carga']['rss_pico_mb']} MB")
+
+    os.chdir(dados)  # main.py usa caminhos relativos (banco, armazém, imagens)
+    sys.path.insert(0, DIRETORIO_REPO)
+    resultado["api"] = etapas_api(args.cursos, args.repeticoes)
+
+    print(f"\n{'etapa':<34}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>10}")
+    for nome, est in resultado["api"]["etapas"].items():
+        print(f"{nome:<34}{est['p50_ms']:>10.2f}{est['p95_ms']:>10.2f}{est['p99_ms']:>10.2f}{est['vazao_ops_s'] or 0:>10.1f}")
+    print(f"RSS pico (API): {resultado['api']['rss_pico_mb']} MB")
+    if resultado["api"].get("pdf_alocacao_pico_kb"):
+        print(f"Alocação pico por PDF: {resultado['api']['pdf_alocacao_pico_kb']} KB")
+
+    with open(saida, "w") as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
+    print(f"💾 Resultados em {saida}")
+    if args.comparar:
+        with open(anterior) as f:
+            comparar(resultado, json.load(f))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark reprodutível da API P360")
+    parser.add_argument("--dados", default="dados_sinteticos", help="diretório com a base (CSV/XLSX e/ou banco já criado)")
+    parser.add_argument("--gerar", type=int, metavar="ALUNOS", help="gera antes uma base sintética com N alunos")
+    parser.add_argument("--cadernos", type=int, default=4, help="cadernos da base gerada")
+    parser.add_argument("--cursos-base", type=int, default=350, help="cursos da base gerada")
+    parser.add_argument("--sem-carga", action="store_true", help="reaproveita o banco existente (não roda o db_creator)")
+    parser.add_argument("--cursos", type=int, default=5, help="cursos medidos (espalhados por tamanho)")
+    parser.add_argument("--repeticoes", type=int, default=20)
+    parser.add_argument("--saida", default="benchmark_resultados.json")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    main(parser.parse_args())
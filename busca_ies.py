@@ -0,0 +1,125 @@
+from bisect import bisect_left
+import numpy as np
+from sqlmodel import Session, select
+from models import Aluno, Localidade
+from normalizacao import corrigir_mojibake, termos_busca, normalizar_municipio
+
+# --- ÍNDICE DE BUSCA DE IES ---
+# Construído uma vez por versão dos dados: os pares distintos (co_curso,
+# ies_nome) do aluno + UF/município da Localidade. O nome é reparado
+# (mojibake latin-1 -> utf-8) e dobrado (sem acentos, maiúsculo) uma única vez;
+# a busca por prefixo usa uma lista ordenada de (termo, entrada), então cada
+# termo digitado é um bisect + fatia, sem varrer nomes nem tocar no banco.
+#
+# Ordem dos resultados: código do curso exato > nome começando pela frase >
+# todos os termos inteiros no nome > termos como prefixo no nome > casou pelo
+# município/UF; empates pelo termo mais cedo no nome, nome mais curto, nome.
+
+POSICAO_FORA = 1 << 16
+NENHUM = 4
+
+class IndiceIES:
+    def __init__(self, pares, locais):
+        """
+        pares: tuplas (co_curso, ies_nome) distintas, como gravadas no aluno.
+        locais: tuplas (co_curso, sigla_estado, ies_munic, ies_munic_norm).
+        """
+        self.ufs = sorted({str(uf).strip().upper() for _, uf, _, _ in locais if uf})
+        self.locais = {}  # co_curso -> [(uf, municipio_norm)] (um curso pode ter mais de uma linha)
+        exibicao = {}
+        for co_curso, uf, munic, munic_norm in locais:
+            self.locais.setdefault(co_curso, []).append((uf, munic_norm))
+            exibicao.setdefault(co_curso, (str(uf or "").strip().upper(), str(munic or "").strip()))
+
+        # Ordem do SELECT ... ORDER BY ies_nome legado (texto gravado, byte a byte)
+        pares = sorted(pares, key=lambda p: (p[1] or "", p[0]))
+        self.co_curso = [p[0] for p in pares]
+        self.nome = [corrigir_mojibake(p[1]) for p in pares]
+        self.uf = [exibicao.get(p[0], ("", ""))[0] for p in pares]
+        self.municipio = [exibicao.get(p[0], ("", ""))[1] for p in pares]
+        self.termos_nome = [termos_busca(nome) for nome in self.nome]
+        self.frase = [" ".join(termos) for termos in self.termos_nome]
+        self.tamanho = np.array([len(nome) for nome in self.nome], dtype=np.int64)
+
+        # Lista invertida ordenada: (termo, entrada, origem, posição do termo no nome);
+        # origem 0 = nome, 1 = município/UF (posição POSICAO_FORA)
+        vocabulario = []
+        for i, termos in enumerate(self.termos_nome):
+            posicoes = {}
+            for k, termo in enumerate(termos): posicoes.setdefault(termo, k)
+            vocabulario.extend((termo, i, 0, k) for termo, k in posicoes.items())
+            for termo in set(termos_busca(self.municipio[i]) + termos_busca(self.uf[i])) - posicoes.keys():
+                vocabulario.append((termo, i, 1, POSICAO_FORA))
+        vocabulario.sort()
+        self.termos = [v[0] for v in vocabulario]
+        self.entradas = np.array([v[1] for v in vocabulario], dtype=np.int64)
+        self.origens = np.array([v[2] for v in vocabulario], dtype=np.int8)
+        self.posicoes = np.array([v[3] for v in vocabulario], dtype=np.int64)
+        self.comprimentos = np.array([len(v[0]) for v in vocabulario], dtype=np.int64)
+        self.uf_array = np.array(self.uf, dtype=object)
+        self.por_curso = {}
+        for i, co_curso in enumerate(self.co_curso): self.por_curso.setdefault(co_curso, []).append(i)
+
+    @classmethod
+    def construir(cls, session: Session):
+        pares = session.exec(select(Aluno.co_curso, Aluno.ies_nome).distinct()).all()
+        locais = session.exec(select(Localidade.co_curso, Localidade.sigla_estado,
+                                     Localidade.ies_munic, Localidade.ies_munic_norm)).all()
+        return cls([tuple(p) for p in pares], [tuple(l) for l in locais])
+
+    def __len__(self):
+        return len(self.co_curso)
+
+    def _casa_local(self, co_curso, uf, municipio_norm):
+        return any((uf is None or u == uf) and (municipio_norm is None or m == municipio_norm)
+                   for u, m in self.locais.get(co_curso, []))
+
+    def listar(self, uf=None, municipio=None):
+        """Mesmo resultado do /filtros/ies legado: pares (co_curso, nome) em ordem de nome."""
+        uf = uf.upper() if uf else None
+        municipio_norm = normalizar_municipio(municipio) if municipio else None
+        return [{"co_curso": self.co_curso[i], "nome": self.nome[i]}
+                for i in range(len(self))
+                if not (uf or municipio_norm) or self._casa_local(self.co_curso[i], uf, municipio_norm)]
+
+    def _prefixo(self, termo):
+        """Fatia da lista invertida com os termos que começam com `termo`."""
+        inicio = bisect_left(self.termos, termo)
+        return slice(inicio, bisect_left(self.termos, termo + "\uffff", inicio))
+
+    def buscar(self, q, uf=None, limite=10):
+        consulta = termos_busca(q)
+        codigo = int(q.strip()) if q.strip().isdigit() else None
+        if not consulta or not len(self): return []
+        n = len(self)
+
+        # Por entrada e termo digitado: melhor casamento (0 exato no nome, 1 prefixo no
+        # nome, 2 exato fora do nome, 3 prefixo fora do nome, NENHUM = não casou)
+        casou = np.ones(n, dtype=bool)
+        fora_do_nome = np.zeros(n, dtype=bool)
+        parcial = np.zeros(n, dtype=bool)
+        posicao = np.full(n, POSICAO_FORA, dtype=np.int64)
+        for k, termo in enumerate(consulta):
+            fatia = self._prefixo(termo)
+            melhor = np.full(n, NENHUM, dtype=np.int64)
+            chave = self.origens[fatia] * 2 + (self.comprimentos[fatia] != len(termo))
+            np.minimum.at(melhor, self.entradas[fatia], chave)
+            if k == 0: np.minimum.at(posicao, self.entradas[fatia], self.posicoes[fatia])
+            casou &= melhor < NENHUM
+            fora_do_nome |= (melhor >= 2) & (melhor < NENHUM)
+            parcial |= melhor % 2 == 1
+        if codigo is not None: casou[self.por_curso.get(codigo, [])] = True
+        if uf:
+            uf = uf.strip().upper()
+            casou &= self.uf_array == uf
+        candidatos = np.flatnonzero(casou)
+        if not len(candidatos): return []
+
+        frase = " ".join(consulta)
+        nivel = np.where(fora_do_nome[candidatos], 4, np.where(parcial[candidatos], 3, 2))
+        nivel[[j for j, i in enumerate(candidatos) if self.frase[i].startswith(frase)]] = 1
+        if codigo is not None: nivel[[j for j, i in enumerate(candidatos) if self.co_curso[i] == codigo]] = 0
+        # entradas já estão em ordem de nome: o índice desempata por nome e curso
+        ordem = np.lexsort((candidatos, self.tamanho[candidatos], posicao[candidatos], nivel))[:limite]
+        return [{"co_curso": self.co_curso[i], "nome": self.nome[i], "uf": self.uf[i],
+                 "municipio": self.municipio[i]} for i in candidatos[ordem].tolist()]
@@ -0,0 +1,149 @@
+import json
+import os
+import sys
+import numpy as np
+from sqlmodel import Session, create_engine, text
+from motor_correcao import N_QUESTOES, N_BYTES_BITS, respostas_para_matriz, montar_gabaritos, assinatura_gabaritos, bytes_para_bits
+
+# --- ARMAZÉM COLUNAR (MEMORY-MAPPED) ---
+# Exporta aluno para colunas binárias de largura fixa (.npy), ordenadas por
+# co_curso. A API abre os arquivos com mmap somente-leitura: todos os workers
+# do uvicorn compartilham a mesma cópia no page cache do sistema operacional.
+# acertos_bits (13 bytes por aluno) é a correção gravada pelo db_creator; o
+# manifesto guarda a assinatura dos gabaritos com que ela foi feita e a versão
+# dos dados (VersaoDados) que o armazém reflete. Contagem e maior id não bastam:
+# o SQLite reaproveita rowids quando a partição de maior id é apagada e recarregada.
+
+DIRETORIO_COLUNAR = os.environ.get("P360_DIR_COLUNAR", "dados_colunares")
+MANIFESTO = "manifesto.json"
+ESCOPOS_ARMAZEM = ("completo", "aluno", "gabarito")  # versões que mudam respostas ou correção
+COLUNAS = {
+    "aluno_id": np.int64,
+    "co_curso": np.int64,
+    "co_caderno": np.int32,
+    "enamed_ies": "S8",
+    "respostas": np.uint8,
+    "acertos_bits": np.uint8,
+    "corrigido": np.bool_,
+}
+LARGURAS = {"respostas": N_QUESTOES, "acertos_bits": N_BYTES_BITS}
+
+def assinatura_aluno(session: Session):
+    """(linhas, maior id) da tabela aluno - usado para detectar arquivos desatualizados."""
+    linhas, max_id = session.exec(text("SELECT COUNT(*), COALESCE(MAX(id), 0) FROM aluno")).one()
+    return int(linhas), int(max_id)
+
+def versao_aluno(session: Session):
+    """Última versão publicada que trocou alunos ou gabaritos (0 em bases sem VersaoDados)."""
+    try:
+        versoes = session.exec(text("SELECT versao, escopo FROM versaodados ORDER BY versao DESC")).all()
+    except Exception:
+        return 0
+    for versao, escopo in versoes:
+        if any(json.loads(escopo).get(chave) for chave in ESCOPOS_ARMAZEM): return int(versao)
+    return 0
+
+def exportar_colunas(session: Session, diretorio=DIRETORIO_COLUNAR, chunksize=100_000):
+    """
+    Exporta o armazém carimbado com a versão atual dos alunos. O db_creator, que
+    exporta antes de publicar a versão nova, recarimba com carimbar_versao.
+    Retorna o nº de alunos exportados.
+    """
+    print("🧱 Exportando armazém colunar...")
+    linhas, max_id = assinatura_aluno(session)
+    gabaritos = montar_gabaritos({c: list(g) for c, g in session.exec(text("SELECT co_caderno, respostas_gabarito FROM gabarito")).all()})
+    if linhas == 0:
+        print("⚠️ Tabela aluno vazia - nada a exportar.")
+        return 0
+    os.makedirs(diretorio, exist_ok=True)
+
+    arquivos = {}
+    for nome, dtype in COLUNAS.items():
+        forma = (linhas, LARGURAS[nome]) if nome in LARGURAS else (linhas,)
+        caminho = os.path.join(diretorio, f"{nome}.npy.tmp")
+        arquivos[nome] = np.lib.format.open_memmap(caminho, mode="w+", dtype=dtype, shape=forma)
+
+    # Cursor em lotes: a memória fica constante, independente do tamanho da base
+    query = text("SELECT id, co_curso, co_caderno, enamed_ies, respostas, acertos_bits FROM aluno ORDER BY co_curso, id")
+    resultado = session.connection().execution_options(stream_results=True).execute(query)
+    inicio = 0
+    while True:
+        lote = resultado.fetchmany(chunksize)
+        if not lote: break
+        fim = inicio + len(lote)
+        ids, cursos, cadernos, conceitos, respostas, bits = zip(*lote)
+        arquivos["aluno_id"][inicio:fim] = ids
+        arquivos["co_curso"][inicio:fim] = cursos
+        arquivos["co_caderno"][inicio:fim] = cadernos
+        arquivos["enamed_ies"][inicio:fim] = [str(c).strip().encode('latin-1', 'replace') for c in conceitos]
+        arquivos["respostas"][inicio:fim] = respostas_para_matriz(respostas)
+        arquivos["acertos_bits"][inicio:fim], arquivos["corrigido"][inicio:fim] = bytes_para_bits(bits)
+        inicio = fim
+
+    for arr in arquivos.values(): arr.flush()
+    arquivos.clear()
+    # Troca atômica: workers com os arquivos antigos mapeados continuam válidos.
+    # O manifesto sai antes e volta por último, então nunca valida colunas pela metade.
+    caminho_manifesto = os.path.join(diretorio, MANIFESTO)
+    if os.path.exists(caminho_manifesto): os.remove(caminho_manifesto)
+    for nome in COLUNAS:
+        os.replace(os.path.join(diretorio, f"{nome}.npy.tmp"), os.path.join(diretorio, f"{nome}.npy"))
+    with open(caminho_manifesto, "w") as f:
+        json.dump({"linhas": linhas, "max_id": max_id, "n_questoes": N_QUESTOES, "versao": versao_aluno(session),
+                   "assinatura_gabarito": assinatura_gabaritos(gabaritos)}, f)
+    print(f"✅ {linhas} alunos exportados para {diretorio}/")
+    return linhas
+
+def carimbar_versao(versao, diretorio=DIRETORIO_COLUNAR):
+    """Marca o armazém recém-exportado com a versão que o db_creator está publicando."""
+    caminho_manifesto = os.path.join(diretorio, MANIFESTO)
+    with open(caminho_manifesto) as f:
+        manifesto = json.load(f)
+    manifesto["versao"] = versao
+    temporario = f"{caminho_manifesto}.tmp"
+    with open(temporario, "w") as f:
+        json.dump(manifesto, f)
+    os.replace(temporario, caminho_manifesto)
+
+class ArmazemColunar:
+    def __init__(self, diretorio, manifesto):
+        self.diretorio = diretorio
+        self.manifesto = manifesto
+        for nome in COLUNAS:
+            setattr(self, nome, np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode="r"))
+
+    def intervalo_curso(self, co_curso):
+        """Busca binária em co_curso ordenado: linhas [ini, fim) do curso."""
+        return (int(np.searchsorted(self.co_curso, co_curso, side="left")),
+                int(np.searchsorted(self.co_curso, co_curso, side="right")))
+
+    def fatia_curso(self, co_curso):
+        """Fatia (views zero-copy) dos alunos de um curso: ids, cadernos e respostas."""
+        ini, fim = self.intervalo_curso(co_curso)
+        return self.aluno_id[ini:fim], self.co_caderno[ini:fim], self.respostas[ini:fim]
+
+    def bits_validos(self, gabaritos):
+        """Os bits servem se foram gravados com estes gabaritos (senão, recorrigir a partir das respostas)."""
+        return self.manifesto.get("assinatura_gabarito") == assinatura_gabaritos(gabaritos)
+
+def abrir_armazem(session: Session, diretorio=DIRETORIO_COLUNAR):
+    """Abre o armazém se existir e estiver em dia com o SQLite; caso contrário retorna None."""
+    try:
+        with open(os.path.join(diretorio, MANIFESTO)) as f:
+            manifesto = json.load(f)
+        if (manifesto.get("versao") != versao_aluno(session) or manifesto["n_questoes"] != N_QUESTOES
+                or (manifesto["linhas"], manifesto["max_id"]) != assinatura_aluno(session)):
+            print("⚠️ Armazém colunar desatualizado - usando SQLite.")
+            return None
+        return ArmazemColunar(diretorio, manifesto)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Armazém colunar indisponível ({e}) - usando SQLite.")
+        return None
+
+if __name__ == "__main__":
+    # Exportação sob demanda: python colunar.py [sqlite_url]
+    url = sys.argv[1] if len(sys.argv) > 1 else "sqlite:///plataforma_educacional.db"
+    with Session(create_engine(url)) as session:
+        exportar_colunas(session)
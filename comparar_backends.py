@@ -0,0 +1,90 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+from sqlmodel import Session, create_engine
+from analitico import BackendSQLite, BackendDuckDB, exportar_parquet, DIRETORIO_PARQUET
+from ranking import IndiceRanking
+from benchmark import estatisticas, medir, rss_pico_mb, DIRETORIO_REPO
+
+# --- EQUIVALÊNCIA E BENCHMARK DOS BACKENDS ANALÍTICOS ---
+# Roda ranking, benchmark e referencial nacional nos dois backends sobre a
+# mesma base e exige resultados idênticos (ranking e somas exatos, médias do
+# referencial até 1e-12). Depois mede cada operação nos dois. Sai com código 1
+# se houver divergência. Ex.: python comparar_backends.py --gerar 1000000
+
+def resultados(backend, cursos, session):
+    ranking = IndiceRanking(backend.linhas_ranking(session))
+    referencial = backend.referencial_nacional(session)
+    return {
+        "ranking": ranking.nacional,
+        "ranking_uf": ranking.por_uf,
+        "benchmark": backend.somas_benchmark(cursos, session),
+        "referencial": referencial.set_index(["grande_area", "subespecialidade", "diagnostico"])["acerto"].sort_index(),
+    }
+
+def divergencias(a, b):
+    erros = [chave for chave in ["ranking", "ranking_uf", "benchmark"] if a[chave] != b[chave]]
+    ref_a, ref_b = a["referencial"], b["referencial"]
+    if not ref_a.index.equals(ref_b.index) or not np.allclose(ref_a.to_numpy(), ref_b.to_numpy(), rtol=0, atol=1e-12):
+        erros.append("referencial")
+    return erros
+
+def main(args):
+    dados = os.path.abspath(args.dados)
+    if args.gerar:
+        from gerar_dados_sinteticos import gerar
+        gerar(dados, alunos=args.gerar, cadernos=args.cadernos, cursos=args.cursos_base)
+        print("📦 Carga completa (db_creator)...")
+        subprocess.run([sys.executable, os.path.join(DIRETORIO_REPO, "db_creator.py")], cwd=dados, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    engine = create_engine(f"sqlite:///{os.path.join(dados, 'plataforma_educacional.db')}")
+    diretorio = os.path.join(dados, DIRETORIO_PARQUET)
+    relatorio = {"dados": dados, "etapas": {}}
+    with Session(engine) as session:
+        inicio = time.perf_counter()
+        exportar_parquet(session, diretorio)
+        relatorio["exportacao_parquet_s"] = round(time.perf_counter() - inicio, 3)
+
+        sqlite = BackendSQLite()
+        tempos_abertura = medir(lambda: BackendDuckDB(diretorio), max(args.repeticoes // 5, 1), aquecimento=0)
+        duckdb = BackendDuckDB(diretorio)  # correção + agregados materializados por versão dos dados
+        cursos = [item["co_curso"] for item in IndiceRanking(sqlite.linhas_ranking(session)).nacional]
+
+        erros = divergencias(resultados(sqlite, cursos, session), resultados(duckdb, cursos, session))
+        relatorio["divergencias"] = erros
+        print(f"🔎 {len(cursos)} cursos comparados: " + (f"❌ divergências em {erros}" if erros else "✅ resultados idênticos"))
+
+        amostra = cursos[:args.cursos]
+        tempos = {"duckdb/abertura_correcao": tempos_abertura}
+        for backend in [sqlite, duckdb]:
+            tempos[f"{backend.nome}/ranking"] = medir(lambda: IndiceRanking(backend.linhas_ranking(session)), args.repeticoes)
+            tempos[f"{backend.nome}/benchmark"] = medir(lambda: backend.somas_benchmark(amostra, session), args.repeticoes)
+            tempos[f"{backend.nome}/referencial"] = medir(lambda: backend.referencial_nacional(session), args.repeticoes)
+    relatorio["etapas"] = {nome: estatisticas(t) for nome, t in tempos.items()}
+    relatorio["rss_pico_mb"] = rss_pico_mb()
+
+    print(f"\n{'etapa':<30}{'p50 ms':>10}{'p95 ms':>10}")
+    for nome, est in relatorio["etapas"].items():
+        print(f"{nome:<30}{est['p50_ms']:>10.2f}{est['p95_ms']:>10.2f}")
+    print(f"Exportação Parquet: {relatorio['exportacao_parquet_s']}s | RSS pico: {relatorio['rss_pico_mb']} MB")
+    if args.saida:
+        with open(args.saida, "w") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados em {args.saida}")
+    return 1 if erros else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Equivalência e benchmark dos backends SQLite x DuckDB")
+    parser.add_argument("--dados", default="dados_sinteticos", help="diretório com o banco já criado")
+    parser.add_argument("--gerar", type=int, metavar="ALUNOS", help="gera e carrega antes uma base sintética com N alunos")
+    parser.add_argument("--cadernos", type=int, default=4, help="cadernos da base gerada")
+    parser.add_argument("--cursos-base", type=int, default=350, help="cursos da base gerada")
+    parser.add_argument("--cursos", type=int, default=5, help="cursos por chamada de benchmark")
+    parser.add_argument("--repeticoes", type=int, default=10)
+    parser.add_argument("--saida", help="grava o relatório em JSON")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+import json
+import os
+import pandas as pd
+from sqlmodel import Session, select, func
+from models import Gabarito, QuestaoMapeamento, CursoAgregadoTaxonomia
+
+# --- CONTEXTO DE CORREÇÃO + SNAPSHOT DE PARTIDA A QUENTE ---
+# GABARITO_CACHE, DF_MAPA_CACHE e REFERENCIAL_CACHE da API vêm daqui. O
+# db_creator grava um snapshot Parquet a cada versão publicada; ao subir, o
+# worker lê os arquivos em vez de consultar o banco e refazer o referencial.
+
+DIRETORIO_SNAPSHOT = os.environ.get("P360_DIR_SNAPSHOT", "snapshot_contexto")
+MANIFESTO = "manifesto.json"
+
+def ler_contexto(session: Session):
+    """(gabarito_map, df_mapa) direto do banco."""
+    gabs = session.exec(select(Gabarito)).all()
+    if not gabs: return {}, pd.DataFrame()
+    gabarito_map = {g.co_caderno: list(g.respostas_gabarito) for g in gabs}
+    mapas = session.exec(select(QuestaoMapeamento)).all()
+    return gabarito_map, pd.DataFrame([m.model_dump() for m in mapas])
+
+def calcular_referencial_nacional(session: Session):
+    """Média nacional por (grande_area, subespecialidade, diagnostico) a partir de CursoAgregadoTaxonomia."""
+    statement = select(
+        CursoAgregadoTaxonomia.grande_area, CursoAgregadoTaxonomia.subespecialidade, CursoAgregadoTaxonomia.diagnostico,
+        func.sum(CursoAgregadoTaxonomia.acertos), func.sum(CursoAgregadoTaxonomia.total)
+    ).group_by(CursoAgregadoTaxonomia.grande_area, CursoAgregadoTaxonomia.subespecialidade, CursoAgregadoTaxonomia.diagnostico)
+    linhas = session.exec(statement).all()
+    if not linhas:
+        print("⚠️ CursoAgregadoTaxonomia vazio - rode db_creator.py --agregados")
+        return pd.DataFrame()
+
+    df_nacional = pd.DataFrame([tuple(l) for l in linhas], columns=['grande_area', 'subespecialidade', 'diagnostico', 'acerto', 'total'])
+    df_nacional = df_nacional[df_nacional['total'] > 0]
+    df_nacional['acerto'] = df_nacional['acerto'] / df_nacional['total']
+    return df_nacional.drop(columns='total')
+
+def gravar_snapshot(session: Session, versao, diretorio=DIRETORIO_SNAPSHOT):
+    print("💾 Gravando snapshot de contexto...")
+    os.makedirs(diretorio, exist_ok=True)
+    gabarito_map, df_mapa = ler_contexto(session)
+    tabelas = {
+        "gabarito": pd.DataFrame({"co_caderno": list(gabarito_map),
+                                  "respostas_gabarito": ["".join(g) for g in gabarito_map.values()]}),
+        "mapa": df_mapa,
+        "referencial": calcular_referencial_nacional(session),
+    }
+    caminho_manifesto = os.path.join(diretorio, MANIFESTO)
+    if os.path.exists(caminho_manifesto): os.remove(caminho_manifesto)
+    for nome, df in tabelas.items():
+        temporario = os.path.join(diretorio, f"{nome}.parquet.tmp")
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, os.path.join(diretorio, f"{nome}.parquet"))
+    with open(caminho_manifesto, "w") as f:
+        json.dump({"versao": versao, "linhas": {nome: len(df) for nome, df in tabelas.items()}}, f)
+    print(f"✅ Snapshot da versão {versao} gravado em {diretorio}/")
+
+def ler_snapshot(versao, diretorio=DIRETORIO_SNAPSHOT):
+    """
+    (gabarito_map, df_mapa, df_referencial) se houver snapshot completo desta
+    versão; senão None. Snapshot vazio ou com contagens diferentes das do
+    manifesto (gravação interrompida) é ignorado e a API recalcula do banco.
+    """
+    try:
+        with open(os.path.join(diretorio, MANIFESTO)) as f:
+            manifesto = json.load(f)
+        if manifesto.get("versao") != versao: return None
+        tabelas = {nome: pd.read_parquet(os.path.join(diretorio, f"{nome}.parquet"))
+                   for nome in ["gabarito", "mapa", "referencial"]}
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Snapshot ilegível ({e}) - usando o banco.")
+        return None
+    linhas = manifesto.get("linhas", {})
+    if any(df.empty for df in tabelas.values()) or any(len(df) != linhas.get(nome) for nome, df in tabelas.items()):
+        print(f"⚠️ Snapshot da versão {versao} vazio ou incompleto - usando o banco.")
+        return None
+    df_gab = tabelas["gabarito"]
+    gabarito_map = {int(c): list(r) for c, r in zip(df_gab["co_caderno"], df_gab["respostas_gabarito"])}
+    return gabarito_map, tabelas["mapa"], tabelas["referencial"]
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+from models import CuboTaxonomia, Localidade
+
+# --- CUBO DE COMPARAÇÃO POR COORTE ---
+# Uma linha por (ano, curso, conceito, P360, diagnóstico) com acertos/total,
+# mais UF e município do curso. Carregado uma vez por versão dos dados; cada
+# comparação é uma máscara sobre as dimensões + bincount por diagnóstico, sem
+# tocar em linhas de aluno.
+
+# Dimensões aceitas em ?cohort= (nome na API -> coluna do cubo)
+DIMENSOES = {
+    "uf": "sigla_estado",
+    "municipio": "ies_munic",
+    "conceito": "enamed_ies",
+    "p360": "p360",
+    "ano": "nu_ano",
+}
+CHAVES_TAXONOMIA = ["grande_area", "subespecialidade", "diagnostico"]
+
+def interpretar_cohort(texto):
+    """'uf:SP,p360:S' -> {'uf': 'SP', 'p360': 'S'}; 'uf' sem valor = o mesmo do curso (None)."""
+    filtros = {}
+    for parte in (texto or "").split(","):
+        parte = parte.strip()
+        if not parte or parte.lower() == "nacional": continue
+        dimensao, _, valor = parte.partition(":")
+        dimensao = dimensao.strip().lower()
+        if dimensao not in DIMENSOES:
+            raise ValueError(f"Dimensão desconhecida: {dimensao} (use {', '.join(DIMENSOES)})")
+        filtros[dimensao] = valor.strip() or None
+    return filtros
+
+class CuboComparacao:
+    def __init__(self, df):
+        self.rotulos = df[CHAVES_TAXONOMIA].drop_duplicates().sort_values(CHAVES_TAXONOMIA).reset_index(drop=True)
+        self.grupo = pd.merge(df[CHAVES_TAXONOMIA], self.rotulos.reset_index(), on=CHAVES_TAXONOMIA, how="left")["index"].to_numpy(dtype=np.intp)
+        self.co_curso = df["co_curso"].to_numpy(dtype=np.int64)
+        self.colunas = {coluna: df[coluna].astype(str).str.strip().str.upper().to_numpy() for coluna in DIMENSOES.values()}
+        self.acertos = df["acertos"].to_numpy(dtype=np.float64)
+        self.total = df["total"].to_numpy(dtype=np.float64)
+
+    @classmethod
+    def construir(cls, session: Session):
+        try:
+            linhas = session.exec(select(
+                CuboTaxonomia.nu_ano, CuboTaxonomia.co_curso, CuboTaxonomia.enamed_ies, CuboTaxonomia.p360,
+                CuboTaxonomia.grande_area, CuboTaxonomia.subespecialidade, CuboTaxonomia.diagnostico,
+                CuboTaxonomia.acertos, CuboTaxonomia.total)).all()
+        except Exception as e:
+            print(f"⚠️ CuboTaxonomia indisponível ({e}) - rode db_creator.py --migrar e --agregados")
+            linhas = []
+        if not linhas: print("⚠️ CuboTaxonomia vazio - comparações por coorte responderão 404")
+        cubo = pd.DataFrame([tuple(l) for l in linhas],
+                            columns=["nu_ano", "co_curso", "enamed_ies", "p360", *CHAVES_TAXONOMIA, "acertos", "total"])
+        locais = pd.DataFrame([tuple(l) for l in session.exec(select(
+            Localidade.co_curso, Localidade.sigla_estado, Localidade.ies_munic)).all()],
+            columns=["co_curso", "sigla_estado", "ies_munic"])
+        cubo = pd.merge(cubo, locais, on="co_curso", how="left").fillna({"sigla_estado": "", "ies_munic": ""})
+        return cls(cubo)
+
+    def __len__(self):
+        return len(self.co_curso)
+
+    def valores_do_curso(self, co_curso):
+        """Valor de cada dimensão para o curso (o de maior volume, se houver mais de um)."""
+        linhas = self.co_curso == co_curso
+        if not linhas.any(): return None
+        valores = {}
+        for dimensao, coluna in DIMENSOES.items():
+            pesos = pd.Series(self.total[linhas]).groupby(self.colunas[coluna][linhas]).sum()
+            valores[dimensao] = pesos.idxmax()
+        return valores
+
+    def mascara(self, filtros):
+        mascara = np.ones(len(self), dtype=bool)
+        for dimensao, valor in filtros.items():
+            mascara &= self.colunas[DIMENSOES[dimensao]] == str(valor).strip().upper()
+        return mascara
+
+    def somas(self, mascara):
+        """(acertos, total) por diagnóstico (ordem de self.rotulos) das linhas selecionadas."""
+        n = len(self.rotulos)
+        return (np.bincount(self.grupo[mascara], weights=self.acertos[mascara], minlength=n),
+                np.bincount(self.grupo[mascara], weights=self.total[mascara], minlength=n))
+
+    def cursos(self, mascara):
+        return int(len(np.unique(self.co_curso[mascara])))
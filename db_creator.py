@@ -1,9 +1,24 @@
 import pandas as pd
-from sqlmodel import SQLModel, create_engine, Session, text
+import numpy as np
+from sqlmodel import SQLModel, create_engine, Session, select, insert, text
 import os
+import time
+import json
+import argparse
+import resource
+from datetime import datetime
 
 # Importando do seu arquivo models.py
-from models import Aluno, Localidade, QuestaoMapeamento, Gabarito
+from models import Aluno, Localidade, QuestaoMapeamento, Gabarito, CursoAgregado, CursoAgregadoTaxonomia, CuboTaxonomia, DistribuicaoNotas, VersaoDados, CasoRecomendado
+from motor_correcao import N_QUESTOES, montar_gabaritos, corrigir_respostas, indices_caderno, empacotar, bits_para_bytes
+from taxonomia import IndiceTaxonomia
+from distribuicao import histogramas_bloco
+from colunar import exportar_colunas, carimbar_versao
+from banco import migrar
+from normalizacao import normalizar_municipio
+from contexto import gravar_snapshot
+from analitico import BACKEND_ANALITICO, exportar_parquet
+from portfolio import ARQUIVO_PORTFOLIO, ler_portfolio, casar_mapeamento
 
 # --- CONFIGURAÇÃO ---
 SQLITE_FILE = "plataforma_educacional.db"
@@ -22,15 +37,64 @@ def limpar_colunas(df):
     df.columns = [str(c).strip().upper() for c in df.columns]
     return df
 
+def normalizar_coluna_aluno(c):
+    return str(c).encode('ascii', 'ignore').decode('ascii').strip().upper()
+
+def inteiros_seguros(serie):
+    """Versão vetorizada do safe_int."""
+    return pd.to_numeric(serie, errors='coerce').fillna(0).astype(np.int64)
+
+# Pragmas usados só durante a carga em massa (restaurados ao final)
+PRAGMAS_CARGA = {"synchronous": "OFF", "journal_mode": "MEMORY", "temp_store": "MEMORY", "cache_size": "-262144"}
+
+def excluir_particoes(session, tabela, coluna, valores, lote=500):
+    """DELETE ... WHERE coluna IN (...) em lotes (limite de variáveis do SQLite)."""
+    valores = sorted(valores)
+    for i in range(0, len(valores), lote):
+        parte = valores[i:i + lote]
+        marcadores = ", ".join("?" * len(parte))
+        session.connection().exec_driver_sql(f"DELETE FROM {tabela} WHERE {coluna} IN ({marcadores})", tuple(parte))
+
+def anos_dos_cadernos(session, cadernos):
+    if not cadernos: return set()
+    marcadores = ", ".join("?" * len(cadernos))
+    linhas = session.connection().exec_driver_sql(
+        f"SELECT DISTINCT nu_ano FROM aluno WHERE co_caderno IN ({marcadores})", tuple(sorted(cadernos))).all()
+    return {int(l[0]) for l in linhas}
+
+def registrar_versao(session, escopo, armazem=False):
+    """
+    Incrementa a versão dos dados; a API compara com a sua e recarrega só o afetado.
+    Com armazem=True (exportado nesta carga), o manifesto do armazém colunar é
+    carimbado com a versão antes do commit: a API nunca vê a versão sem o carimbo.
+    """
+    versao = VersaoDados(criado_em=datetime.now().isoformat(timespec='seconds'), escopo=json.dumps(escopo))
+    session.add(versao)
+    session.flush()
+    if armazem:
+        try:
+            carimbar_versao(versao.versao)
+        except Exception as e:
+            print(f"⚠️ Armazém colunar não carimbado (API lerá do SQLite): {e}")
+    session.commit()
+    print(f"🔖 Versão dos dados: {versao.versao} ({versao.escopo})")
+    try:
+        gravar_snapshot(session, versao.versao)
+    except Exception as e:
+        print(f"⚠️ Snapshot não gravado (API carregará do banco): {e}")
+    return versao.versao
+
 # --- FUNÇÕES DE IMPORTAÇÃO ---
 
-def importar_localidades(session):
+def importar_localidades(session, arquivo="mapeamento_localidade.xlsx", incremental=False):
     print("📍 Processando Localidades...")
     try:
-        df = pd.read_excel("mapeamento_localidade.xlsx")
+        df = pd.read_excel(arquivo)
         df = limpar_colunas(df).dropna(subset=['CO_CURSO', 'IES_ESTADO'])
+        cursos = {safe_int(c) for c in df['CO_CURSO']}
         
-        session.exec(text("DELETE FROM localidade"))
+        if incremental: excluir_particoes(session, "localidade", "co_curso", cursos)
+        else: session.exec(text("DELETE FROM localidade"))
         
         objs = []
         for _, row in df.iterrows():
@@ -39,21 +103,27 @@ def importar_localidades(session):
                 co_curso=safe_int(row['CO_CURSO']),
                 ies_estado=str(row['IES_ESTADO']).strip(),
                 ies_munic=str(row.get('IES_MUNIC', '')).upper().strip(),
-                sigla_estado=str(row.get('SIGLA_ESTADO', '')).upper().strip()
+                sigla_estado=str(row.get('SIGLA_ESTADO', '')).upper().strip(),
+                ies_munic_norm=normalizar_municipio(row.get('IES_MUNIC', ''))
             ))
         session.add_all(objs)
         session.commit()
         print(f"✅ {len(objs)} Localidades importadas.")
+        return cursos
     except Exception as e:
+        session.rollback()
         print(f"⚠️ Erro em Localidades: {e}")
+        return set()
 
-def importar_mapeamento(session):
+def importar_mapeamento(session, arquivo="Base_mapeamento.xlsx", incremental=False):
     print("🗺️ Processando Mapeamento...")
     try:
-        df = pd.read_excel("Base_mapeamento.xlsx")
+        df = pd.read_excel(arquivo)
         df = df.dropna(subset=['CO_CADERNO', 'NU_QUESTAO'])
+        cadernos = {safe_int(c) for c in df['CO_CADERNO']}
         
-        session.exec(text("DELETE FROM questaomapeamento"))
+        if incremental: excluir_particoes(session, "questaomapeamento", "co_caderno", cadernos)
+        else: session.exec(text("DELETE FROM questaomapeamento"))
         
         objs = []
         for _, row in df.iterrows():
@@ -68,15 +138,41 @@ def importar_mapeamento(session):
         session.add_all(objs)
         session.commit()
         print(f"✅ {len(objs)} Questões mapeadas.")
+        return cadernos
     except Exception as e:
+        session.rollback()
         print(f"⚠️ Erro em Mapeamento: {e}")
+        return set()
 
-def importar_gabarito(session):
+def importar_portfolio(session, arquivo=ARQUIVO_PORTFOLIO):
+    """Casa cada diagnóstico do mapeamento com os casos do portfólio (recalcula tudo: são poucas centenas de pares)."""
+    print("🩺 Casando mapeamento com o portfólio de casos...")
+    try:
+        df_casos = ler_portfolio(arquivo)
+        pares = session.exec(select(QuestaoMapeamento.subespecialidade, QuestaoMapeamento.diagnostico).distinct()).all()
+        linhas = casar_mapeamento([tuple(p) for p in pares], df_casos)
+        session.exec(text("DELETE FROM casorecomendado"))
+        if linhas: session.exec(insert(CasoRecomendado), params=linhas)
+        session.commit()
+        cobertos = len({(l["subespecialidade"], l["diagnostico"]) for l in linhas})
+        print(f"✅ {cobertos} de {len(pares)} diagnósticos com casos no portfólio ({len(df_casos)} casos).")
+        return True
+    except FileNotFoundError:
+        print(f"⚠️ {arquivo} não encontrado - casos recomendados mantidos.")
+        return False
+    except Exception as e:
+        session.rollback()
+        print(f"⚠️ Erro no Portfólio: {e}")
+        return False
+
+def importar_gabarito(session, arquivo="base_gabarito.csv", incremental=False):
     print("🔑 Importando Gabarito...")
     try:
-        df = pd.read_csv("base_gabarito.csv", sep=";", engine='python')
+        df = pd.read_csv(arquivo, sep=";", engine='python')
         df = limpar_colunas(df)
-        session.exec(text("DELETE FROM gabarito"))
+        cadernos = {safe_int(c) for c in df.get("CO_CADERNO", [])}
+        if incremental: excluir_particoes(session, "gabarito", "co_caderno", cadernos)
+        else: session.exec(text("DELETE FROM gabarito"))
         
         objs = []
         for _, row in df.iterrows():
@@ -85,13 +181,21 @@ def importar_gabarito(session):
                 co_caderno=safe_int(row.get("CO_CADERNO")),
                 respostas_gabarito="".join(gabarito_list)
             ))
+        # Máscara de anuladas por caderno, no mesmo formato de aluno.acertos_bits
+        matriz = montar_gabaritos({o.co_caderno: list(o.respostas_gabarito) for o in objs})
+        for o in objs:
+            o.anuladas_bits = empacotar(matriz.anuladas[np.searchsorted(matriz.cadernos, o.co_caderno)]).tobytes()
         session.add_all(objs)
         session.commit()
         print(f"✅ {len(objs)} Gabaritos importados.")
+        return cadernos
     except Exception as e:
+        session.rollback()
         print(f"❌ Erro no Gabarito: {e}")
+        return set()
 
 def importar_alunos(session):
+    """Importador legado (carga completa, linha a linha). Retorna os anos importados."""
     print("🎓 Processando Alunos (Lote de 2000)...")
     try:
         df = pd.read_csv("base_alunos.csv", sep=";", engine='python', on_bad_lines='skip', encoding='latin1')
@@ -99,7 +203,7 @@ def importar_alunos(session):
         
         if "NU_ANO" not in df.columns:
             print(f"❌ Coluna NU_ANO não encontrada! Colunas: {list(df.columns[:5])}")
-            return
+            return set()
 
         df = df[df["NU_ANO"].notna()]
         session.exec(text("DELETE FROM aluno"))
@@ -129,18 +233,320 @@ def importar_alunos(session):
             session.add_all(batch)
             session.commit()
         print(f"\n✅ SUCESSO! {total} alunos importados.")
+        return {safe_int(a) for a in df["NU_ANO"].unique()}
     except Exception as e:
         print(f"\n❌ Erro crítico em Alunos: {e}")
+        return set()
+
+def importar_alunos_streaming(session, arquivo="base_alunos.csv", chunksize=50_000, incremental=False):
+    """
+    Importação em fluxo: lê o CSV em blocos com o parser C, monta `respostas`
+    por concatenação vetorizada e insere via executemany. A memória fica limitada
+    ao tamanho do bloco, qualquer que seja o arquivo.
+    No modo incremental só as partições (nu_ano) presentes no arquivo são substituídas.
+    Exclusão e inserções formam uma única transação, com commit só ao final: uma
+    carga que falha não deixa partição pela metade. Retorna o conjunto de anos
+    importados (vazio se a carga foi desfeita).
+    """
+    print(f"🎓 Processando Alunos em fluxo (blocos de {chunksize})...")
+    colunas_q = [f"DS_VT_ESC_OBJ.{n}" for n in range(1, N_QUESTOES + 1)]
+    necessarias = {"NU_ANO", "CO_CURSO", "CO_CADERNO", "IES_NOME", "P360", "ENAMED_IES", *colunas_q}
+    conn = session.connection()
+    anteriores, anos = {}, set()
+    try:
+        for pragma, valor in PRAGMAS_CARGA.items():
+            anteriores[pragma] = conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            # Em WAL a carga já é sequencial no log; sair dele exigiria acesso exclusivo
+            if pragma == "journal_mode" and str(anteriores[pragma]).lower() == "wal":
+                del anteriores[pragma]
+                continue
+            conn.exec_driver_sql(f"PRAGMA {pragma}={valor}")
+
+        leitor = pd.read_csv(arquivo, sep=";", engine='c', on_bad_lines='skip', encoding='latin1',
+                             dtype=str, keep_default_na=False, chunksize=chunksize,
+                             usecols=lambda c: normalizar_coluna_aluno(c) in necessarias)
+
+        inicio, total, primeiro = time.perf_counter(), 0, True
+        insert_sql = ("INSERT INTO aluno (nu_ano, co_curso, co_caderno, ies_nome, p360, enamed_ies, respostas) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?)")
+        for chunk in leitor:
+            chunk.columns = [normalizar_coluna_aluno(c) for c in chunk.columns]
+            if primeiro:
+                if "NU_ANO" not in chunk.columns:
+                    print(f"❌ Coluna NU_ANO não encontrada! Colunas: {list(chunk.columns[:5])}")
+                    return anos
+                if not incremental: conn.exec_driver_sql("DELETE FROM aluno")
+                primeiro = False
+
+            chunk = chunk[chunk["NU_ANO"].str.strip() != ""]
+            if chunk.empty: continue
+
+            # Partição nova neste bloco: limpa o ano antes de inserir (só no modo incremental)
+            novos_anos = set(inteiros_seguros(chunk["NU_ANO"]).unique().tolist()) - anos
+            if incremental and novos_anos: excluir_particoes(session, "aluno", "nu_ano", novos_anos)
+            anos |= novos_anos
+
+            # Uma letra por questão; a matriz U1 (alunos x 100) vira uma string de 100 chars por aluno
+            for c in colunas_q:
+                if c not in chunk.columns: chunk[c] = " "
+            letras = chunk[colunas_q].to_numpy(dtype="U1")
+            letras[letras == ""] = " "
+            respostas = np.ascontiguousarray(letras).view(f"U{N_QUESTOES}").ravel()
+
+            def inteiros(col):
+                if col not in chunk.columns: return [0] * len(chunk)
+                return inteiros_seguros(chunk[col]).tolist()
+
+            def texto(col, padrao):
+                if col not in chunk.columns: return [padrao] * len(chunk)
+                serie = chunk[col].str.strip()
+                return serie.where(serie != "", padrao).tolist()
+
+            linhas = list(zip(
+                inteiros("NU_ANO"), inteiros("CO_CURSO"), inteiros("CO_CADERNO"),
+                texto("IES_NOME", "Desconhecido"), texto("P360", "N"), texto("ENAMED_IES", "N"),
+                respostas.tolist()
+            ))
+            conn.exec_driver_sql(insert_sql, linhas)
+
+            total += len(linhas)
+            taxa = total / max(time.perf_counter() - inicio, 1e-9)
+            print(f"   Progresso: {total} alunos ({taxa:,.0f} linhas/s)...", end="\r")
+
+        session.commit()
+        duracao = time.perf_counter() - inicio
+        pico_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"\n✅ SUCESSO! {total} alunos importados em {duracao:.1f}s "
+              f"({total / max(duracao, 1e-9):,.0f} linhas/s, pico de memória {pico_mb:.0f} MB).")
+        return anos
+    except Exception as e:
+        session.rollback()
+        print(f"\n❌ Erro crítico em Alunos (carga desfeita): {e}")
+        return set()
+    finally:
+        conn = session.connection()
+        for pragma, valor in anteriores.items():
+            conn.exec_driver_sql(f"PRAGMA {pragma}={valor}")
+
+def importar_agregados(session, chunksize=100_000, anos=None):
+    """
+    Materializa CursoAgregado, CuboTaxonomia, CursoAgregadoTaxonomia e
+    DistribuicaoNotas (particionados por nu_ano) a partir da tabela aluno. A API lê essas tabelas em vez de recorrigir todos
+    os alunos a cada request. Com `anos`, só essas partições são recalculadas.
+    Na mesma passada grava aluno.acertos_bits (a correção empacotada de cada aluno):
+    como roda sempre que gabarito, mapeamento ou alunos mudam, os bits acompanham o gabarito.
+    """
+    if anos is not None and not anos: return
+    print("📊 Gerando agregados por curso..." + (f" (anos {sorted(anos)})" if anos else ""))
+    try:
+        gabs = session.exec(select(Gabarito)).all()
+        gabaritos = montar_gabaritos({g.co_caderno: list(g.respostas_gabarito) for g in gabs})
+        df_mapa = pd.DataFrame([m.model_dump() for m in session.exec(select(QuestaoMapeamento)).all()])
+        ufs = {l.co_curso: l.sigla_estado for l in session.exec(select(Localidade)).all()}
+
+        sql = "SELECT id, nu_ano, co_curso, ies_nome, enamed_ies, p360, co_caderno, respostas FROM aluno"
+        tabelas = ["cursoagregado", "cubotaxonomia", "cursoagregadotaxonomia", "distribuicaonotas"]
+        if anos is None:
+            for tabela in tabelas: session.exec(text(f"DELETE FROM {tabela}"))
+        else:
+            for tabela in tabelas: excluir_particoes(session, tabela, "nu_ano", anos)
+            sql += f" WHERE nu_ano IN ({', '.join(str(int(a)) for a in sorted(anos))})"
 
-def main():
+        # Bits vão para uma tabela temporária e entram no aluno depois da leitura
+        # (não se altera a tabela que o cursor ainda está percorrendo)
+        conn = session.connection()
+        conn.exec_driver_sql("CREATE TEMP TABLE IF NOT EXISTS bits_aluno (id INTEGER PRIMARY KEY, bits BLOB)")
+        conn.exec_driver_sql("DELETE FROM bits_aluno")
+
+        colunas_q = list(range(1, N_QUESTOES + 1))
+        indice = IndiceTaxonomia(df_mapa, gabaritos) if not df_mapa.empty else None
+        parciais_curso, parciais_questao, parciais_notas = [], [], []
+        for chunk in pd.read_sql(text(sql + " ORDER BY id"), session.connection(), chunksize=chunksize):
+            acertos, validos = corrigir_respostas(chunk['respostas'], chunk['co_caderno'], gabaritos)
+            bits = empacotar(acertos)
+            conn.exec_driver_sql("INSERT INTO bits_aluno (id, bits) VALUES (?, ?)",
+                                 list(zip(chunk['id'].tolist(), bits_para_bytes(bits, validos))))
+            chunk['enamed_ies'] = chunk['enamed_ies'].astype(str).str.strip()
+            chunk['acertos'] = acertos.sum(axis=1)
+            chunk['total'] = validos * N_QUESTOES
+            chunk['alunos'] = 1
+            parciais_curso.append(chunk.groupby(['nu_ano', 'co_curso', 'enamed_ies'], sort=False).agg(
+                ies_nome=('ies_nome', 'first'), acertos=('acertos', 'sum'),
+                total=('total', 'sum'), alunos=('alunos', 'sum')))
+
+            df_q = pd.DataFrame(acertos[validos].astype(np.int32), columns=colunas_q)
+            df_q['nu_ano'] = chunk['nu_ano'].values[validos]
+            df_q['co_curso'] = chunk['co_curso'].values[validos]
+            df_q['co_caderno'] = chunk['co_caderno'].values[validos]
+            df_q['enamed_ies'] = chunk['enamed_ies'].values[validos]
+            df_q['p360'] = chunk['p360'].astype(str).str.strip().str.upper().values[validos]
+            df_q['total'] = 1
+            parciais_questao.append(df_q.groupby(['nu_ano', 'co_curso', 'co_caderno', 'enamed_ies', 'p360']).sum())
+
+            # Histograma das notas por aluno (mesma correção, sem reler a tabela)
+            idx_caderno, _ = indices_caderno(chunk['co_caderno'], gabaritos)
+            chaves_alunos = chunk.loc[validos, ['nu_ano', 'co_curso', 'enamed_ies']].reset_index(drop=True)
+            parciais_notas.append(histogramas_bloco(chaves_alunos, bits[validos], idx_caderno[validos], indice))
+
+        conn.exec_driver_sql("UPDATE aluno SET acertos_bits = b.bits FROM bits_aluno AS b WHERE aluno.id = b.id")
+        conn.exec_driver_sql("DROP TABLE bits_aluno")
+
+        if not parciais_curso:
+            session.commit()
+            print("⚠️ Nenhum aluno para agregar.")
+            return
+
+        df_cursos = pd.concat(parciais_curso).groupby(level=[0, 1, 2], sort=False).agg(
+            {'ies_nome': 'first', 'acertos': 'sum', 'total': 'sum', 'alunos': 'sum'}).reset_index()
+        df_cursos['sigla_estado'] = df_cursos['co_curso'].map(ufs).fillna('')
+        session.connection().execute(insert(CursoAgregado), df_cursos.to_dict(orient='records'))
+
+        total_taxonomia = 0
+        if not df_mapa.empty:
+            # Somas por (ano, curso, caderno, conceito, p360, questão) projetadas na taxonomia pelo índice de incidência
+            df_q = pd.concat(parciais_questao).groupby(level=[0, 1, 2, 3, 4]).sum()
+            totais = df_q.pop('total').to_numpy()
+            chaves = df_q.index.to_frame(index=False)
+            idx_caderno, _ = indices_caderno(chaves['co_caderno'], gabaritos)
+            acertos_tax, total_tax = indice.somas_por_linha(df_q.to_numpy(), idx_caderno, totais, "diagnostico")
+
+            celula = ['nu_ano', 'co_curso', 'enamed_ies', 'p360']
+            df_cubo = pd.DataFrame({
+                'acertos': pd.DataFrame(acertos_tax).groupby([chaves[c] for c in celula]).sum().stack(),
+                'total': pd.DataFrame(total_tax).groupby([chaves[c] for c in celula]).sum().stack()
+            }).astype(np.int64)
+            df_cubo = df_cubo[df_cubo['total'] > 0].reset_index()
+            df_cubo.columns = celula + ['grupo', 'acertos', 'total']
+            rotulos = indice.rotulos["diagnostico"].iloc[df_cubo.pop('grupo')].reset_index(drop=True)
+            df_cubo = pd.concat([df_cubo, rotulos], axis=1)
+            session.connection().execute(insert(CuboTaxonomia), df_cubo.to_dict(orient='records'))
+
+            df_tax = df_cubo.groupby(['nu_ano', 'co_curso', 'grande_area', 'subespecialidade', 'diagnostico'])[['acertos', 'total']].sum().reset_index()
+            session.connection().execute(insert(CursoAgregadoTaxonomia), df_tax.to_dict(orient='records'))
+            total_taxonomia = len(df_tax)
+
+        parciais_notas = [p for p in parciais_notas if len(p)]
+        if parciais_notas:
+            df_notas = pd.concat(parciais_notas).groupby(level=[0, 1, 2, 3, 4]).sum().reset_index()
+            session.connection().execute(insert(DistribuicaoNotas), df_notas.to_dict(orient='records'))
+
+        session.commit()
+        print(f"✅ {len(df_cursos)} cursos e {total_taxonomia} linhas de taxonomia agregadas.")
+    except Exception as e:
+        session.rollback()
+        print(f"❌ Erro nos Agregados: {e}")
+
+def atualizar_uf_agregados(session):
+    """Propaga mudanças de Localidade para CursoAgregado sem recalcular nada."""
+    session.exec(text(
+        "UPDATE cursoagregado SET sigla_estado = COALESCE("
+        "(SELECT l.sigla_estado FROM localidade l WHERE l.co_curso = cursoagregado.co_curso), '')"))
+    session.commit()
+
+def exportar_armazem(session):
+    """True se o armazém foi exportado (e deve ser carimbado com a versão publicada)."""
+    try:
+        return exportar_colunas(session) > 0
+    except Exception as e:
+        print(f"⚠️ Erro no armazém colunar (API seguirá lendo do SQLite): {e}")
+        return False
+
+def exportar_backend_analitico(session, forcar=False):
+    """Parquet do backend DuckDB - só quando ele é o backend configurado (ou com --parquet)."""
+    if BACKEND_ANALITICO != "duckdb" and not forcar: return
+    try:
+        exportar_parquet(session)
+    except Exception as e:
+        print(f"⚠️ Erro no Parquet do backend analítico (API seguirá no SQLite): {e}")
+
+def main(legado=False):
     print("🚀 Iniciando migração de dados...")
-    SQLModel.metadata.create_all(engine)
+    migrar(engine)
     with Session(engine) as session:
         importar_localidades(session)
         importar_mapeamento(session)
+        importar_portfolio(session)
         importar_gabarito(session)
-        importar_alunos(session)
+        if legado:
+            importar_alunos(session)
+        else:
+            importar_alunos_streaming(session)
+        importar_agregados(session)
+        armazem = exportar_armazem(session)
+        exportar_backend_analitico(session)
+        registrar_versao(session, {"completo": True}, armazem)
     print(f"\n✨ Banco de dados atualizado com sucesso!")
 
+def carga_incremental(localidades=None, mapeamento=None, gabarito=None, alunos=None, portfolio=None):
+    """
+    Substitui só as partições presentes nos arquivos informados: localidades por
+    co_curso, mapeamento/gabarito por co_caderno e alunos por nu_ano (o portfólio
+    de casos é recasado inteiro, também quando o mapeamento muda). Os agregados
+    são recalculados apenas para os anos afetados e a versão dos dados é incrementada,
+    o que faz a API recarregar somente os caches correspondentes, sem reinício.
+    """
+    print("🚀 Iniciando carga incremental...")
+    migrar(engine)
+    escopo = {}
+    with Session(engine) as session:
+        if localidades: escopo["localidade"] = sorted(importar_localidades(session, localidades, incremental=True))
+        if mapeamento: escopo["mapeamento"] = sorted(importar_mapeamento(session, mapeamento, incremental=True))
+        if portfolio or escopo.get("mapeamento"):  # diagnósticos novos precisam ser casados
+            escopo["portfolio"] = importar_portfolio(session, portfolio or ARQUIVO_PORTFOLIO)
+        if gabarito: escopo["gabarito"] = sorted(importar_gabarito(session, gabarito, incremental=True))
+        if alunos: escopo["aluno"] = sorted(importar_alunos_streaming(session, alunos, incremental=True))
+        escopo = {k: v for k, v in escopo.items() if v}
+        if not escopo:
+            print("⚠️ Nada foi carregado - versão mantida.")
+            return
+
+        cadernos = set(escopo.get("mapeamento", [])) | set(escopo.get("gabarito", []))
+        importar_agregados(session, anos=set(escopo.get("aluno", [])) | anos_dos_cadernos(session, cadernos))
+        if "localidade" in escopo: atualizar_uf_agregados(session)
+        armazem = ("aluno" in escopo or "gabarito" in escopo) and exportar_armazem(session)  # bits recorrigidos
+        exportar_backend_analitico(session)
+        registrar_versao(session, escopo, armazem)
+    print("\n✨ Carga incremental concluída!")
+
+def atualizar_agregados():
+    """Recalcula apenas os agregados, sem reimportar as planilhas."""
+    migrar(engine)
+    with Session(engine) as session:
+        importar_agregados(session)
+        registrar_versao(session, {"agregados": True})
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Importação da base P360")
+    parser.add_argument("--agregados", action="store_true", help="recalcula só as tabelas agregadas")
+    parser.add_argument("--colunar", action="store_true", help="reexporta só o armazém colunar")
+    parser.add_argument("--parquet", action="store_true", help="reexporta só o Parquet do backend DuckDB")
+    parser.add_argument("--migrar", action="store_true", help="só aplica a migração de schema (índices, WAL)")
+    parser.add_argument("--legado", action="store_true", help="usa o importador de alunos linha a linha")
+    parser.add_argument("--incremental", action="store_true", help="substitui só as partições dos arquivos informados")
+    parser.add_argument("--localidades", help="planilha de localidades (modo incremental)")
+    parser.add_argument("--mapeamento", help="planilha de mapeamento (modo incremental)")
+    parser.add_argument("--gabarito", help="CSV de gabaritos (modo incremental)")
+    parser.add_argument("--alunos", help="CSV de alunos (modo incremental)")
+    parser.add_argument("--portfolio", help="CSV de casos do portfólio P360 (modo incremental)")
+    parser.add_argument("--pregerar-pdfs", action="store_true", help="ao final, gera o PDF de todos os cursos no cache de artefatos")
+    args = parser.parse_args()
+
+    if args.agregados:
+        atualizar_agregados()
+    elif args.migrar:
+        migrar(engine)
+        print("✅ Schema migrado.")
+    elif args.colunar:
+        with Session(engine) as session:
+            exportar_colunas(session)
+    elif args.parquet:
+        with Session(engine) as session:
+            exportar_backend_analitico(session, forcar=True)
+    elif args.incremental:
+        carga_incremental(args.localidades, args.mapeamento, args.gabarito, args.alunos, args.portfolio)
+    else:
+        main(legado=args.legado)
+
+    if args.pregerar_pdfs:
+        from artefatos import pregerar_pdfs  # importa a API (e a versão recém-publicada)
+        pregerar_pdfs()
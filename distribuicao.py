@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, select
+from models import DistribuicaoNotas, Localidade
+from motor_correcao import N_QUESTOES, contar_bits
+
+# --- DISTRIBUIÇÕES DE NOTAS POR ALUNO ---
+# A nota de cada aluno (% de acertos, geral e por grande_area) vira uma faixa
+# inteira de 0 a 100. O db_creator grava o histograma de faixas por curso
+# (DistribuicaoNotas) na mesma passada que corrige os alunos para os agregados;
+# a API soma os histogramas dos cursos para ter as referências nacional, por
+# UF e por conceito. Com 101 faixas, quantis e percentis saem de somas
+# acumuladas, sem recorrigir ninguém. A nota geral (acertos em 100) é exata.
+
+N_FAIXAS = 101
+GERAL = "Geral"
+QUANTIS = {"p10": 0.10, "p25": 0.25, "p50": 0.50, "p75": 0.75, "p90": 0.90}
+
+def faixas(acertos, total):
+    """Faixa (0..100) de cada nota; -1 onde o aluno não tem questões (total == 0)."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = np.floor(np.asarray(acertos, dtype=np.float64) * 100 / total + 1e-9)
+    return np.where(np.asarray(total) > 0, np.clip(pct, 0, 100), -1).astype(np.int64)
+
+def faixas_por_area(bits, idx_caderno, indice):
+    """{grande_area: faixas por aluno}, incluindo GERAL (acertos nas 100 questões). bits: acertos empacotados."""
+    resultado = {GERAL: faixas(contar_bits(bits), np.full(len(bits), N_QUESTOES))}
+    if indice is not None and len(indice.rotulos["grande_area"]):
+        acertos, total = indice.somas_bits(bits, idx_caderno, "grande_area")
+        for j, area in enumerate(indice.rotulos["grande_area"]["grande_area"]):
+            resultado[area] = faixas(acertos[:, j], total[:, j])
+    return resultado
+
+def histogramas_bloco(chaves, bits, idx_caderno, indice):
+    """
+    Contagens (chaves..., grande_area, faixa, alunos) de um bloco de alunos válidos.
+    chaves: DataFrame com uma linha por aluno (ex.: nu_ano, co_curso, enamed_ies).
+    """
+    partes = []
+    for area, f in faixas_por_area(bits, idx_caderno, indice).items():
+        com_nota = f >= 0
+        parte = chaves[com_nota].copy()
+        parte["grande_area"] = area
+        parte["faixa"] = f[com_nota]
+        partes.append(parte)
+    if not partes: return pd.DataFrame()
+    todas = pd.concat(partes, ignore_index=True)
+    return todas.groupby(list(todas.columns), sort=False).size().rename("alunos")
+
+def histograma(f):
+    return np.bincount(f[f >= 0], minlength=N_FAIXAS)
+
+def quantis(hist):
+    """Quantis (em % de acertos) de um histograma de faixas."""
+    n = hist.sum()
+    if n == 0: return {nome: None for nome in QUANTIS}
+    acumulado = np.cumsum(hist)
+    return {nome: int(np.searchsorted(acumulado, q * n)) for nome, q in QUANTIS.items()}
+
+def percentis(hist_referencia):
+    """Percentil (meio-rank) de cada faixa dentro da referência: vetor de 101 posições."""
+    n = hist_referencia.sum()
+    if n == 0: return np.full(N_FAIXAS, np.nan)
+    abaixo = np.cumsum(hist_referencia) - hist_referencia
+    return (abaixo + 0.5 * hist_referencia) / n * 100
+
+class DistribuicoesReferencia:
+    """Histogramas por curso em memória; referências = somas por máscara de cursos."""
+
+    def __init__(self, df):
+        self.areas = sorted(df["grande_area"].unique().tolist(), key=lambda a: (a != GERAL, a))
+        self.cursos = np.array(sorted(df["co_curso"].unique()), dtype=np.int64)
+        chaves = df[["co_curso", "sigla_estado", "enamed_ies"]].drop_duplicates("co_curso").set_index("co_curso")
+        self.uf = chaves["sigla_estado"].reindex(self.cursos).fillna("").to_numpy()
+        self.conceito = chaves["enamed_ies"].reindex(self.cursos).fillna("").to_numpy()
+        self.anos = sorted(df["nu_ano"].unique().tolist())
+        # hist[ano, curso, area, faixa]
+        self.hist = np.zeros((len(self.anos), len(self.cursos), len(self.areas), N_FAIXAS), dtype=np.int64)
+        np.add.at(self.hist, (
+            np.searchsorted(self.anos, df["nu_ano"].to_numpy()),
+            np.searchsorted(self.cursos, df["co_curso"].to_numpy()),
+            pd.Index(self.areas).get_indexer(df["grande_area"]),
+            df["faixa"].to_numpy(dtype=np.intp)), df["alunos"].to_numpy())
+
+    @classmethod
+    def construir(cls, session: Session):
+        try:
+            linhas = session.exec(select(
+                DistribuicaoNotas.nu_ano, DistribuicaoNotas.co_curso, DistribuicaoNotas.enamed_ies,
+                DistribuicaoNotas.grande_area, DistribuicaoNotas.faixa, DistribuicaoNotas.alunos)).all()
+        except Exception as e:
+            print(f"⚠️ DistribuicaoNotas indisponível ({e}) - rode db_creator.py --migrar e --agregados")
+            linhas = []
+        df = pd.DataFrame([tuple(l) for l in linhas], columns=["nu_ano", "co_curso", "enamed_ies", "grande_area", "faixa", "alunos"])
+        df["enamed_ies"] = df["enamed_ies"].astype(str).str.strip()
+        ufs = {l[0]: str(l[1]).strip().upper() for l in session.exec(select(Localidade.co_curso, Localidade.sigla_estado)).all()}
+        df["sigla_estado"] = df["co_curso"].map(ufs).fillna("")
+        return cls(df)
+
+    def indice_curso(self, co_curso):
+        i = np.searchsorted(self.cursos, co_curso)
+        return i if i < len(self.cursos) and self.cursos[i] == co_curso else None
+
+    def referencia(self, mascara_cursos, ano=None):
+        """Histograma (areas x faixas) somando os cursos selecionados."""
+        hist = self.hist if ano is None else self.hist[[self.anos.index(ano)]] if ano in self.anos else self.hist[:0]
+        return hist[:, mascara_cursos].sum(axis=(0, 1))
@@ -0,0 +1,77 @@
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from fastapi import HTTPException
+from relatorio_pdf import carregar_modelo
+
+# --- CAMADA DE EXECUÇÃO ---
+# Endpoints pesados não ocupam o threadpool padrão do FastAPI: as análises
+# (pandas/NumPy) vão para um pool de threads limitado e a renderização do PDF
+# (FPDF, puro Python e preso ao GIL) para um pool de processos. Cada pool aceita
+# no máximo `workers + fila` tarefas; acima disso responde 503 com Retry-After.
+
+THREADS_ANALISE = int(os.environ.get("P360_THREADS_ANALISE", "4"))
+FILA_ANALISE = int(os.environ.get("P360_FILA_ANALISE", "16"))
+PROCESSOS_PDF = int(os.environ.get("P360_PROCESSOS_PDF", "2"))  # 0 = renderiza no pool de análise
+FILA_PDF = int(os.environ.get("P360_FILA_PDF", "8"))
+RETRY_AFTER = int(os.environ.get("P360_RETRY_AFTER", "5"))
+
+class PoolLimitado:
+    def __init__(self, nome, fabrica, workers, fila):
+        self.nome = nome
+        self.workers = workers
+        self.limite = workers + fila
+        self.pendentes = 0
+        self._fabrica = fabrica
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Criado sob demanda: importar main (scripts, db_creator) não sobe processos
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._fabrica(self.workers)
+            return self._executor
+
+    async def executar(self, fn, *args, **kwargs):
+        with self._lock:
+            if self.pendentes >= self.limite:
+                raise HTTPException(503, detail=f"Servidor ocupado ({self.nome}), tente novamente.",
+                                    headers={"Retry-After": str(RETRY_AFTER)})
+            self.pendentes += 1
+        try:
+            loop = asyncio.get_running_loop()
+            chamada = functools.partial(fn, *args, **kwargs)
+            if isinstance(self.executor, ThreadPoolExecutor):
+                # Leva o contexto do request (etapas do Server-Timing) para a thread
+                chamada = functools.partial(contextvars.copy_context().run, chamada)
+            return await loop.run_in_executor(self.executor, chamada)
+        finally:
+            with self._lock:
+                self.pendentes -= 1
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+POOL_ANALISE = PoolLimitado(
+    "análise", lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix="p360-analise"),
+    THREADS_ANALISE, FILA_ANALISE)
+
+# spawn: o processo filho importa só relatorio_pdf, sem herdar conexões SQLite nem locks;
+# o initializer monta o modelo do PDF (imagens decodificadas) uma vez por processo
+POOL_PDF = PoolLimitado(
+    "pdf", lambda n: ProcessPoolExecutor(max_workers=n, mp_context=multiprocessing.get_context("spawn"),
+                                         initializer=carregar_modelo),
+    PROCESSOS_PDF, FILA_PDF) if PROCESSOS_PDF > 0 else POOL_ANALISE
+
+def encerrar_pools():
+    POOL_ANALISE.encerrar()
+    POOL_PDF.encerrar()
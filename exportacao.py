@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+# --- EXPORTAÇÃO EM FLUXO (XLSX / CSV / NDJSON) ---
+# Cada bloco de cursos vira um DataFrame pequeno que é serializado e descartado
+# antes do próximo: a memória depende do tamanho do bloco, não do total de
+# alunos exportados. CSV e NDJSON saem pela rede bloco a bloco; o XLSX usa o
+# modo write-only do openpyxl (linhas vão direto para disco, sem manter a
+# planilha em memória) e só é enviado ao final, porque o .xlsx é um zip.
+#
+# Layouts: nivel=grande_area -> uma linha por aluno, uma coluna por área (o
+# layout do /exportar original); subespecialidade/diagnostico -> uma linha por
+# aluno x grupo com acertos, total e % (formato longo).
+
+NIVEIS = ("grande_area", "subespecialidade", "diagnostico")
+FORMATOS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+COLUNA_MEDIA = "Média Geral (%)"
+ABA = "Desempenho por Aluno"
+
+def tabela_por_area(metricas, areas=None, co_curso=None):
+    """
+    Uma linha por aluno com o % de acertos em cada grande_area. `areas` fixa as
+    colunas (exportação de vários cursos); sem ela, só as áreas presentes no curso.
+    """
+    indice = metricas.taxonomia
+    acertos, total = indice.somas_bits(metricas.bits, metricas.idx_caderno, "grande_area")
+    nomes = indice.rotulos["grande_area"]["grande_area"].to_numpy()
+    alunos = total.sum(axis=1) > 0
+    colunas = total.sum(axis=0) > 0 if areas is None else np.isin(nomes, areas)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        medias = np.where(total > 0, acertos / total, np.nan)[np.ix_(alunos, colunas)] * 100
+    ordem = np.argsort(metricas.ids[alunos], kind="stable")
+    tabela = pd.DataFrame(medias[ordem], columns=nomes[colunas])
+    if areas is not None: tabela = tabela.reindex(columns=list(areas))
+    tabela.insert(0, "aluno_registro_id", metricas.ids[alunos][ordem])
+    if co_curso is not None: tabela.insert(0, "co_curso", co_curso)
+    tabela[COLUNA_MEDIA] = tabela.iloc[:, 2 if co_curso is not None else 1:].mean(axis=1, skipna=True).round(2)
+    return tabela
+
+def tabela_detalhe(metricas, nivel, co_curso):
+    """Formato longo: (co_curso, aluno, grupo do nível, acertos, total, %) só onde o aluno tem questões."""
+    indice = metricas.taxonomia
+    acertos, total = indice.somas_bits(metricas.bits, metricas.idx_caderno, nivel)
+    ordem = np.argsort(metricas.ids, kind="stable")
+    linhas, grupos = np.nonzero(total[ordem] > 0)
+    alunos = ordem[linhas]
+    tabela = indice.rotulos[nivel].iloc[grupos].reset_index(drop=True)
+    tabela.insert(0, "aluno_registro_id", metricas.ids[alunos])
+    tabela.insert(0, "co_curso", co_curso)
+    tabela["acertos"] = acertos[alunos, grupos].astype(np.int64)
+    tabela["total"] = total[alunos, grupos].astype(np.int64)
+    tabela["acerto_pct"] = (tabela["acertos"] / tabela["total"] * 100).round(2)
+    return tabela
+
+def serializar(tabela, formato, cabecalho):
+    if tabela.empty and not cabecalho: return ""
+    if formato == "csv":
+        return tabela.to_csv(index=False, header=cabecalho, sep=";", lineterminator="\n")
+    texto = tabela.to_json(orient="records", lines=True, force_ascii=False)
+    return texto if texto.endswith("\n") or not texto else texto + "\n"
+
+def escrever_xlsx(tabelas, destino, aba=ABA):
+    """Grava um iterável de DataFrames (mesmas colunas) em modo write-only."""
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet(aba)
+    cabecalho = False
+    for tabela in tabelas:
+        if not cabecalho:
+            planilha.append([str(c) for c in tabela.columns])
+            cabecalho = True
+        for linha in tabela.itertuples(index=False, name=None):
+            planilha.append([None if isinstance(v, float) and v != v else v for v in linha])
+    livro.save(destino)
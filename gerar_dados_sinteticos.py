@@ -0,0 +1,129 @@
+import argparse
+import os
+import shutil
+import time
+import numpy as np
+import pandas as pd
+from motor_correcao import N_QUESTOES, ANULADAS
+
+# --- GERADOR DE DADOS SINTÉTICOS (FORMATO ENAMED) ---
+# Produz base_alunos.csv, base_gabarito.csv, Base_mapeamento.xlsx e
+# mapeamento_localidade.xlsx no mesmo layout que o db_creator lê, em qualquer
+# escala (10 mil a 1 milhão de alunos). Os gabaritos e o mapeamento reais do
+# repositório servem de modelo: cadernos extras são permutações das questões
+# dos originais, como nas provas reais. A semente torna a base reprodutível.
+
+DIRETORIO_REPO = os.path.dirname(os.path.abspath(__file__))
+LETRAS = np.frombuffer(b"ABCD", dtype=np.uint8)
+IMAGENS = ["logo_branca.png", "cenario_paciente.png"]  # usadas pelo relatorio_pdf
+NOMES_IES = ["Universidade Federal", "Universidade Estadual", "Faculdade de Medicina", "Centro Universitário",
+             "Escola de Ciências da Saúde", "Universidade Católica", "Faculdade São José", "Instituto de Ensino Médico"]
+
+def carregar_modelos():
+    """Gabaritos, mapeamento e localidades reais que servem de molde."""
+    gab = pd.read_csv(os.path.join(DIRETORIO_REPO, "base_gabarito.csv"), sep=";", dtype=str, encoding="utf-8-sig")
+    mapa = pd.read_excel(os.path.join(DIRETORIO_REPO, "base_mapeamento.xlsx"))
+    loc = pd.read_excel(os.path.join(DIRETORIO_REPO, "mapeamento_localidade.xlsx"))
+    return gab, mapa, loc
+
+def gerar_cadernos(gab_modelo, mapa_modelo, n_cadernos, rng):
+    """Caderno k > modelos: mesmas questões do modelo (k-1) % m, em outra ordem."""
+    colunas = [f"DS_VT_GAB_OBJ.{n}" for n in range(1, N_QUESTOES + 1)]
+    gab_modelo = gab_modelo.set_index(gab_modelo["CO_CADERNO"].astype(int))
+    modelos = sorted(gab_modelo.index)
+    gabaritos, mapas = [], []
+    for k in range(1, n_cadernos + 1):
+        origem = modelos[(k - 1) % len(modelos)]
+        ordem = np.arange(N_QUESTOES) if k <= len(modelos) else rng.permutation(N_QUESTOES)
+        respostas = gab_modelo.loc[origem, colunas].to_numpy()[ordem]
+        gabaritos.append([k, *respostas])
+        mapa = mapa_modelo[mapa_modelo["CO_CADERNO"] == origem].copy()
+        nova_posicao = np.empty(N_QUESTOES, dtype=int)
+        nova_posicao[ordem] = np.arange(1, N_QUESTOES + 1)
+        mapa["NU_QUESTAO"] = nova_posicao[mapa["NU_QUESTAO"].astype(int) - 1]
+        mapa["CO_CADERNO"] = k
+        mapas.append(mapa.sort_values("NU_QUESTAO"))
+    return pd.DataFrame(gabaritos, columns=["CO_CADERNO", *colunas]), pd.concat(mapas, ignore_index=True)
+
+def gerar_cursos(loc_modelo, n_cursos, rng):
+    """Cursos reais primeiro; acima disso, códigos novos em UFs/municípios sorteados."""
+    loc = loc_modelo.drop_duplicates("CO_CURSO").reset_index(drop=True)
+    if n_cursos > len(loc):
+        extras = loc.iloc[rng.integers(0, len(loc), n_cursos - len(loc))].copy()
+        extras["CO_CURSO"] = np.arange(1, len(extras) + 1) + int(loc["CO_CURSO"].max()) + 1000
+        loc = pd.concat([loc, extras], ignore_index=True)
+    loc = loc.iloc[:n_cursos].reset_index(drop=True)
+    cursos = pd.DataFrame({
+        "CO_CURSO": loc["CO_CURSO"].astype(int),
+        "IES_NOME": [f"{NOMES_IES[i % len(NOMES_IES)]} {m.title()} {c}" for i, (m, c) in enumerate(zip(loc["IES_MUNIC"], loc["CO_CURSO"]))],
+        "ENAMED_IES": rng.choice(["1", "2", "3", "4", "5"], len(loc), p=[0.1, 0.2, 0.35, 0.25, 0.1]),
+        "P360": rng.choice(["S", "N"], len(loc), p=[0.2, 0.8]),
+        "habilidade": rng.normal(0.0, 0.6, len(loc)),  # efeito do curso no desempenho
+        "peso": rng.pareto(1.5, len(loc)) + 1,  # poucos cursos grandes, muitos pequenos
+    })
+    return loc, cursos
+
+def gerar_alunos(caminho, n_alunos, cursos, gabaritos, anos, rng, bloco=100_000):
+    """Escreve o CSV em blocos (memória constante). Acerto ~ logística(habilidade - dificuldade)."""
+    colunas_q = [f"DS_VT_ESC_OBJ.{n}" for n in range(1, N_QUESTOES + 1)]
+    matriz_gab = np.array([[str(g)[:1].upper().encode("latin-1", "replace")[0] if str(g) else 32 for g in linha]
+                           for linha in gabaritos.iloc[:, 1:].to_numpy()], dtype=np.uint8)
+    anulada = np.isin(matriz_gab, np.frombuffer(ANULADAS, dtype=np.uint8)) | ~np.isin(matriz_gab, LETRAS)
+    dificuldade = rng.normal(0.0, 1.0, matriz_gab.shape)
+    probabilidade_curso = cursos["peso"].to_numpy() / cursos["peso"].sum()
+
+    escritos = 0
+    # latin1 como o export real do INEP (e como o db_creator lê)
+    with open(caminho, "w", encoding="latin1", newline="") as f:
+        while escritos < n_alunos:
+            n = min(bloco, n_alunos - escritos)
+            curso = rng.choice(len(cursos), n, p=probabilidade_curso)
+            caderno = rng.integers(0, len(gabaritos), n)
+            theta = cursos["habilidade"].to_numpy()[curso] + rng.normal(0.0, 1.0, n)
+            p_acerto = 1 / (1 + np.exp(-(theta[:, None] + 0.8 - dificuldade[caderno])))
+            acerta = rng.random((n, N_QUESTOES)) < p_acerto
+            distrator = LETRAS[rng.integers(0, 4, (n, N_QUESTOES))]
+            respostas = np.where(acerta & ~anulada[caderno], matriz_gab[caderno], distrator)
+            respostas[rng.random((n, N_QUESTOES)) < 0.01] = ord(".")  # em branco
+
+            df = pd.DataFrame(respostas.view("S1").astype(str), columns=colunas_q)
+            df.insert(0, "NU_ANO", rng.choice(anos, n))
+            df.insert(1, "CO_CURSO", cursos["CO_CURSO"].to_numpy()[curso])
+            df.insert(2, "CO_CADERNO", gabaritos["CO_CADERNO"].to_numpy()[caderno])
+            df.insert(3, "IES_NOME", cursos["IES_NOME"].to_numpy()[curso])
+            df.insert(4, "P360", cursos["P360"].to_numpy()[curso])
+            df.insert(5, "ENAMED_IES", cursos["ENAMED_IES"].to_numpy()[curso])
+            df.to_csv(f, sep=";", index=False, header=escritos == 0)
+            escritos += n
+            print(f"   Progresso: {escritos}/{n_alunos} alunos...", end="\r")
+    print()
+
+def gerar(saida, alunos=10_000, cadernos=4, cursos=350, anos=(2025,), semente=42):
+    print(f"🧪 Gerando base sintética: {alunos} alunos, {cadernos} cadernos, {cursos} cursos em {saida}/")
+    inicio = time.perf_counter()
+    rng = np.random.default_rng(semente)
+    os.makedirs(saida, exist_ok=True)
+
+    gab_modelo, mapa_modelo, loc_modelo = carregar_modelos()
+    df_gab, df_mapa = gerar_cadernos(gab_modelo, mapa_modelo, cadernos, rng)
+    df_loc, df_cursos = gerar_cursos(loc_modelo, cursos, rng)
+
+    df_gab.to_csv(os.path.join(saida, "base_gabarito.csv"), sep=";", index=False, encoding="utf-8-sig")
+    df_mapa.to_excel(os.path.join(saida, "Base_mapeamento.xlsx"), index=False)
+    df_loc.to_excel(os.path.join(saida, "mapeamento_localidade.xlsx"), index=False)
+    gerar_alunos(os.path.join(saida, "base_alunos.csv"), alunos, df_cursos, df_gab, list(anos), rng)
+    for imagem in IMAGENS:
+        origem = os.path.join(DIRETORIO_REPO, imagem)
+        if os.path.exists(origem): shutil.copy(origem, saida)
+    print(f"✅ Base sintética pronta em {time.perf_counter() - inicio:.1f}s.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera uma base ENAMED sintética para testes de carga")
+    parser.add_argument("--saida", default="dados_sinteticos", help="diretório de saída")
+    parser.add_argument("--alunos", type=int, default=10_000)
+    parser.add_argument("--cadernos", type=int, default=4)
+    parser.add_argument("--cursos", type=int, default=350)
+    parser.add_argument("--anos", type=int, nargs="+", default=[2025])
+    parser.add_argument("--semente", type=int, default=42)
+    args = parser.parse_args()
+    gerar(args.saida, args.alunos, args.cadernos, args.cursos, args.anos, args.semente)
@@ -1,18 +1,61 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlmodel import Session, select, create_engine, func
+from fastapi import FastAPI, Depends, HTTPException, Request, Query
+from sqlmodel import Session, select, func
 from typing import List, Optional
 import pandas as pd
-from models import Aluno, Localidade, QuestaoMapeamento, Gabarito
-from fastapi.responses import StreamingResponse
-from fpdf import FPDF
+import numpy as np
+from models import Aluno, Localidade, QuestaoMapeamento, Gabarito, VersaoDados, CasoRecomendado
+from fastapi.responses import Response, FileResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from starlette.background import BackgroundTask
+import asyncio
 import io
+import os
+import tempfile
+import zipfile
+import json
+import time
+import threading
 from fastapi.middleware.cors import CORSMiddleware
-from functools import lru_cache
+from contextlib import asynccontextmanager
+from collections import namedtuple
+from motor_correcao import (N_BYTES_BITS, montar_gabaritos, corrigir, indices_caderno, respostas_para_matriz,
+                            empacotar, desempacotar, bytes_para_bits)
+from taxonomia import IndiceTaxonomia
+from ranking import IndiceRanking
+from busca_ies import IndiceIES
+from cubo import CuboComparacao, interpretar_cohort
+from exportacao import NIVEIS as NIVEIS_EXPORTACAO, FORMATOS as FORMATOS_EXPORTACAO, tabela_por_area, tabela_detalhe, serializar, escrever_xlsx
+from psicometria import EstatisticasQuestoes, registros as registros_questoes
+from portfolio import IndicePortfolio
+from distribuicao import DistribuicoesReferencia, faixas_por_area, histograma, quantis, percentis
+from colunar import abrir_armazem
+from analitico import BACKEND_ANALITICO, abrir_backend, BackendSQLite
+from banco import criar_engine_leitura
+from relatorio_pdf import renderizar_pdf, renderizar_lote
+from execucao import POOL_ANALISE, POOL_PDF, encerrar_pools
+from artefatos import CacheArtefatos, etag_confere
+from memoizacao import CacheResultados
+from contexto import ler_contexto, ler_snapshot
+from metricas import REGISTRO, SERVER_TIMING, etapa, contar_cache, contar_linhas, iniciar_request, encerrar_request, server_timing
 
 # --- CONFIGURAÇÃO DO BANCO ---
 sqlite_url = "sqlite:///plataforma_educacional.db"
-engine = create_engine(sqlite_url)
-app = FastAPI(title="P360 Analytics API")
+engine = criar_engine_leitura(sqlite_url)
+
+INICIO_PROCESSO = time.monotonic()
+METRICAS_INICIALIZACAO = {"aquecimento_s": None, "origem_contexto": None, "backend_analitico_s": None, "primeiro_dashboard_s": None}
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Aquece antes de aceitar requests: o primeiro usuário não paga o referencial
+    await run_in_threadpool(aquecer)
+    METRICAS_INICIALIZACAO["inicializacao_s"] = round(time.monotonic() - INICIO_PROCESSO, 3)
+    print(f"⏱️ API pronta em {METRICAS_INICIALIZACAO['inicializacao_s']}s (contexto: {METRICAS_INICIALIZACAO['origem_contexto']})")
+    yield
+    encerrar_pools()
+
+app = FastAPI(title="P360 Analytics API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,171 +65,487 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def medir_requests(request: Request, call_next):
+    """Duração/status por rota (template, não o path cru) e, se ativado, o cabeçalho Server-Timing."""
+    token, etapas = iniciar_request()
+    inicio, status = time.perf_counter(), 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        duracao = time.perf_counter() - inicio
+        rota = getattr(request.scope.get("route"), "path", "nao_roteada")
+        REGISTRO.observar("p360_request_segundos", duracao, rota=rota, metodo=request.method)
+        REGISTRO.contar("p360_requests_total", rota=rota, metodo=request.method, status=status)
+        encerrar_request(token)
+    if SERVER_TIMING: response.headers["Server-Timing"] = server_timing(etapas, duracao)
+    return response
+
 # --- VARIÁVEIS GLOBAIS E CACHE ---
 REFERENCIAL_CACHE = None
+RANKING_CACHE = None
+CUBO_CACHE = None
+DISTRIBUICAO_CACHE = None
+BUSCA_IES_CACHE = None
+QUESTOES_CACHE = None
+PORTFOLIO_CACHE = None
+CACHE_ARTEFATOS = CacheArtefatos()
 
 def get_session():
+    aquecer()
     with Session(engine) as session:
+        sincronizar_versao(session)
         yield session
 
-def carregar_contexto():
+def com_sessao(fn, *args):
+    """Executa fn(*args, session) com sessão própria - usado dentro dos pools de execução."""
+    aquecer()
+    with Session(engine) as session:
+        sincronizar_versao(session)
+        return fn(*args, session)
+
+def carregar_contexto(versao=None):
+    """
+    Gabaritos, mapeamento e (se houver) referencial. Tenta o snapshot Parquet da
+    versão informada e cai para o banco se ele não existir, for de outra versão
+    ou estiver vazio/incompleto.
+    """
+    snapshot = ler_snapshot(versao) if versao else None
+    if snapshot is not None:
+        gabarito_map, df_mapa, df_referencial = snapshot
+        return gabarito_map, df_mapa, df_referencial.rename(columns={'acerto': 'media_nacional'}), "snapshot"
     try:
         with Session(engine) as session:
-            gabs = session.exec(select(Gabarito)).all()
-            if not gabs: return {}, pd.DataFrame()
-            
-            gabarito_map = {g.co_caderno: list(g.respostas_gabarito) for g in gabs}
-            mapas = session.exec(select(QuestaoMapeamento)).all()
-            df_mapa = pd.DataFrame([m.model_dump() for m in mapas])
-            
-            return gabarito_map, df_mapa
+            gabarito_map, df_mapa = ler_contexto(session)
+            return gabarito_map, df_mapa, None, "banco"
     except Exception as e:
         print(f"❌ Erro ao carregar contexto: {e}")
-        return {}, pd.DataFrame()
+        return {}, pd.DataFrame(), None, "vazio"
+
+# Preenchidos por aquecer() (lifespan ou primeiro uso, em scripts)
+GABARITO_CACHE, DF_MAPA_CACHE = {}, pd.DataFrame()
+GABARITO_MATRIZ = montar_gabaritos(GABARITO_CACHE)
+INDICE_TAXONOMIA = IndiceTaxonomia(DF_MAPA_CACHE, GABARITO_MATRIZ)
+_LOCK_CONTEXTO = threading.Lock()
+_LOCK_REFERENCIAL = threading.Lock()
+_LOCK_RANKING = threading.Lock()
+_LOCK_CUBO = threading.Lock()
+_LOCK_DISTRIBUICAO = threading.Lock()
+_LOCK_BUSCA_IES = threading.Lock()
+_LOCK_QUESTOES = threading.Lock()
+_LOCK_PORTFOLIO = threading.Lock()
+_CONTEXTO_PRONTO = False
+
+def montar_indices():
+    """Recalcula GABARITO_MATRIZ e INDICE_TAXONOMIA a partir de GABARITO_CACHE/DF_MAPA_CACHE."""
+    global GABARITO_MATRIZ, INDICE_TAXONOMIA
+    GABARITO_MATRIZ = montar_gabaritos(GABARITO_CACHE)
+    INDICE_TAXONOMIA = IndiceTaxonomia(DF_MAPA_CACHE, GABARITO_MATRIZ)
+
+def aquecer():
+    """
+    Lê a versão dos dados e carrega o contexto, o armazém colunar e o backend
+    analítico uma única vez por processo (single-flight: quem chega junto espera
+    o mesmo carregamento). Importar main não toca o disco nem o banco.
+    """
+    global GABARITO_CACHE, DF_MAPA_CACHE, REFERENCIAL_CACHE, ANALITICO, ARMAZEM_COLUNAR, VERSAO_DADOS, _CONTEXTO_PRONTO
+    if _CONTEXTO_PRONTO: return
+    with _LOCK_CONTEXTO:
+        if _CONTEXTO_PRONTO: return
+        inicio = time.monotonic()
+        with Session(engine) as session:
+            VERSAO_DADOS = versao_atual(session)
+        CACHE_RESULTADOS.limpar(VERSAO_DADOS)
+        GABARITO_CACHE, DF_MAPA_CACHE, referencial, origem = carregar_contexto(VERSAO_DADOS)
+        montar_indices()
+        # Só um referencial não vazio dispensa o cálculo; vazio seria servido pela vida toda do processo
+        if referencial is not None and not referencial.empty: REFERENCIAL_CACHE = referencial
+        ARMAZEM_COLUNAR = carregar_armazem()
+        inicio_backend = time.monotonic()
+        ANALITICO = carregar_backend_analitico()
+        METRICAS_INICIALIZACAO["backend_analitico_s"] = round(time.monotonic() - inicio_backend, 3)
+        with Session(engine) as session:
+            carregar_referencial_nacional(session)
+            carregar_indice_ranking(session)
+            carregar_cubo(session)
+            carregar_distribuicoes(session)
+            carregar_busca_ies(session)
+            carregar_portfolio(session)
+        METRICAS_INICIALIZACAO["aquecimento_s"] = round(time.monotonic() - inicio, 3)
+        METRICAS_INICIALIZACAO["origem_contexto"] = origem
+        _CONTEXTO_PRONTO = True
+
+def carregar_armazem():
+    try:
+        with Session(engine) as session:
+            return abrir_armazem(session)
+    except Exception as e:
+        print(f"⚠️ Armazém colunar não carregado: {e}")
+        return None
+
+# Respostas em colunas mmap (compartilhadas entre workers), aberto em aquecer(); None = ler do SQLite
+ARMAZEM_COLUNAR = None
+
+def carregar_backend_analitico():
+    """Backend configurado; erros além de pacote/Parquet ausente ou desatualizado sobem (ver abrir_backend)."""
+    with Session(engine) as session:
+        backend = abrir_backend(session)
+    print(f"🧮 Backend analítico: {backend.nome}")
+    return backend
+
+# Ranking, benchmark e referencial: agregados do SQLite (padrão) ou DuckDB sobre
+# Parquet (ver analitico.py). O DuckDB é montado em aquecer(), dentro do lifespan.
+ANALITICO = BackendSQLite()
 
-GABARITO_CACHE, DF_MAPA_CACHE = carregar_contexto()
+# --- VERSÃO DOS DADOS (CARGA INCREMENTAL SEM REINÍCIO) ---
+INTERVALO_VERSAO = float(os.environ.get("P360_INTERVALO_VERSAO", "5"))
+_LOCK_VERSAO = threading.Lock()
+_ULTIMA_VERIFICACAO = 0.0
+
+def versao_atual(session):
+    try:
+        return session.exec(select(func.max(VersaoDados.versao))).one() or 0
+    except Exception:
+        return 0  # base anterior à tabela de versões
+
+def _recarregar_gabaritos(session, cadernos):
+    global GABARITO_CACHE
+    novos = session.exec(select(Gabarito).where(Gabarito.co_caderno.in_(cadernos))).all()
+    gabarito_map = {c: g for c, g in GABARITO_CACHE.items() if c not in cadernos}
+    gabarito_map.update({g.co_caderno: list(g.respostas_gabarito) for g in novos})
+    GABARITO_CACHE = gabarito_map
+
+def _recarregar_mapeamento(session, cadernos):
+    global DF_MAPA_CACHE
+    novos = pd.DataFrame([m.model_dump() for m in session.exec(
+        select(QuestaoMapeamento).where(QuestaoMapeamento.co_caderno.in_(cadernos))).all()])
+    mantidos = DF_MAPA_CACHE[~DF_MAPA_CACHE['co_caderno'].isin(cadernos)] if not DF_MAPA_CACHE.empty else DF_MAPA_CACHE
+    DF_MAPA_CACHE = pd.concat([mantidos, novos], ignore_index=True) if not novos.empty else mantidos
+
+_GERACAO_ANALITICO = 0
+
+def recarregar_backend_analitico():
+    """
+    Chamado com _LOCK_VERSAO: troca na hora para o SQLite, cujos agregados já
+    estão na versão nova (mesmos resultados), e remonta o DuckDB (leitura do
+    Parquet + correção completa) em uma thread, fora do lock e do caminho dos
+    requests. O novo backend só entra se nenhuma versão mais nova chegou antes.
+    """
+    global ANALITICO, _GERACAO_ANALITICO
+    _GERACAO_ANALITICO += 1
+    geracao = _GERACAO_ANALITICO
+    ANALITICO = BackendSQLite()
+
+    def montar():
+        global ANALITICO
+        try:
+            backend = carregar_backend_analitico()
+        except Exception as e:
+            print(f"⚠️ Backend DuckDB não remontado ({e}) - seguindo no SQLite.")
+            return
+        with _LOCK_VERSAO:
+            if geracao == _GERACAO_ANALITICO: ANALITICO = backend
+
+    threading.Thread(target=montar, name="p360-backend-analitico", daemon=True).start()
+
+def sincronizar_versao(session, forcar=False):
+    """
+    Verifica (no máximo a cada INTERVALO_VERSAO s) se o db_creator publicou uma
+    versão nova e recarrega apenas as partes dos caches afetadas pelo escopo.
+    """
+    global _ULTIMA_VERIFICACAO, VERSAO_DADOS, GABARITO_CACHE, DF_MAPA_CACHE
+    global REFERENCIAL_CACHE, RANKING_CACHE, CUBO_CACHE, DISTRIBUICAO_CACHE, BUSCA_IES_CACHE, QUESTOES_CACHE, PORTFOLIO_CACHE
+    global ARMAZEM_COLUNAR
+    agora = time.monotonic()
+    if not forcar and agora - _ULTIMA_VERIFICACAO < INTERVALO_VERSAO: return
+    _ULTIMA_VERIFICACAO = agora
+    if versao_atual(session) <= VERSAO_DADOS: return
+
+    with _LOCK_VERSAO:
+        novas = session.exec(select(VersaoDados).where(VersaoDados.versao > VERSAO_DADOS).order_by(VersaoDados.versao)).all()
+        if not novas: return
+        escopo = {}
+        for v in novas:
+            for chave, valor in json.loads(v.escopo).items():
+                if isinstance(valor, list): escopo.setdefault(chave, set()).update(valor)
+                else: escopo[chave] = valor
+        print(f"🔄 Nova versão dos dados ({novas[-1].versao}): {sorted(escopo)}")
+
+        referencial = None
+        if escopo.get("completo"):
+            GABARITO_CACHE, DF_MAPA_CACHE, referencial, _ = carregar_contexto(novas[-1].versao)
+        else:
+            if escopo.get("gabarito"): _recarregar_gabaritos(session, escopo["gabarito"])
+            if escopo.get("mapeamento"): _recarregar_mapeamento(session, escopo["mapeamento"])
+        if escopo.get("completo") or escopo.get("gabarito") or escopo.get("mapeamento"): montar_indices()
+
+        afeta = lambda *chaves: escopo.get("completo") or escopo.get("agregados") or any(escopo.get(c) for c in chaves)
+        if afeta("aluno", "gabarito", "mapeamento"): REFERENCIAL_CACHE = referencial
+        if afeta("aluno", "gabarito", "localidade"): RANKING_CACHE = None
+        if afeta("aluno", "gabarito", "mapeamento", "localidade"): CUBO_CACHE = DISTRIBUICAO_CACHE = None
+        if afeta("aluno", "localidade"): BUSCA_IES_CACHE = None
+        if afeta("aluno", "gabarito", "mapeamento"): QUESTOES_CACHE = None
+        if afeta("mapeamento", "portfolio"): PORTFOLIO_CACHE = None
+        if escopo.get("completo") or escopo.get("aluno") or escopo.get("gabarito"): ARMAZEM_COLUNAR = carregar_armazem()
+        if BACKEND_ANALITICO == "duckdb" and afeta("aluno", "gabarito", "mapeamento", "localidade"):
+            recarregar_backend_analitico()  # Parquet reexportado pelo db_creator
+        CACHE_RESULTADOS.limpar(novas[-1].versao)
+        VERSAO_DADOS = novas[-1].versao
+
+# Lida do banco em aquecer(); até lá nenhum cache foi carregado
+VERSAO_DADOS = 0
+
+# Métricas e payloads por curso da versão atual (ver memoizacao.py)
+CACHE_RESULTADOS = CacheResultados(versao=VERSAO_DADOS)
+
+def memoizado(funcao, co_curso, calcular):
+    return CACHE_RESULTADOS.obter(funcao, co_curso, calcular, VERSAO_DADOS)
 
 # --- FUNÇÕES DE SUPORTE (OTIMIZADAS PARA MEMÓRIA) ---
 
 def obter_referencial_nacional(session: Session):
     """
-    OTIMIZAÇÃO: Busca apenas as colunas necessárias (co_caderno, respostas)
-    em vez de carregar o objeto Aluno inteiro. Economiza muita RAM.
+    OTIMIZAÇÃO: Lê as somas pré-calculadas em CursoAgregadoTaxonomia
+    (geradas pelo db_creator) em vez de corrigir todos os alunos do país;
+    com o backend DuckDB, a correção e o agrupamento rodam em SQL sobre Parquet.
     """
-    statement = select(Aluno.co_caderno, Aluno.respostas)
-    todos_alunos = session.exec(statement).all()
-    
-    lista_acertos = []
-    # O loop agora desempacota a tupla (caderno, respostas)
-    for al_co_caderno, al_respostas in todos_alunos:
-        gab = GABARITO_CACHE.get(al_co_caderno)
-        if not gab: continue
-        res = list(al_respostas)
-        for i in range(min(len(res), 100)):
-            if i >= len(gab): break
-            resp_al = str(res[i]).strip().upper()
-            resp_gab = str(gab[i]).strip().upper()
-            acerto = 1 if resp_gab in ['X', 'Z', '*'] else (1 if resp_al == resp_gab else 0)
-            lista_acertos.append({"nu_questao": i + 1, "co_caderno": al_co_caderno, "acerto": acerto})
-    
-    if not lista_acertos: return pd.DataFrame()
-    df_nacional = pd.DataFrame(lista_acertos)
-    df_nacional = pd.merge(df_nacional, DF_MAPA_CACHE, on=['nu_questao', 'co_caderno'])
-    return df_nacional.groupby(['grande_area', 'subespecialidade', 'diagnostico'])['acerto'].mean().reset_index()
+    return ANALITICO.referencial_nacional(session)
 
 def carregar_referencial_nacional(session):
     global REFERENCIAL_CACHE
+    contar_cache("referencial", REFERENCIAL_CACHE is not None)
     if REFERENCIAL_CACHE is None:
-        print("🚀 Gerando cache do Referencial Nacional...")
-        df = obter_referencial_nacional(session)
-        REFERENCIAL_CACHE = df.rename(columns={'acerto': 'media_nacional'})
+        with _LOCK_REFERENCIAL:
+            if REFERENCIAL_CACHE is None:
+                print("🚀 Gerando cache do Referencial Nacional...")
+                with etapa("referencial_nacional"):
+                    df = obter_referencial_nacional(session)
+                contar_linhas("cursoagregadotaxonomia", len(df))
+                REFERENCIAL_CACHE = df.rename(columns={'acerto': 'media_nacional'})
     return REFERENCIAL_CACHE
 
+# Alunos válidos (caderno com gabarito) de um curso, já corrigidos
+MetricasCurso = namedtuple("MetricasCurso", ["ids", "idx_caderno", "acertos", "taxonomia", "bits"])
+
 def calcular_metricas_curso(co_curso: int, session: Session):
-    alunos = session.exec(select(Aluno).where(Aluno.co_curso == co_curso)).all()
-    if not alunos: return None
-    
-    dados_alunos = []
-    for al in alunos:
-        respostas = list(al.respostas)
-        if len(respostas) < 100: respostas += [' ']*(100-len(respostas))
-        dados_alunos.append([al.id, int(al.co_caderno)] + respostas[:100])
-    
-    colunas_q = [n for n in range(1, 101)]
-    df_alunos = pd.DataFrame(dados_alunos, columns=['aluno_registro_id', 'co_caderno'] + colunas_q)
-    df_corr = df_alunos.copy()
-    for col in colunas_q: df_corr[col] = 0
-
-    for caderno in df_alunos['co_caderno'].unique():
-        gab = GABARITO_CACHE.get(caderno)
-        if not gab: continue
-        mask = df_alunos['co_caderno'] == caderno
-        for i, col in enumerate(colunas_q):
-            if i >= len(gab): break
-            if gab[i] in ['X', 'Z', '*']: df_corr.loc[mask, col] = 1
-            else: df_corr.loc[mask, col] = (df_alunos.loc[mask, col] == gab[i]).astype(int)
-
-    df_long = df_corr.melt(id_vars=['aluno_registro_id', 'co_caderno'], value_vars=colunas_q, var_name='nu_questao', value_name='acerto')
-    df_long['nu_questao'] = pd.to_numeric(df_long['nu_questao']).astype(int)
-    return pd.merge(df_long, DF_MAPA_CACHE, on=['nu_questao', 'co_caderno'], how='inner')
+    """
+    OTIMIZAÇÃO: devolve a matriz de acertos (alunos x 100) e o índice do caderno
+    de cada aluno; as somas por grande_area/subespecialidade/diagnostico saem do
+    INDICE_TAXONOMIA, sem o formato longo (alunos x 100 linhas) nem o merge.
+    Memoizado por versão: /matriz, /dashboard e /exportar do curso corrigem uma vez só.
+    """
+    return memoizado("metricas", co_curso, lambda: calcular_metricas_cursos([co_curso], session).get(co_curso))
+
+def calcular_metricas_cursos(cursos, session: Session):
+    """
+    {co_curso: MetricasCurso} de vários cursos em uma passada: uma fatia do
+    armazém colunar por curso ou uma única query IN (...). A correção vem
+    pronta (acertos_bits, 13 bytes por aluno); só alunos ainda sem bits, ou um
+    armazém gravado com outros gabaritos, são corrigidos na hora.
+    Cursos sem alunos ficam fora do dict.
+    """
+    indice = INDICE_TAXONOMIA  # gabaritos e taxonomia da mesma versão
+    armazem = ARMAZEM_COLUNAR
+    if armazem is not None:
+        with etapa("colunar_fatia"):
+            intervalos = [(co_curso, *armazem.intervalo_curso(co_curso)) for co_curso in cursos]
+            intervalos = [(co_curso, ini, fim) for co_curso, ini, fim in intervalos if fim > ini]
+            if not intervalos: return {}
+            fatia = lambda coluna: np.concatenate([coluna[ini:fim] for _, ini, fim in intervalos])
+            co_cursos = np.concatenate([np.full(fim - ini, co_curso, dtype=np.int64) for co_curso, ini, fim in intervalos])
+            ids, cadernos = fatia(armazem.aluno_id), fatia(armazem.co_caderno)
+            if armazem.bits_validos(indice.gabaritos):
+                bits, corrigidos = fatia(armazem.acertos_bits), fatia(armazem.corrigido)
+            else:
+                bits, corrigidos = np.zeros((len(ids), N_BYTES_BITS), dtype=np.uint8), np.zeros(len(ids), dtype=bool)
+        contar_linhas("armazem_colunar", len(ids))
+        respostas_pendentes = lambda pendentes: fatia(armazem.respostas)[pendentes]
+    else:
+        with etapa("sql_alunos"):
+            alunos = session.exec(select(Aluno.co_curso, Aluno.id, Aluno.co_caderno, Aluno.acertos_bits)
+                                  .where(Aluno.co_curso.in_(list(cursos)))).all()
+        contar_linhas("aluno", len(alunos))
+        if not alunos: return {}
+        co_cursos = np.array([al[0] for al in alunos], dtype=np.int64)
+        ids = np.array([al[1] for al in alunos], dtype=np.int64)
+        cadernos = np.array([int(al[2]) for al in alunos], dtype=np.int64)
+        bits, corrigidos = bytes_para_bits([al[3] for al in alunos])
+
+        def respostas_pendentes(pendentes):
+            with etapa("sql_alunos"):
+                respostas = dict(session.exec(select(Aluno.id, Aluno.respostas).where(Aluno.id.in_(ids[pendentes].tolist()))).all())
+            return respostas_para_matriz([respostas.get(i) for i in ids[pendentes].tolist()])
+
+    idx_caderno, conhecidos = indices_caderno(cadernos, indice.gabaritos)
+    with etapa("correcao"):
+        # Carga em andamento ou base anterior aos bits: corrige só quem falta
+        pendentes = conhecidos & ~corrigidos
+        if pendentes.any():
+            acertos_pendentes, _ = corrigir(respostas_pendentes(pendentes), cadernos[pendentes], indice.gabaritos)
+            bits = bits.copy()
+            bits[pendentes] = empacotar(acertos_pendentes)
+            contar_linhas("recorrigidos", int(pendentes.sum()))
+        validos = conhecidos & (corrigidos | pendentes)
+
+    # Separa por curso (ordem estável: dentro do curso, a ordem de leitura)
+    ordem = np.argsort(co_cursos, kind='stable')
+    co_cursos, ids, idx_caderno, bits, validos = co_cursos[ordem], ids[ordem], idx_caderno[ordem], bits[ordem], validos[ordem]
+    inicios = np.flatnonzero(np.r_[True, co_cursos[1:] != co_cursos[:-1]])
+    resultado = {}
+    for inicio, fim in zip(inicios, np.r_[inicios[1:], len(co_cursos)]):
+        v = validos[inicio:fim]
+        bits_curso = bits[inicio:fim][v]
+        resultado[int(co_cursos[inicio])] = MetricasCurso(
+            ids[inicio:fim][v], idx_caderno[inicio:fim][v], desempacotar(bits_curso), indice, bits_curso)
+    return resultado
+
+def carregar_indice_ranking(session):
+    global RANKING_CACHE
+    contar_cache("ranking", RANKING_CACHE is not None)
+    if RANKING_CACHE is None:
+        with _LOCK_RANKING:
+            if RANKING_CACHE is None:
+                print("🚀 Gerando índice de Ranking...")
+                with etapa("indice_ranking"):
+                    RANKING_CACHE = IndiceRanking(ANALITICO.linhas_ranking(session))
+                contar_linhas("cursoagregado", len(RANKING_CACHE.nacional))
+    return RANKING_CACHE
+
+def carregar_cubo(session):
+    global CUBO_CACHE
+    contar_cache("cubo", CUBO_CACHE is not None)
+    if CUBO_CACHE is None:
+        with _LOCK_CUBO:
+            if CUBO_CACHE is None:
+                print("🚀 Carregando cubo de comparação...")
+                with etapa("cubo_carga"):
+                    CUBO_CACHE = CuboComparacao.construir(session)
+                contar_linhas("cubotaxonomia", len(CUBO_CACHE))
+    return CUBO_CACHE
+
+def carregar_distribuicoes(session):
+    global DISTRIBUICAO_CACHE
+    contar_cache("distribuicao", DISTRIBUICAO_CACHE is not None)
+    if DISTRIBUICAO_CACHE is None:
+        with _LOCK_DISTRIBUICAO:
+            if DISTRIBUICAO_CACHE is None:
+                print("🚀 Carregando distribuições de notas...")
+                with etapa("distribuicao_carga"):
+                    DISTRIBUICAO_CACHE = DistribuicoesReferencia.construir(session)
+    return DISTRIBUICAO_CACHE
+
+def carregar_busca_ies(session):
+    global BUSCA_IES_CACHE
+    contar_cache("busca_ies", BUSCA_IES_CACHE is not None)
+    if BUSCA_IES_CACHE is None:
+        with _LOCK_BUSCA_IES:
+            if BUSCA_IES_CACHE is None:
+                print("🚀 Montando índice de busca de IES...")
+                with etapa("busca_ies_carga"):
+                    BUSCA_IES_CACHE = IndiceIES.construir(session)
+                contar_linhas("aluno_distinct", len(BUSCA_IES_CACHE))
+    return BUSCA_IES_CACHE
+
+def carregar_estatisticas_questoes(session):
+    """Montado no primeiro uso (uma passada por todas as respostas), não no aquecimento."""
+    global QUESTOES_CACHE
+    contar_cache("questoes", QUESTOES_CACHE is not None)
+    if QUESTOES_CACHE is None:
+        with _LOCK_QUESTOES:
+            if QUESTOES_CACHE is None:
+                print("🚀 Calculando estatísticas por questão...")
+                with etapa("questoes_carga"):
+                    QUESTOES_CACHE = EstatisticasQuestoes.construir(INDICE_TAXONOMIA.gabaritos, DF_MAPA_CACHE, session, ARMAZEM_COLUNAR)
+                contar_linhas("questoes_alunos", len(QUESTOES_CACHE))
+    return QUESTOES_CACHE
+
+def carregar_portfolio(session):
+    """Casos recomendados por diagnóstico (tabela CasoRecomendado, casada pelo db_creator) + cobertura do portfólio."""
+    global PORTFOLIO_CACHE
+    contar_cache("portfolio", PORTFOLIO_CACHE is not None)
+    if PORTFOLIO_CACHE is None:
+        with _LOCK_PORTFOLIO:
+            if PORTFOLIO_CACHE is None:
+                try:
+                    linhas = [c.model_dump() for c in session.exec(select(CasoRecomendado)).all()]
+                except Exception as e:
+                    print(f"⚠️ Casos recomendados indisponíveis (rode db_creator.py --incremental --portfolio): {e}")
+                    linhas = []
+                PORTFOLIO_CACHE = IndicePortfolio(linhas, DF_MAPA_CACHE)
+    return PORTFOLIO_CACHE
 
 def obter_ranking_ies(session: Session, co_curso: int, uf: Optional[str] = None):
-    # Otimização também aplicada aqui: Select específico
-    statement = select(Aluno.co_curso, Aluno.ies_nome, Aluno.respostas, Aluno.co_caderno)
-    if uf:
-        sub = select(Localidade.co_curso).where(Localidade.sigla_estado == uf)
-        statement = statement.where(Aluno.co_curso.in_(sub))
-    
-    todos = session.exec(statement).all()
-    resultados = {}
-    
-    # Desempacotamento da tupla retornada pelo select específico
-    for r_co_curso, r_ies_nome, r_respostas, r_co_caderno in todos:
-        if r_co_curso not in resultados: 
-            resultados[r_co_curso] = {"nome": r_ies_nome, "acertos": 0, "total": 0, "co_curso": r_co_curso}
-        gab = GABARITO_CACHE.get(r_co_caderno)
-        if not gab: continue
-        res = list(r_respostas)
-        for i in range(min(len(res), 100)):
-            resultados[r_co_curso]["total"] += 1
-            if i < len(gab) and (gab[i] in ['X','Z','*'] or res[i] == gab[i]): 
-                resultados[r_co_curso]["acertos"] += 1
-    
-    ranking = []
-    for cid, dados in resultados.items():
-        media = (dados["acertos"] / dados["total"] * 100) if dados["total"] > 0 else 0
-        ranking.append({"co_curso": cid, "nome": dados["nome"], "media": round(media, 1)})
-    
-    ranking = sorted(ranking, key=lambda x: x['media'], reverse=True)
-    posicao = next((i for i, item in enumerate(ranking) if item["co_curso"] == co_curso), 0) + 1
-    return ranking, posicao, len(ranking)
+    indice = carregar_indice_ranking(session)
+    with etapa("ranking"):
+        ranking = indice.lista(uf)
+        return ranking, indice.posicao(co_curso, uf), len(ranking)
 
 # ==========================================
-# 1. ENDPOINTS DE DADOS
+# 1. ANÁLISES POR CURSO (RODAM NOS POOLS, VER SEÇÃO 3)
 # ==========================================
 
 @app.get("/")
 def home():
     return {"status": "API P360 Online 🚀"}
 
-@app.get("/ies/{co_curso}/matriz")
-def matriz_priorizacao(co_curso: int, session: Session = Depends(get_session)):
-    df = calcular_metricas_curso(co_curso, session)
-    if df is None: raise HTTPException(404)
-    matriz = df.groupby(['grande_area', 'subespecialidade']).agg(
-        acerto_medio=('acerto', 'mean'),
-        volume_questoes=('nu_questao', 'nunique')
-    ).reset_index()
-    matriz['acerto_medio'] = matriz['acerto_medio'] * 100
+@app.get("/status")
+def status():
+    return {"versao_dados": VERSAO_DADOS, "backend_analitico": ANALITICO.nome, "inicializacao": METRICAS_INICIALIZACAO,
+            "cache_resultados": CACHE_RESULTADOS.estatisticas()}
+
+def _metricas_estado():
+    """Gauges lidos na hora da coleta: versão dos dados, ocupação dos pools e tempos de inicialização."""
+    amostras = [("p360_versao_dados", "gauge", "Versão dos dados carregada neste processo.", {}, VERSAO_DADOS)]
+    for pool in [POOL_ANALISE] + ([POOL_PDF] if POOL_PDF is not POOL_ANALISE else []):
+        amostras.append(("p360_pool_pendentes", "gauge", "Tarefas em execução ou na fila do pool.", {"pool": pool.nome}, pool.pendentes))
+        amostras.append(("p360_pool_limite", "gauge", "Máximo de tarefas (workers + fila) do pool.", {"pool": pool.nome}, pool.limite))
+    cache = CACHE_RESULTADOS.estatisticas()
+    amostras.append(("p360_cache_resultados_bytes", "gauge", "Memória estimada dos resultados memoizados por curso.", {}, cache["bytes"]))
+    amostras.append(("p360_cache_resultados_entradas", "gauge", "Resultados memoizados por curso.", {}, cache["entradas"]))
+    for nome, valor in METRICAS_INICIALIZACAO.items():
+        if isinstance(valor, (int, float)):
+            amostras.append(("p360_inicializacao_segundos", "gauge", "Tempos de inicialização do processo.", {"etapa": nome}, valor))
+    return amostras
+
+REGISTRO.coletores.append(_metricas_estado)
+
+@app.get("/metrics")
+def metricas_prometheus():
+    return PlainTextResponse(REGISTRO.exportar(), media_type="text/plain; version=0.0.4")
+
+def matriz_priorizacao(co_curso: int, session: Session):
+    return memoizado("matriz", co_curso, lambda: _matriz_priorizacao(co_curso, session))
+
+def _matriz_priorizacao(co_curso: int, session: Session):
+    metricas = calcular_metricas_curso(co_curso, session)
+    if metricas is None: raise HTTPException(404)
+    indice = metricas.taxonomia
+    with etapa("agregacao_taxonomia"):
+        acertos, total = indice.somas(metricas.acertos, metricas.idx_caderno, "subespecialidade")
+        presentes = total > 0
+        matriz = indice.rotulos["subespecialidade"][presentes].reset_index(drop=True)
+        matriz['acerto_medio'] = acertos[presentes] / total[presentes] * 100
+        matriz['volume_questoes'] = indice.volume_questoes(metricas.idx_caderno, "subespecialidade")[presentes]
     return matriz.to_dict(orient='records')
 
-@app.get("/ies/{co_curso}/benchmark")
-def obter_benchmark(co_curso: int, session: Session = Depends(get_session)):
-    # OTIMIZAÇÃO: Select apenas das colunas necessárias
-    statement = select(Aluno.co_curso, Aluno.co_caderno, Aluno.respostas, Aluno.enamed_ies)
-    todos_alunos = session.exec(statement).all()
-    
-    if not todos_alunos: 
+def obter_benchmark(co_curso: int, session: Session):
+    return memoizado("benchmark", co_curso, lambda: benchmarks_cursos([co_curso], session)[co_curso])
+
+def benchmarks_cursos(cursos, session: Session):
+    """{co_curso: benchmark}: uma leitura dos agregados e as médias nacional/elite calculadas uma vez."""
+    # OTIMIZAÇÃO: Somas por curso pré-calculadas (CursoAgregado ou DuckDB), sem varrer a tabela aluno
+    with etapa("sql_benchmark"):
+        somas = ANALITICO.somas_benchmark(cursos, session)
+    if somas is None:
         raise HTTPException(404, detail="Banco vazio")
 
-    def calcular_media_lista(lista_filtrada):
-        acertos, total = 0, 0
-        # Loop ajustado para tuplas
-        for al_co_curso, al_co_caderno, al_respostas, _ in lista_filtrada:
-            gab = GABARITO_CACHE.get(al_co_caderno)
-            if not gab: continue
-            res = list(al_respostas)
-            for i in range(min(len(res), 100)):
-                total += 1
-                if i < len(gab) and (gab[i] in ['X','Z','*'] or res[i] == gab[i]): 
-                    acertos += 1
-        return (acertos / total * 100) if total > 0 else 0
-
-    # Filtros ajustados para índices da tupla (0=co_curso, 3=enamed_ies)
-    media_ies = calcular_media_lista([a for a in todos_alunos if a[0] == co_curso])
-    media_nac = calcular_media_lista(todos_alunos)
-    media_elite = calcular_media_lista([a for a in todos_alunos if str(a[3]).strip() == '5'])
+    media = lambda acertos, total: (acertos / total * 100) if total > 0 else 0
+    nacional, elite, por_curso = somas
+    media_nac, media_elite = media(*nacional), media(*elite)
+    return {co_curso: montar_benchmark(media(*por_curso[co_curso]), media_nac, media_elite) for co_curso in cursos}
 
+def montar_benchmark(media_ies, media_nac, media_elite):
     return {
         "performance": {
             "ies_atual": round(media_ies, 2),
@@ -199,35 +558,70 @@ def obter_benchmark(co_curso: int, session: Session = Depends(get_session)):
         }
     }
 
-@app.get("/ies/{co_curso}/exportar")
-def exportar_excel(co_curso: int, session: Session = Depends(get_session)):
-    df_detalhado = calcular_metricas_curso(co_curso, session)
-    if df_detalhado is None: raise HTTPException(404, detail="Não há dados.")
-    
-    relatorio = df_detalhado.groupby(['aluno_registro_id', 'grande_area'])['acerto'].mean().unstack()
-    relatorio = relatorio.apply(pd.to_numeric, errors='coerce') * 100
-    relatorio['Média Geral (%)'] = relatorio.mean(axis=1, skipna=True).round(2)
+def exportar_excel(co_curso: int, session: Session):
+    """Bytes do .xlsx de desempenho por aluno (servido via cache de artefatos)."""
+    metricas = calcular_metricas_curso(co_curso, session)
+    if metricas is None: raise HTTPException(404, detail="Não há dados.")
+
+    # Acertos por aluno x grande_area em um produto matricial (uma linha por aluno)
+    with etapa("agregacao_taxonomia"):
+        relatorio = tabela_por_area(metricas)
     
     output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        relatorio.to_excel(writer, sheet_name='Desempenho por Aluno')
-    output.seek(0)
-    return StreamingResponse(output, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            headers={"Content-Disposition": f"attachment; filename=Relatorio_IES_{co_curso}.xlsx"})
+    with etapa("excel_escrita"):
+        escrever_xlsx([relatorio], output)
+    return output.getvalue()
 
-# --- DASHBOARD DEFINIDO AQUI (ANTES DO PDF) ---
-@app.get("/ies/{co_curso}/dashboard")
-def dashboard_completo(co_curso: int, session: Session = Depends(get_session)):
+def exportar_bloco(cursos, nivel, areas, session: Session):
+    """DataFrame de exportação de um bloco de cursos (uma leitura + correção para o bloco)."""
+    metricas = calcular_metricas_cursos(cursos, session)
+    with etapa("agregacao_taxonomia"):
+        if nivel == "grande_area":
+            partes = [tabela_por_area(metricas[c], areas, c) for c in cursos if c in metricas]
+        else:
+            partes = [tabela_detalhe(metricas[c], nivel, c) for c in cursos if c in metricas]
+    partes = [p for p in partes if len(p)]
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+def exportar_xlsx_arquivo(blocos, nivel, areas, session: Session):
+    """XLSX write-only em arquivo temporário, bloco a bloco; devolve o caminho."""
+    arquivo = tempfile.NamedTemporaryFile(prefix="p360_export_", suffix=".xlsx", delete=False)
+    arquivo.close()
+    tabelas = (exportar_bloco(bloco, nivel, areas, session) for bloco in blocos)
+    with etapa("excel_escrita"):
+        escrever_xlsx((t for t in tabelas if not t.empty), arquivo.name)
+    return arquivo.name
+
+def dashboard_completo(co_curso: int, session: Session):
+    return memoizado("dashboard", co_curso, lambda: _dashboard_completo(co_curso, session))
+
+def _dashboard_completo(co_curso: int, session: Session):
     df_referencial = carregar_referencial_nacional(session)
-    df_ies = calcular_metricas_curso(co_curso, session)
-    
-    if df_ies is None or df_ies.empty: 
+    metricas = calcular_metricas_curso(co_curso, session)
+    ies_nome = nomes_ies([co_curso], session).get(co_curso) if metricas is not None else None
+    return montar_dashboard(metricas, ies_nome, df_referencial, carregar_portfolio(session))
+
+def nomes_ies(cursos, session: Session):
+    with etapa("sql_dashboard"):
+        linhas = session.exec(select(Aluno.co_curso, func.min(Aluno.ies_nome))
+                              .where(Aluno.co_curso.in_(list(cursos))).group_by(Aluno.co_curso)).all()
+    return {l[0]: l[1] for l in linhas}
+
+def montar_dashboard(metricas, ies_nome, df_referencial, portfolio):
+    """Dashboard a partir das métricas já corrigidas (um curso do lote ou o request individual)."""
+    if metricas is None:
+        raise HTTPException(404, detail="IES sem dados")
+    indice = metricas.taxonomia
+    with etapa("agregacao_taxonomia"):
+        acertos, total = indice.somas(metricas.acertos, metricas.idx_caderno, "diagnostico")
+    if total.sum() == 0:
         raise HTTPException(404, detail="IES sem dados")
     
-    ies_nome = session.exec(select(Aluno.ies_nome).where(Aluno.co_curso == co_curso)).first() or "IES"
-
-    agrupado_ies = df_ies.groupby(['grande_area', 'subespecialidade', 'diagnostico'])['acerto'].mean().reset_index()
-    df_comparativo = pd.merge(agrupado_ies, df_referencial, on=['grande_area', 'subespecialidade', 'diagnostico'])
+    presentes = total > 0
+    agrupado_ies = indice.rotulos["diagnostico"][presentes].reset_index(drop=True)
+    agrupado_ies['acerto'] = acertos[presentes] / total[presentes]
+    with etapa("comparativo_referencial"):
+        df_comparativo = pd.merge(agrupado_ies, df_referencial, on=['grande_area', 'subespecialidade', 'diagnostico'])
     df_comparativo['gap'] = (df_comparativo['acerto'] - df_comparativo['media_nacional']) * 100
     
     # Arredondamentos para o JSON ficar limpo
@@ -237,230 +631,483 @@ def dashboard_completo(co_curso: int, session: Session = Depends(get_session)):
 
     fortalezas = df_comparativo.sort_values('gap', ascending=False).head(10).to_dict(orient='records')
     atencao = df_comparativo.sort_values('gap', ascending=True).head(10).to_dict(orient='records')
+    for item in atencao:
+        item['casos_recomendados'] = portfolio.casos_de(item['subespecialidade'], item['diagnostico'])
     
     return {
-        "ies": ies_nome,
-        "media_geral": round(float(df_ies['acerto'].mean() * 100), 2),
-        "alunos": int(df_ies['aluno_registro_id'].nunique()),
-        "analise": {"fortalezas": fortalezas, "atencao": atencao}
+        "ies": ies_nome or "IES",
+        "media_geral": round(float(acertos.sum() / total.sum() * 100), 2),
+        "alunos": int(indice.questoes_mapeadas(metricas.idx_caderno).sum()),
+        "analise": {"fortalezas": fortalezas, "atencao": atencao},
+        "cobertura_portfolio": portfolio.cobertura
+    }
+
+def lote_dashboard(cursos, session: Session):
+    """Dashboards de um bloco de cursos: uma leitura de respostas, uma correção, uma query de nomes."""
+    df_referencial = carregar_referencial_nacional(session)
+    portfolio = carregar_portfolio(session)
+    metricas = calcular_metricas_cursos(cursos, session)
+    nomes = nomes_ies(list(metricas), session) if metricas else {}
+    linhas = []
+    for co_curso in cursos:
+        try:
+            linhas.append({"co_curso": co_curso, **montar_dashboard(metricas.get(co_curso), nomes.get(co_curso), df_referencial, portfolio)})
+        except HTTPException as e:
+            linhas.append({"co_curso": co_curso, "erro": e.detail})
+    return linhas
+
+def lote_benchmark(cursos, session: Session):
+    return [{"co_curso": co_curso, **bench} for co_curso, bench in benchmarks_cursos(cursos, session).items()]
+
+def comparar_coorte(co_curso: int, cohort: Optional[str], excluir_proprio: bool, session: Session):
+    """
+    Curso x coorte (UF, município, conceito, P360, ano, combináveis) lido do cubo.
+    Dimensão sem valor ('uf') usa o valor do próprio curso; 'ano' filtra os dois lados.
+    """
+    cubo = carregar_cubo(session)
+    try:
+        filtros = interpretar_cohort(cohort)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    valores_curso = cubo.valores_do_curso(co_curso)
+    if valores_curso is None: raise HTTPException(404, detail="IES sem dados")
+    filtros = {d: (v if v is not None else valores_curso[d]) for d, v in filtros.items()}
+
+    with etapa("cubo_comparacao"):
+        proprio = cubo.co_curso == co_curso
+        if "ano" in filtros: proprio &= cubo.mascara({"ano": filtros["ano"]})
+        coorte = cubo.mascara(filtros)
+        if excluir_proprio: coorte &= ~(cubo.co_curso == co_curso)
+        acertos_ies, total_ies = cubo.somas(proprio)
+        acertos_coorte, total_coorte = cubo.somas(coorte)
+    if total_ies.sum() == 0: raise HTTPException(404, detail="IES sem dados no recorte")
+    if total_coorte.sum() == 0: raise HTTPException(404, detail="Coorte sem dados")
+
+    presentes = (total_ies > 0) & (total_coorte > 0)
+    df = cubo.rotulos[presentes].reset_index(drop=True)
+    df['acerto'] = acertos_ies[presentes] / total_ies[presentes]
+    df['media_cohort'] = acertos_coorte[presentes] / total_coorte[presentes]
+    df['gap'] = ((df['acerto'] - df['media_cohort']) * 100).round(2)
+    df['acerto'] = (df['acerto'] * 100).round(2)
+    df['media_cohort'] = (df['media_cohort'] * 100).round(2)
+
+    areas = pd.DataFrame({'grande_area': cubo.rotulos['grande_area'], 'acertos_ies': acertos_ies, 'total_ies': total_ies,
+                          'acertos_cohort': acertos_coorte, 'total_cohort': total_coorte}).groupby('grande_area').sum()
+    areas = areas[(areas['total_ies'] > 0) & (areas['total_cohort'] > 0)]
+    por_area = pd.DataFrame({
+        'acerto': (areas['acertos_ies'] / areas['total_ies'] * 100).round(2),
+        'media_cohort': (areas['acertos_cohort'] / areas['total_cohort'] * 100).round(2),
+    })
+    por_area['gap'] = (por_area['acerto'] - por_area['media_cohort']).round(2)
+
+    media_ies = acertos_ies.sum() / total_ies.sum() * 100
+    media_coorte = acertos_coorte.sum() / total_coorte.sum() * 100
+    return {
+        "co_curso": co_curso,
+        "cohort": filtros or {"nacional": True},
+        "cursos_cohort": cubo.cursos(coorte),
+        "media_ies": round(float(media_ies), 2),
+        "media_cohort": round(float(media_coorte), 2),
+        "gap": round(float(media_ies - media_coorte), 2),
+        "grandes_areas": por_area.reset_index().to_dict(orient='records'),
+        "analise": {
+            "fortalezas": df.sort_values('gap', ascending=False).head(10).to_dict(orient='records'),
+            "atencao": df.sort_values('gap', ascending=True).head(10).to_dict(orient='records')
+        }
     }
 
+def distribuicao_notas(co_curso: int, session: Session):
+    """
+    Onde os alunos do curso ficam nas distribuições nacional, da UF e do conceito,
+    geral e por grande_area. O curso é corrigido na hora (calcular_metricas_curso);
+    as referências são os histogramas pré-calculados pelo db_creator.
+    """
+    referencias = carregar_distribuicoes(session)
+    metricas = calcular_metricas_curso(co_curso, session)
+    if metricas is None or len(metricas.ids) == 0: raise HTTPException(404, detail="IES sem dados")
+
+    with etapa("distribuicao"):
+        notas = faixas_por_area(metricas.bits, metricas.idx_caderno, metricas.taxonomia)
+        i = referencias.indice_curso(co_curso)
+        mascaras = {"nacional": np.ones(len(referencias.cursos), dtype=bool)}
+        if i is not None and referencias.uf[i]: mascaras[f"uf:{referencias.uf[i]}"] = referencias.uf == referencias.uf[i]
+        if i is not None and referencias.conceito[i]: mascaras[f"conceito:{referencias.conceito[i]}"] = referencias.conceito == referencias.conceito[i]
+        hist_referencias = {nome: referencias.referencia(m) for nome, m in mascaras.items()}
+
+        resultado = {}
+        for area, faixas_area in notas.items():
+            hist = histograma(faixas_area)
+            if hist.sum() == 0: continue
+            quantis_curso = quantis(hist)
+            bloco = {
+                "curso": {"alunos": int(hist.sum()), "media": round(float((hist * np.arange(len(hist))).sum() / hist.sum()), 2),
+                          "quantis": quantis_curso, "histograma": hist.tolist()},
+                "referencias": {}
+            }
+            if area in referencias.areas:
+                j = referencias.areas.index(area)
+                for nome, hist_ref in hist_referencias.items():
+                    ref = hist_ref[j]
+                    if ref.sum() == 0: continue
+                    pr = percentis(ref)
+                    bloco["referencias"][nome] = {
+                        "alunos": int(ref.sum()),
+                        "quantis": quantis(ref),
+                        "percentil_dos_quantis": {q: round(float(pr[v]), 1) for q, v in quantis_curso.items()},
+                        "percentil_medio": round(float((hist * pr).sum() / hist.sum()), 1),
+                        "histograma": ref.tolist()
+                    }
+            resultado[area] = bloco
+    return {"co_curso": co_curso, "faixas": "% de acertos, faixas inteiras de 0 a 100", "distribuicoes": resultado}
+
+def estatisticas_questoes(co_caderno: Optional[int], grande_area: Optional[str], session: Session):
+    """Dificuldade, discriminação e alternativas de cada entrada do mapeamento, com todos os alunos do país."""
+    estatisticas = carregar_estatisticas_questoes(session)
+    with etapa("questoes"):
+        questoes = [q for q in estatisticas.registros_nacional
+                    if (co_caderno is None or q["co_caderno"] == co_caderno) and (not grande_area or q["grande_area"] == grande_area)]
+        return {"alunos": len(estatisticas), "questoes": questoes}
+
+def estatisticas_questoes_curso(co_curso: int, session: Session):
+    """As mesmas estatísticas só com os alunos do curso, ao lado da dificuldade nacional."""
+    estatisticas = carregar_estatisticas_questoes(session)
+    with etapa("questoes"):
+        tabela = estatisticas.tabela_curso(co_curso)
+        if tabela is None: raise HTTPException(404, detail="IES sem dados")
+        return {"co_curso": co_curso, "questoes": registros_questoes(tabela)}
+
 # ==========================================
 # 2. RELATÓRIO PDF (CORRIGIDO CÁLCULO DE %)
 # ==========================================
 
-def sanitizar_texto(txt):
-    if not isinstance(txt, str): return str(txt)
-    mapa = {'\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'", '\u2013': '-', '–': '-'}
-    for o, d in mapa.items(): txt = txt.replace(o, d)
-    return txt.encode('latin-1', 'replace').decode('latin-1')
-
-class RelatorioP360(FPDF):
-    def header(self):
-        self.set_fill_color(30, 58, 95)
-        self.rect(0, 0, 210, 45, 'F')
-        try: self.image('logo_branca.png', x=165, y=10, w=30)
-        except: pass
-        self.set_xy(15, 12)
-        self.set_font('Helvetica', 'B', 18); self.set_text_color(255, 255, 255)
-        self.cell(0, 8, sanitizar_texto("Diagnóstico Microdados ENAMED 2025"), ln=True)
-        if hasattr(self, 'ies_info'):
-            self.set_font('Helvetica', 'B', 11); self.set_text_color(253, 94, 17)
-            self.cell(0, 7, sanitizar_texto(f"IES: {self.ies_info['nome']}"), ln=True)
-            self.set_font('Helvetica', '', 10); self.set_text_color(220, 220, 220)
-            texto_sub = f"{self.ies_info['municipio']} - {self.ies_info['uf']} | Conceito ENAMED: {self.ies_info['conceito']}"
-            self.cell(0, 6, sanitizar_texto(texto_sub), ln=True)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Helvetica', 'I', 8)
-        self.set_text_color(150, 150, 150)
-        self.cell(0, 10, f"P360 Analytics - Pagina {self.page_no()}", 0, 0, 'C')
+def locais_e_conceitos(cursos, session: Session):
+    """Localidade e conceito ENAMED (o menor entre os alunos) de cada curso - mesma leitura no PDF avulso e no lote."""
+    with etapa("sql_pdf"):
+        locais = {loc.co_curso: loc for loc in session.exec(select(Localidade).where(Localidade.co_curso.in_(cursos))).all()}
+        conceitos = dict(session.exec(select(Aluno.co_curso, func.min(Aluno.enamed_ies))
+                                      .where(Aluno.co_curso.in_(cursos)).group_by(Aluno.co_curso)).all())
+    return locais, conceitos
 
-@app.get("/ies/{co_curso}/pdf")
-def gerar_pdf_visual(co_curso: int, session: Session = Depends(get_session)):
+def dados_pdf(co_curso: int, session: Session):
+    """Reúne tudo que o PDF precisa em um dict simples (vai para outro processo)."""
     dash = dashboard_completo(co_curso, session)
     bench = obter_benchmark(co_curso, session)
-    loc = session.exec(select(Localidade).where(Localidade.co_curso == co_curso)).first()
+    locais, conceitos = locais_e_conceitos([co_curso], session)
+    return montar_dados_pdf(co_curso, dash, bench, locais.get(co_curso), conceitos.get(co_curso), carregar_indice_ranking(session))
+
+def dados_pdf_lote(cursos, session: Session):
+    """
+    dados_pdf de um bloco de cursos: uma correção, uma leitura de CursoAgregado e
+    uma de Localidade/conceito para o bloco. Cursos sem alunos ficam de fora.
+    """
+    df_referencial = carregar_referencial_nacional(session)
+    metricas = calcular_metricas_cursos(cursos, session)
+    if not metricas: return []
+    presentes = [co_curso for co_curso in cursos if co_curso in metricas]
+    nomes = nomes_ies(presentes, session)
+    benchs = benchmarks_cursos(presentes, session)
+    locais, conceitos = locais_e_conceitos(presentes, session)
+    indice_ranking = carregar_indice_ranking(session)
+    portfolio = carregar_portfolio(session)
+    return [montar_dados_pdf(co_curso, montar_dashboard(metricas[co_curso], nomes.get(co_curso), df_referencial, portfolio),
+                             benchs[co_curso], locais.get(co_curso), conceitos.get(co_curso), indice_ranking)
+            for co_curso in presentes]
+
+def montar_dados_pdf(co_curso, dash, bench, loc, conceito, indice_ranking):
     uf_atual = loc.sigla_estado if loc else None
-    conceito = session.exec(select(Aluno.enamed_ies).where(Aluno.co_curso == co_curso)).first()
-    ranking_nac, pos_nac, total_nac = obter_ranking_ies(session, co_curso)
-    ranking_reg, pos_reg, total_reg = obter_ranking_ies(session, co_curso, uf=uf_atual)
 
-    pdf = RelatorioP360()
-    pdf.ies_info = {'nome': dash['ies'], 'uf': uf_atual or "-", 'municipio': loc.ies_munic if loc else "-", 'conceito': conceito or "N/A"}
-    pdf.add_page()
-    
-    # --- PÁGINA 1 ---
-    pdf.set_y(55)
-    pdf.set_font('Helvetica', 'B', 14); pdf.set_text_color(30, 58, 95)
-    pdf.cell(0, 10, sanitizar_texto("1. Performance Comparativa"), new_x="LMARGIN", new_y="NEXT")    
-    
-    y_topo_cards = pdf.get_y() + 2
-    w_card, h_card, gap_card = 58, 28, 3
-    for i, (label, valor, cor_fundo, cor_texto) in enumerate([
-        ("Sua Média Geral", f"{bench['performance']['ies_atual']}%", (245, 245, 245), (30, 58, 95)),
-        ("Média Nacional", f"{bench['performance']['media_nacional']}%", (245, 245, 245), (30, 58, 95)),
-        ("Referências Conceito 5", f"{bench['performance']['media_elite_enamed_5']}%", (253, 94, 17), (255, 255, 255))
-    ]):
-        x_pos = 15 + (i * (w_card + gap_card))
-        pdf.set_fill_color(*cor_fundo); pdf.rect(x_pos, y_topo_cards, w_card, h_card, 'F')
-        pdf.set_xy(x_pos, y_topo_cards + 5)
-        pdf.set_font('Helvetica', '', 8); pdf.set_text_color(100 if i < 2 else 255)
-        pdf.cell(w_card, 5, sanitizar_texto(label), align="C", new_x="LMARGIN", new_y="NEXT")
-        pdf.set_x(x_pos); pdf.set_font('Helvetica', 'B', 18); pdf.set_text_color(*cor_texto)
-        pdf.cell(w_card, 12, valor, align="C", new_x="LMARGIN", new_y="NEXT")
-
-    pdf.set_xy(15, y_topo_cards + h_card + 3)
-    pdf.set_font('Helvetica', 'I', 8); pdf.set_text_color(120)
-    pdf.cell(0, 8, sanitizar_texto(f"Gap: {bench['gaps']['vs_elite']:+.1f} pp em relação à elite."), new_x="LMARGIN", new_y="NEXT")
-
-    pdf.ln(5); pdf.set_font('Helvetica', 'B', 14); pdf.set_text_color(30, 58, 95)
-    pdf.cell(0, 10, "2. Posicionamento Competitivo", new_x="LMARGIN", new_y="NEXT")
-
-    def draw_rank(titulo, r_list, pos_atual, total_ies):
-        pdf.set_font('Helvetica', 'B', 10); pdf.set_text_color(30, 58, 95)
-        pdf.cell(0, 8, sanitizar_texto(f"{titulo} - {pos_atual} de {total_ies}"), new_x="LMARGIN", new_y="NEXT")
-        indices = [0, 1, 2]; vizinhança = [pos_atual-2, pos_atual-1, pos_atual]
-        for v in vizinhança: 
-            if v not in indices and 0 <= v < len(r_list): indices.append(v)
-        y_bar = pdf.get_y() + 2
-        for idx in sorted(list(set(indices))):
-            item = r_list[idx]; eh_user = (item['co_curso'] == co_curso)
-            pdf.set_xy(15, y_bar); pdf.set_font('Helvetica', 'B' if eh_user else '', 8); pdf.set_text_color(30, 58, 95)
-            pdf.cell(25, 6, sanitizar_texto("Sua IES" if eh_user else f"{idx+1} Lugar"), new_x="RIGHT", new_y="TOP", align='R')
-            pdf.set_fill_color(*(253, 94, 17) if eh_user else (220, 220, 220))
-            largura = (item['media'] / 100) * 120; pdf.rect(45, y_bar, largura, 6, 'F')
-            pdf.set_xy(45 + largura + 2, y_bar); pdf.set_font('Helvetica', '', 8); pdf.set_text_color(100)
-            pdf.cell(15, 6, f"{item['media']}%"); y_bar += 8
-        pdf.set_y(y_bar + 2)
-
-    draw_rank("2.1. Cenário Nacional", ranking_nac, pos_nac, total_nac)
-    draw_rank(f"2.2. Cenário Regional ({uf_atual})", ranking_reg, pos_reg, total_reg)
-
-    # --- PÁGINA 2 ---
-    pdf.add_page(); pdf.set_y(55) 
-    col_area, col_sub, col_diag, col_med, col_gap = 32, 38, 70, 20, 20
-    h_linha, w_box, h_box = 7, 16, 5 
-
-    def print_tabela_compacta(titulo, lista, modo_teaser=False):
-        pdf.set_font('Helvetica', 'B', 12); pdf.set_text_color(30, 58, 95)
-        pdf.cell(0, 8, sanitizar_texto(titulo), new_x="LMARGIN", new_y="NEXT")
-        pdf.set_fill_color(30, 58, 95); pdf.set_text_color(255, 255, 255); pdf.set_font('Helvetica', 'B', 8)
-        pdf.cell(col_area, h_linha, " Área", 0, 0, 'L', True)
-        pdf.cell(col_sub, h_linha, " Subespecialidade", 0, 0, 'L', True)
-        pdf.cell(col_diag, h_linha, " Diagnóstico", 0, 0, 'L', True)
-        pdf.cell(col_med, h_linha, " Média", 0, 0, 'C', True)
-        pdf.cell(col_gap, h_linha, " Gap", 0, 1, 'C', True)
-        pdf.set_font('Helvetica', '', 7); pdf.set_text_color(60, 60, 60)
-        y_inicial_dados = pdf.get_y()
-
-        for i, item in enumerate(lista[:5]):
-            fill = (i % 2 == 0); y_at, x_at = pdf.get_y(), pdf.get_x()
-            pdf.set_fill_color(245, 245, 245) if fill else pdf.set_fill_color(255, 255, 255)
-            bloquear = modo_teaser and i > 0 
-            if bloquear:
-                pdf.cell(col_area + col_sub + col_diag + col_med + col_gap, h_linha, "", 0, 1, 'L', fill)
-                pdf.set_fill_color(210, 210, 210) 
-                pdf.rect(x_at + 2, y_at + 2, col_area - 4, 2.5, 'F')
-                pdf.rect(x_at + col_area + 2, y_at + 2, col_sub - 4, 2.5, 'F')
-                pdf.rect(x_at + col_area + col_sub + 2, y_at + 2, col_diag - 15, 2.5, 'F')
-            else:
-                pdf.cell(col_area, h_linha, sanitizar_texto(f" {item['grande_area']}"), 0, 0, 'L', fill)
-                pdf.cell(col_sub, h_linha, sanitizar_texto(f" {item['subespecialidade']}"), 0, 0, 'L', fill)
-                diag = item.get('diagnostico', 'N/A'); pdf.cell(col_diag, h_linha, sanitizar_texto(f" {diag[:45]}..."), 0, 0, 'L', fill)
-                
-                # --- CORREÇÃO AQUI: REMOVIDO O *100 QUE CAUSAVA O BUG ---
-                pdf.cell(col_med, h_linha, f"{item['acerto']:.1f}%", 0, 0, 'C', fill)
-                
-                gap_val = item['gap']
-                pdf.set_fill_color(*(200, 0, 0) if gap_val < 0 else (0, 150, 0))
-                bx = x_at + col_area + col_sub + col_diag + col_med + ((col_gap - w_box)/2)
-                by = y_at + ((h_linha - h_box)/2); pdf.rect(bx, by, w_box, h_box, 'F')
-                pdf.set_xy(x_at + col_area + col_sub + col_diag + col_med, y_at)
-                pdf.set_font('Helvetica', 'B', 8); pdf.set_text_color(255, 255, 255)
-                pdf.cell(col_gap, h_linha, f"{gap_val:+.1f}", new_x="LMARGIN", new_y="NEXT", align='C')
-                pdf.set_font('Helvetica', '', 7); pdf.set_text_color(60, 60, 60)
-
-        if modo_teaser:
-            largura_box, altura_box = 130, 22
-            pos_x_central = (210 - largura_box) / 2
-            y_box = y_inicial_dados + h_linha + 2 
-            pdf.set_fill_color(255, 255, 255); pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.6)
-            pdf.rect(pos_x_central, y_box, largura_box, altura_box, 'FD')
-            pdf.set_xy(pos_x_central, y_box + 5)
-            pdf.set_font('Helvetica', 'B', 10); pdf.set_text_color(30, 58, 95)
-            pdf.cell(largura_box, 6, sanitizar_texto("CONTEÚDO BLOQUEADO NO TEASER"), new_x="LMARGIN", new_y="NEXT", align='C')
-            pdf.set_x(pos_x_central)
-            pdf.set_font('Helvetica', 'B', 11); pdf.set_text_color(253, 94, 17)
-            pdf.cell(largura_box, 7, sanitizar_texto("Solicite a versão completa com seu consultor"), new_x="LMARGIN", new_y="NEXT", align='C')
-
-    y_3 = pdf.get_y(); pdf.set_x(15)
-    print_tabela_compacta("3. Pontos Críticos (Gap vs Nacional)", dash['analise']['atencao'], modo_teaser=False)
-    pdf.ln(4); pdf.set_x(15) 
-    print_tabela_compacta("4. Destaques Institucionais (Top 5)", dash['analise']['fortalezas'], modo_teaser=True)
-    
-    pdf.set_y(pdf.get_y() + 10); y_bloco_comercial = pdf.get_y()
-    pdf.set_draw_color(220); pdf.set_line_width(0.3)
-    pdf.line(15, y_bloco_comercial, 195, y_bloco_comercial); pdf.ln(6)
-
-    topicos = ["Feedback imediato para o estudante", "Raciocínio Clínico estruturado e guiado", "Matriz Curricular alinhada aos casos", "Correção por IA individual"]
-    y_inicio_conteudo = pdf.get_y()
-    pdf.set_font('Helvetica', 'B', 14); pdf.set_text_color(30, 58, 95)
-    pdf.cell(80, 10, sanitizar_texto("Inteligência para o dia a dia"), new_x="LMARGIN", new_y="NEXT")
-    pdf.set_font('Helvetica', '', 9); pdf.set_text_color(60, 60, 60)
-    pdf.multi_cell(80, 4.5, sanitizar_texto("Não basta identificar os erros: é preciso corrigi-los na prática. O Paciente 360 conecta aprendizagem, prática e avaliação."))
-    pdf.ln(2)
-
-    for topico in topicos:
-        pdf.set_fill_color(253, 94, 17); pdf.rect(15, pdf.get_y() + 1.2, 2.5, 2.5, 'F') 
-        pdf.set_x(20); pdf.set_font('Helvetica', 'B', 9)
-        pdf.cell(70, 5, sanitizar_texto(topico), new_x="LMARGIN", new_y="NEXT")
-
-    img_w, img_x, img_y = 92, 103, y_inicio_conteudo
+    def ranking(titulo, uf=None):
+        return {
+            "titulo": titulo,
+            "posicao": indice_ranking.posicao(co_curso, uf),
+            "total": len(indice_ranking.lista(uf)),
+            "janela": indice_ranking.janela(co_curso, uf)
+        }
+
+    return {
+        "co_curso": co_curso,
+        "ies_info": {'nome': dash['ies'], 'uf': uf_atual or "-", 'municipio': loc.ies_munic if loc else "-", 'conceito': conceito or "N/A"},
+        "bench": bench,
+        "analise": dash['analise'],
+        "cobertura_portfolio": dash['cobertura_portfolio'],
+        "rankings": [ranking("2.1. Cenário Nacional"), ranking(f"2.2. Cenário Regional ({uf_atual})", uf_atual)]
+    }
+
+# ==========================================
+# 3. ROTAS PESADAS (POOLS LIMITADOS, NÃO BLOQUEIAM O EVENT LOOP)
+# ==========================================
+
+# --- LOTES (BI / CONSULTORIAS) ---
+TAMANHO_BLOCO_LOTE = int(os.environ.get("P360_BLOCO_LOTE", "50"))
+MAX_CURSOS_LOTE = int(os.environ.get("P360_MAX_CURSOS_LOTE", "5000"))
+
+class LoteCursos(BaseModel):
+    cursos: List[int]
+
+def _linha_ndjson(obj):
+    return json.dumps(obj, ensure_ascii=False, default=lambda v: v.item() if hasattr(v, "item") else str(v)) + "\n"
+
+def blocos_do_lote(lote: LoteCursos, tamanho_bloco):
+    cursos = list(dict.fromkeys(lote.cursos))
+    if not cursos: raise HTTPException(400, detail="Informe ao menos um co_curso.")
+    if len(cursos) > MAX_CURSOS_LOTE: raise HTTPException(400, detail=f"Máximo de {MAX_CURSOS_LOTE} cursos por lote.")
+    return [cursos[i:i + tamanho_bloco] for i in range(0, len(cursos), tamanho_bloco)]
+
+async def transmitir_lote(lote: LoteCursos, fn, tamanho_bloco):
+    """
+    NDJSON, um curso por linha, à medida que cada bloco termina no POOL_ANALISE.
+    O primeiro bloco roda antes da resposta começar (um 503 ainda chega como 503);
+    depois disso, pool cheio só adia o bloco seguinte.
+    """
+    blocos = blocos_do_lote(lote, tamanho_bloco)
+    primeiro = await POOL_ANALISE.executar(com_sessao, fn, blocos[0])
+
+    async def gerar():
+        for linha in primeiro:
+            yield _linha_ndjson(linha)
+        for bloco in blocos[1:]:
+            for linha in await _executar_aguardando(fn, bloco):
+                yield _linha_ndjson(linha)
+    return StreamingResponse(gerar(), media_type="application/x-ndjson")
+
+async def _executar_aguardando(fn, *args, pool=None):
+    """
+    Para respostas já iniciadas: com o pool cheio, espera em vez de 503.
+    Sem pool, fn(*args, session) no POOL_ANALISE; com pool, fn(*args) nele.
+    """
+    while True:
+        try:
+            if pool is None: return await POOL_ANALISE.executar(com_sessao, fn, *args)
+            return await pool.executar(fn, *args)
+        except HTTPException as e:
+            if e.status_code != 503: raise
+            await asyncio.sleep(0.5)
+
+@app.post("/ies/batch/dashboard")
+async def rota_lote_dashboard(lote: LoteCursos):
+    return await transmitir_lote(lote, lote_dashboard, TAMANHO_BLOCO_LOTE)
+
+@app.post("/ies/batch/benchmark")
+async def rota_lote_benchmark(lote: LoteCursos):
+    # CursoAgregado é lido uma vez para o lote inteiro
+    return await transmitir_lote(lote, lote_benchmark, MAX_CURSOS_LOTE)
+
+# --- PDF EM LOTE ---
+TAMANHO_BLOCO_PDF = int(os.environ.get("P360_BLOCO_PDF", "10"))
+
+@app.post("/ies/batch/pdf")
+async def rota_lote_pdf(lote: LoteCursos):
+    """
+    Zip com um teaser por curso. Os dados de cada bloco saem de uma correção só
+    (dados_pdf_lote) e o bloco inteiro é renderizado em uma ida ao POOL_PDF,
+    com o modelo (imagens decodificadas) já carregado no processo.
+    """
+    blocos = blocos_do_lote(lote, TAMANHO_BLOCO_PDF)
+    destino = tempfile.NamedTemporaryFile(prefix="p360_pdfs_", suffix=".zip", delete=False)
+    destino.close()
     try:
-        pdf.image('cenario_paciente.png', x=img_x, y=img_y, w=img_w)
-        pdf.set_xy(img_x + 2, img_y + 53) 
-        pdf.set_font('Helvetica', 'I', 8); pdf.set_text_color(100)
-        pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.8)
-        pdf.line(img_x, pdf.get_y(), img_x, pdf.get_y() + 8) 
-        pdf.set_x(img_x + 3)
-        pdf.multi_cell(img_w - 5, 3.5, sanitizar_texto("Da análise de dados à prática: pacientes padronizados para correção imediata dos gaps identificados."))
-    except:
-        pdf.set_fill_color(245, 245, 245); pdf.rect(img_x, img_y, img_w, 40, 'F')
-
-    pdf.set_y(242); pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.5)
-    pdf.line(15, pdf.get_y() - 2, 195, pdf.get_y() - 2); pdf.ln(5); y_final_nums = pdf.get_y()
-    
-    pdf.set_x(15); pdf.set_font('Helvetica', 'B', 32); pdf.set_text_color(30, 58, 95)
-    pdf.cell(30, 12, "85%", new_x="RIGHT", new_y="TOP")
-    pdf.set_xy(15, y_final_nums + 11); pdf.set_font('Helvetica', 'B', 8); pdf.set_text_color(253, 94, 17)
-    pdf.cell(30, 5, "DAS QUESTÕES", new_x="LMARGIN", new_y="NEXT")
-    pdf.set_xy(50, y_final_nums + 1); pdf.set_font('Helvetica', '', 8.5); pdf.set_text_color(60, 60, 60)
-    pdf.multi_cell(50, 4, sanitizar_texto("Do ENAMED 2025 exigem raciocínio clínico e não memorização."))
-
-    pdf.set_xy(105, y_final_nums)
-    pdf.set_font('Helvetica', 'B', 32); pdf.set_text_color(30, 58, 95)
-    pdf.cell(30, 12, "80%", new_x="RIGHT", new_y="TOP")
-    pdf.set_xy(105, y_final_nums + 11); pdf.set_font('Helvetica', 'B', 8); pdf.set_text_color(253, 94, 17)
-    pdf.cell(30, 5, "DOS CASOS", new_x="LMARGIN", new_y="NEXT")
-    pdf.set_xy(140, y_final_nums + 1); pdf.set_font('Helvetica', '', 8.5); pdf.set_text_color(60, 60, 60)
-    pdf.multi_cell(55, 4, sanitizar_texto("Dos casos cobrados no exame já estão prontos na plataforma Paciente 360."))
-
-    pdf.ln(12); pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.5)
-    pdf.line(15, pdf.get_y(), 195, pdf.get_y())
-    
-    pdf_out = pdf.output(dest='S')
-    return StreamingResponse(io.BytesIO(pdf_out), media_type="application/pdf", headers={"Content-Disposition": f"attachment; filename=Teaser_P360_{co_curso}.pdf"})
+        with zipfile.ZipFile(destino.name, "w", zipfile.ZIP_STORED) as arquivo:  # PDFs já são comprimidos
+            for i, bloco in enumerate(blocos):
+                # Como no NDJSON: pool cheio no primeiro bloco ainda vira 503
+                dados = await (POOL_ANALISE.executar(com_sessao, dados_pdf_lote, bloco) if i == 0
+                               else _executar_aguardando(dados_pdf_lote, bloco))
+                if not dados: continue
+                with etapa("pdf_renderizacao"):
+                    pdfs = await _executar_aguardando(renderizar_lote, dados, pool=POOL_PDF)
+                for item, pdf in zip(dados, pdfs):
+                    arquivo.writestr(f"Teaser_P360_{item['co_curso']}.pdf", pdf)
+    except BaseException:
+        os.remove(destino.name)
+        raise
+    return FileResponse(destino.name, media_type="application/zip",
+                        headers={"Content-Disposition": "attachment; filename=Teasers_P360.zip"},
+                        background=BackgroundTask(os.remove, destino.name))
+
+# --- EXPORTAÇÃO EM FLUXO ---
+TAMANHO_BLOCO_EXPORTACAO = int(os.environ.get("P360_BLOCO_EXPORTACAO", "20"))
+
+async def transmitir_exportacao(cursos, formato, nivel, nome_arquivo, areas=None):
+    if formato not in FORMATOS_EXPORTACAO: raise HTTPException(400, detail=f"formato: {', '.join(FORMATOS_EXPORTACAO)}")
+    if nivel not in NIVEIS_EXPORTACAO: raise HTTPException(400, detail=f"nivel: {', '.join(NIVEIS_EXPORTACAO)}")
+    if not cursos: raise HTTPException(404, detail="Não há cursos no escopo.")
+    blocos = [cursos[i:i + TAMANHO_BLOCO_EXPORTACAO] for i in range(0, len(cursos), TAMANHO_BLOCO_EXPORTACAO)]
+    headers = {"Content-Disposition": f"attachment; filename={nome_arquivo}.{formato}"}
+
+    if formato == "xlsx":
+        caminho = await POOL_ANALISE.executar(com_sessao, exportar_xlsx_arquivo, blocos, nivel, areas)
+        return FileResponse(caminho, media_type=FORMATOS_EXPORTACAO[formato], headers=headers,
+                            background=BackgroundTask(os.remove, caminho))
+
+    async def gerar():
+        cabecalho = True
+        for bloco in blocos:
+            tabela = await _executar_aguardando(exportar_bloco, bloco, nivel, areas)
+            if tabela.empty: continue
+            yield serializar(tabela, formato, cabecalho)
+            cabecalho = False
+    return StreamingResponse(gerar(), media_type=FORMATOS_EXPORTACAO[formato], headers=headers)
+
+def escopo_exportacao(cursos, uf, session: Session):
+    if cursos: return list(dict.fromkeys(cursos))
+    if uf: return sorted(item["co_curso"] for item in carregar_indice_ranking(session).lista(uf.upper()))
+    raise HTTPException(400, detail="Informe cursos (?cursos=1&cursos=2) ou uf.")
+
+@app.get("/exportar")
+async def rota_exportar_escopo(
+    cursos: Optional[List[int]] = Query(None),
+    uf: Optional[str] = None,
+    formato: str = "csv",
+    nivel: str = "grande_area"
+):
+    """Vários cursos (lista ou UF inteira) em um arquivo, com colunas de área fixas entre cursos."""
+    lista = await run_in_threadpool(com_sessao, escopo_exportacao, cursos, uf)
+    if len(lista) > MAX_CURSOS_LOTE: raise HTTPException(400, detail=f"Máximo de {MAX_CURSOS_LOTE} cursos por exportação.")
+    areas = INDICE_TAXONOMIA.rotulos["grande_area"]["grande_area"].tolist()
+    nome = f"Relatorio_UF_{uf.upper()}" if uf and not cursos else "Relatorio_Cursos"
+    return await transmitir_exportacao(lista, formato, nivel, nome, areas)
+
+@app.get("/ies/{co_curso}/matriz")
+async def rota_matriz(co_curso: int):
+    return await POOL_ANALISE.executar(com_sessao, matriz_priorizacao, co_curso)
+
+@app.get("/ies/{co_curso}/benchmark")
+async def rota_benchmark(co_curso: int):
+    return await POOL_ANALISE.executar(com_sessao, obter_benchmark, co_curso)
+
+def versao_sincronizada(forcar=False):
+    aquecer()
+    with Session(engine) as session:
+        sincronizar_versao(session, forcar)
+    return VERSAO_DADOS
+
+# Gerações em curso neste worker: (endpoint, co_curso, versão) -> Future com
+# (bytes, cabeçalhos), ou None se a geração falhou (quem espera tenta de novo)
+_GERANDO_ARTEFATOS = {}
+
+async def servir_artefato(request: Request, endpoint, co_curso, gerar, media_type, nome_arquivo, tentativas=2):
+    """
+    Relatórios versionados: 304 se o cliente já tem a versão (If-None-Match),
+    artefato do cache em disco se existir, senão gera, grava e devolve. Requests
+    simultâneos do mesmo artefato esperam uma única geração (single-flight), em
+    vez de encher o pool com o mesmo PDF. Se uma carga nova chega durante a
+    geração, o resultado não é gravado nem servido com a ETag da versão anterior:
+    gera de novo na versão nova (ou, esgotadas as tentativas, devolve sem ETag e sem cache).
+    """
+    versao = await run_in_threadpool(versao_sincronizada)
+    cabecalhos = lambda v: {
+        "ETag": CACHE_ARTEFATOS.etag(endpoint, co_curso, v),
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"attachment; filename={nome_arquivo}"
+    }
+    headers = cabecalhos(versao)
+    if etag_confere(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers={"ETag": headers["ETag"], "Cache-Control": headers["Cache-Control"]})
+
+    dados = await run_in_threadpool(CACHE_ARTEFATOS.obter, endpoint, co_curso, versao)
+    contar_cache(f"artefato_{endpoint}", dados is not None)
+    if dados is not None:
+        return Response(dados, media_type=media_type, headers=headers)
+
+    chave = (endpoint, co_curso, versao)
+    while (em_curso := _GERANDO_ARTEFATOS.get(chave)) is not None:
+        resultado = await asyncio.shield(em_curso)
+        if resultado is not None:
+            return Response(resultado[0], media_type=media_type, headers=resultado[1])
+    em_curso = _GERANDO_ARTEFATOS[chave] = asyncio.get_running_loop().create_future()
+    resultado = None
+    try:
+        for _ in range(tentativas):
+            dados = await gerar()
+            depois = await run_in_threadpool(versao_sincronizada, True)  # sem o intervalo de verificação
+            if depois == versao:
+                await run_in_threadpool(CACHE_ARTEFATOS.gravar, endpoint, co_curso, versao, dados)
+                resultado = (dados, cabecalhos(versao))
+                break
+            versao = depois
+        else:
+            resultado = (dados, {"Cache-Control": "no-store", "Content-Disposition": f"attachment; filename={nome_arquivo}"})
+        return Response(resultado[0], media_type=media_type, headers=resultado[1])
+    finally:
+        del _GERANDO_ARTEFATOS[chave]
+        em_curso.set_result(resultado)
+
+@app.get("/ies/{co_curso}/exportar")
+async def rota_exportar(co_curso: int, request: Request, formato: str = "xlsx", nivel: str = "grande_area"):
+    if formato != "xlsx" or nivel != "grande_area":
+        # Detalhe (subespecialidade/diagnóstico) e CSV/NDJSON: em fluxo, sem cache de artefatos
+        return await transmitir_exportacao([co_curso], formato, nivel, f"Relatorio_IES_{co_curso}")
+    async def gerar():
+        return await POOL_ANALISE.executar(com_sessao, exportar_excel, co_curso)
+    return await servir_artefato(request, "exportar", co_curso, gerar,
+                                 "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", f"Relatorio_IES_{co_curso}.xlsx")
+
+@app.get("/ies/{co_curso}/dashboard")
+async def rota_dashboard(co_curso: int):
+    resultado = await POOL_ANALISE.executar(com_sessao, dashboard_completo, co_curso)
+    if METRICAS_INICIALIZACAO["primeiro_dashboard_s"] is None:
+        METRICAS_INICIALIZACAO["primeiro_dashboard_s"] = round(time.monotonic() - INICIO_PROCESSO, 3)
+        print(f"⏱️ Primeiro dashboard servido {METRICAS_INICIALIZACAO['primeiro_dashboard_s']}s após o início do processo")
+    return resultado
+
+@app.get("/ies/{co_curso}/distribuicao")
+async def rota_distribuicao(co_curso: int):
+    return await POOL_ANALISE.executar(com_sessao, distribuicao_notas, co_curso)
+
+@app.get("/ies/{co_curso}/questoes")
+async def rota_questoes_curso(co_curso: int):
+    return await POOL_ANALISE.executar(com_sessao, estatisticas_questoes_curso, co_curso)
+
+@app.get("/questoes/estatisticas")
+async def rota_questoes(co_caderno: Optional[int] = None, grande_area: Optional[str] = None):
+    return await POOL_ANALISE.executar(com_sessao, estatisticas_questoes, co_caderno, grande_area)
+
+@app.get("/ies/{co_curso}/comparar")
+def rota_comparar(
+    co_curso: int,
+    cohort: Optional[str] = None,
+    excluir_proprio: bool = False,
+    session: Session = Depends(get_session)
+):
+    # Só lê o cubo em memória: não precisa do POOL_ANALISE
+    return comparar_coorte(co_curso, cohort, excluir_proprio, session)
+
+@app.get("/ies/{co_curso}/pdf")
+async def gerar_pdf_visual(co_curso: int, request: Request):
+    async def gerar():
+        dados = await POOL_ANALISE.executar(com_sessao, dados_pdf, co_curso)
+        with etapa("pdf_renderizacao"):  # inclui a ida e volta ao processo do POOL_PDF
+            return await POOL_PDF.executar(renderizar_pdf, dados)
+    return await servir_artefato(request, "pdf", co_curso, gerar, "application/pdf", f"Teaser_P360_{co_curso}.pdf")
 
 # ==========================================
-# 3. FILTROS E INICIALIZAÇÃO
+# 4. FILTROS E INICIALIZAÇÃO
 # ==========================================
 
+@app.get("/ranking")
+def listar_ranking(
+    uf: Optional[str] = None,
+    pagina: int = 1,
+    tamanho: int = 50,
+    co_curso: Optional[int] = None,
+    vizinhos: int = 1,
+    session: Session = Depends(get_session)
+):
+    indice = carregar_indice_ranking(session)
+    uf = uf.upper() if uf else None
+    resposta = {
+        "uf": uf,
+        "total": len(indice.lista(uf)),
+        "pagina": pagina,
+        "itens": indice.pagina(uf, max(pagina, 1), min(max(tamanho, 1), 500))
+    }
+    if co_curso is not None:
+        resposta["posicao"] = indice.posicao(co_curso, uf)
+        resposta["vizinhanca"] = indice.janela(co_curso, uf, topo=3, vizinhos=max(vizinhos, 0))
+    return resposta
+
 @app.get("/filtros/ufs")
 def listar_ufs(session: Session = Depends(get_session)):
-    res = session.exec(select(Localidade.sigla_estado).distinct()).all()
-    return sorted([str(uf).strip().upper() for uf in res if uf])
+    return carregar_busca_ies(session).ufs
 
 @app.get("/filtros/ies")
 def listar_ies(
@@ -468,27 +1115,21 @@ def listar_ies(
     municipio: Optional[str] = None, 
     session: Session = Depends(get_session)
 ):
-    stmt = select(Aluno.co_curso, Aluno.ies_nome).distinct()
-    
-    if uf or municipio:
-        sub_stmt = select(Localidade.co_curso)
-        if uf:
-            sub_stmt = sub_stmt.where(Localidade.sigla_estado == uf.upper())
-        if municipio:
-            sub_stmt = sub_stmt.where(func.upper(Localidade.ies_munic) == municipio.upper())
-        stmt = stmt.where(Aluno.co_curso.in_(sub_stmt))
-
-    resultados = session.exec(stmt.order_by(Aluno.ies_nome)).all()
-
-    # --- É AQUI QUE O AJUSTE ENTRA ---
-    return [
-        {
-            "co_curso": r[0], 
-            # O .encode('latin-1').decode('utf-8') reconstrói os acentos
-            "nome": r[1].encode('latin-1').decode('utf-8') if r[1] else ""
-        } 
-        for r in resultados
-    ]
+    # Pares (co_curso, nome) do índice: nomes já reparados (latin-1 -> utf-8) na montagem
+    with etapa("filtros_ies"):
+        return carregar_busca_ies(session).listar(uf, municipio)
+
+@app.get("/filtros/ies/buscar")
+def buscar_ies(
+    q: str = Query(..., min_length=1, max_length=100),
+    uf: Optional[str] = None,
+    limite: int = Query(10, ge=1, le=50),
+    session: Session = Depends(get_session)
+):
+    """Autocomplete: prefixos dos termos do nome (sem acento), município/UF ou o código do curso."""
+    indice = carregar_busca_ies(session)
+    with etapa("busca_ies"):
+        return indice.buscar(q, uf, limite)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,128 @@
+import copy
+import os
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from metricas import contar_cache
+
+# --- MEMOIZAÇÃO DE RESULTADOS POR CURSO ---
+# O frontend pede /matriz, /dashboard, /benchmark e /exportar do mesmo curso em
+# sequência, e o PDF reaproveita o dashboard e o benchmark. Cada resultado fica
+# em memória com chave (função, co_curso, versão dos dados): as métricas
+# corrigidas (MetricasCurso) e os payloads JSON. O limite é em bytes (estimados
+# pelo tamanho dos arrays/DataFrames), com remoção LRU. Uma versão nova dos dados
+# esvazia o cache (sincronizar_versao); resultados calculados com a versão
+# anterior e que terminam depois disso não entram. Quem pede uma chave que já
+# está sendo calculada espera o mesmo cálculo (single-flight por chave).
+# Quem lê recebe uma cópia dos payloads (dict, list, DataFrame) e arrays somente
+# leitura: alterar o resultado de um request não muda o que o próximo recebe.
+
+LIMITE_RESULTADOS_MB = int(os.environ.get("P360_CACHE_RESULTADOS_MB", "256"))
+
+def tamanho_bytes(valor, _vistos=None):
+    """Estimativa da memória de um resultado. Objetos compartilhados (ex.: IndiceTaxonomia) contam só o tamanho raso."""
+    vistos = _vistos if _vistos is not None else set()
+    if id(valor) in vistos: return 0
+    vistos.add(id(valor))
+    if isinstance(valor, np.ndarray):
+        return valor.nbytes
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(deep=True))
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(tamanho_bytes(k, vistos) + tamanho_bytes(v, vistos) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set, frozenset)):
+        return sys.getsizeof(valor) + sum(tamanho_bytes(v, vistos) for v in valor)
+    return sys.getsizeof(valor)
+
+def congelar(valor):
+    """Marca como somente leitura os arrays do resultado (também dentro de tuplas, como MetricasCurso)."""
+    if isinstance(valor, np.ndarray):
+        valor.flags.writeable = False
+    elif isinstance(valor, tuple):
+        for item in valor: congelar(item)
+    return valor
+
+def copiar(valor):
+    """Cópia das partes mutáveis de um resultado guardado; arrays (somente leitura) e tuplas são compartilhados."""
+    if isinstance(valor, (dict, list)):
+        return copy.deepcopy(valor)
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return valor.copy(deep=True)
+    return valor
+
+class CacheResultados:
+    def __init__(self, limite_bytes=LIMITE_RESULTADOS_MB * 1024 * 1024, versao=None):
+        self.limite_bytes = limite_bytes
+        self.versao = versao
+        self._itens = OrderedDict()  # chave -> (valor, bytes); o fim é o mais recente
+        self._calculando = {}  # chave -> threading.Event
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.remocoes = 0
+
+    def obter(self, funcao, co_curso, calcular, versao=None):
+        """Resultado de calcular() para (funcao, co_curso, versao), do cache se houver (sempre uma cópia)."""
+        chave = (funcao, co_curso, versao)
+        while True:
+            with self._lock:
+                item = self._itens.get(chave)
+                if item is not None:
+                    self._itens.move_to_end(chave)
+                    self.hits += 1
+                    contar_cache(f"resultado_{funcao}", True)
+                    break
+                evento = self._calculando.get(chave)
+                if evento is None:
+                    evento = self._calculando[chave] = threading.Event()
+                    self.misses += 1
+                    contar_cache(f"resultado_{funcao}", False)
+                    break
+            evento.wait()  # se o cálculo falhou (ou não coube), a próxima volta calcula de novo
+        if item is not None:
+            return copiar(item[0])
+        try:
+            valor = congelar(calcular())
+            self._guardar(chave, valor, versao)
+            return copiar(valor)
+        finally:
+            with self._lock:
+                self._calculando.pop(chave, None)
+            evento.set()
+
+    def _guardar(self, chave, valor, versao):
+        tamanho = tamanho_bytes(valor)
+        with self._lock:
+            if versao != self.versao or tamanho > self.limite_bytes: return
+            if chave in self._itens: self.bytes -= self._itens.pop(chave)[1]
+            self._itens[chave] = (valor, tamanho)
+            self.bytes += tamanho
+            while self.bytes > self.limite_bytes:
+                _, (_, removido) = self._itens.popitem(last=False)
+                self.bytes -= removido
+                self.remocoes += 1
+
+    def limpar(self, versao):
+        """Esvazia o cache e passa a aceitar só resultados da versão informada."""
+        with self._lock:
+            self._itens.clear()
+            self.bytes = 0
+            self.versao = versao
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._itens),
+                "bytes": self.bytes,
+                "limite_bytes": self.limite_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "remocoes": self.remocoes,
+                "taxa_acerto": round(self.hits / consultas, 4) if consultas else None,
+            }
@@ -0,0 +1,128 @@
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# --- INSTRUMENTAÇÃO (PROMETHEUS + SERVER-TIMING) ---
+# Contadores e histogramas em memória, exportados no formato texto do Prometheus
+# pela rota /metrics (sem dependência extra). Cada `etapa(...)` alimenta o
+# histograma p360_etapa_segundos e, se P360_SERVER_TIMING=1, o cabeçalho
+# Server-Timing do request em curso. Os valores são por processo: com vários
+# workers do uvicorn, o Prometheus soma as séries de cada um.
+
+SERVER_TIMING = os.environ.get("P360_SERVER_TIMING", "0") == "1"
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DESCRICOES = {
+    "p360_etapa_segundos": ("histogram", "Duração das etapas internas (SQL, correção, agregação, renderização)."),
+    "p360_request_segundos": ("histogram", "Duração dos requests HTTP por rota."),
+    "p360_requests_total": ("counter", "Requests HTTP por rota e status."),
+    "p360_cache_total": ("counter", "Consultas aos caches globais por resultado (hit/miss)."),
+    "p360_linhas_lidas_total": ("counter", "Linhas lidas por origem (tabela ou armazém colunar)."),
+}
+
+# Etapas do request em curso (lista compartilhada com as threads do POOL_ANALISE)
+_ETAPAS_REQUEST = contextvars.ContextVar("p360_etapas_request", default=None)
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _rotulos(labels, extra=None):
+    itens = list(labels) + ([extra] if extra else [])
+    if not itens: return ""
+    return "{" + ",".join(f'{k}="{_escapar(v)}"' for k, v in itens) + "}"
+
+class Registro:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.contadores = {}
+        self.histogramas = {}
+        self.coletores = []  # fn() -> [(nome, tipo, descricao, labels, valor)] lidos na hora da coleta
+
+    def contar(self, nome, valor=1, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            self.contadores[chave] = self.contadores.get(chave, 0) + valor
+
+    def observar(self, nome, segundos, **labels):
+        chave = (nome, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self.histogramas.get(chave)
+            if hist is None:
+                hist = self.histogramas[chave] = [[0] * len(LIMITES_SEGUNDOS), 0.0, 0]
+            for i, limite in enumerate(LIMITES_SEGUNDOS):
+                if segundos <= limite: hist[0][i] += 1
+            hist[1] += segundos
+            hist[2] += 1
+
+    def exportar(self):
+        with self._lock:
+            contadores = sorted(self.contadores.items())
+            histogramas = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self.histogramas.items())
+        linhas, cabecalhos = [], set()
+
+        def cabecalho(nome, tipo=None, descricao=None):
+            if nome in cabecalhos: return
+            cabecalhos.add(nome)
+            tipo_padrao, descricao_padrao = DESCRICOES.get(nome, ("untyped", nome))
+            linhas.append(f"# HELP {nome} {descricao or descricao_padrao}")
+            linhas.append(f"# TYPE {nome} {tipo or tipo_padrao}")
+
+        for (nome, labels), valor in contadores:
+            cabecalho(nome)
+            linhas.append(f"{nome}{_rotulos(labels)} {valor}")
+        for (nome, labels), (buckets, soma, n) in histogramas:
+            cabecalho(nome)
+            for limite, acumulado in zip(LIMITES_SEGUNDOS, buckets):
+                linhas.append(f"{nome}_bucket{_rotulos(labels, ('le', limite))} {acumulado}")
+            linhas.append(f"{nome}_bucket{_rotulos(labels, ('le', '+Inf'))} {n}")
+            linhas.append(f"{nome}_sum{_rotulos(labels)} {soma:.6f}")
+            linhas.append(f"{nome}_count{_rotulos(labels)} {n}")
+        for coletor in self.coletores:
+            try:
+                amostras = coletor()
+            except Exception as e:
+                print(f"⚠️ Coletor de métricas falhou: {e}")
+                continue
+            for nome, tipo, descricao, labels, valor in amostras:
+                if valor is None: continue
+                cabecalho(nome, tipo, descricao)
+                linhas.append(f"{nome}{_rotulos(sorted(labels.items()))} {valor}")
+        return "\n".join(linhas) + "\n"
+
+REGISTRO = Registro()
+contar = REGISTRO.contar
+
+def contar_cache(cache, acerto):
+    REGISTRO.contar("p360_cache_total", cache=cache, resultado="hit" if acerto else "miss")
+
+def contar_linhas(origem, n):
+    REGISTRO.contar("p360_linhas_lidas_total", n, origem=origem)
+
+@contextmanager
+def etapa(nome):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracao = time.perf_counter() - inicio
+        REGISTRO.observar("p360_etapa_segundos", duracao, etapa=nome)
+        etapas = _ETAPAS_REQUEST.get()
+        if etapas is not None: etapas.append((nome, duracao))
+
+def iniciar_request():
+    """Abre a coleta de etapas do request atual; devolve (token, lista de etapas)."""
+    etapas = []
+    return _ETAPAS_REQUEST.set(etapas), etapas
+
+def encerrar_request(token):
+    _ETAPAS_REQUEST.reset(token)
+
+def server_timing(etapas, total):
+    """Valor do cabeçalho Server-Timing (ms, etapas repetidas somadas)."""
+    somas = {}
+    for nome, duracao in etapas:
+        somas[nome] = somas.get(nome, 0.0) + duracao
+    partes = [f"{nome};dur={d * 1000:.1f}" for nome, d in somas.items()]
+    return ", ".join(partes + [f"total;dur={total * 1000:.1f}"])
@@ -1,7 +1,13 @@
 from sqlmodel import Field, SQLModel
+from sqlalchemy import Index
 from typing import Optional
 
 class Aluno(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_aluno_curso_nome", "co_curso", "ies_nome"),
+        Index("ix_aluno_ano", "nu_ano"),
+        Index("ix_aluno_caderno", "co_caderno"),
+    )
     id: Optional[int] = Field(default=None, primary_key=True)
     nu_ano: int
     co_curso: int
@@ -10,22 +16,113 @@ class Aluno(SQLModel, table=True):
     p360: str
     enamed_ies: str
     respostas: str 
+    acertos_bits: Optional[bytes] = None  # 100 bits de acerto (np.packbits); NULL = caderno sem gabarito / ainda não corrigido
 
 class QuestaoMapeamento(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    co_caderno: int
+    co_caderno: int = Field(index=True)
     nu_questao: int
     grande_area: str
     subespecialidade: str
     diagnostico: str
 
 class Localidade(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_localidade_uf_munic", "sigla_estado", "ies_munic_norm", "co_curso"),
+        Index("ix_localidade_munic", "ies_munic_norm", "co_curso"),
+    )
     co_curso: int = Field(primary_key=True)
     ies_estado: str
     ies_munic: str
     sigla_estado: str
+    ies_munic_norm: str = ""  # ies_munic sem acentos, maiúsculo (ver normalizacao.py)
 
 class Gabarito(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    co_caderno: int
-    respostas_gabarito: str
\ No newline at end of file
+    co_caderno: int = Field(index=True)
+    respostas_gabarito: str
+    anuladas_bits: Optional[bytes] = None  # 100 bits: questões anuladas (contam como acerto)
+
+class CursoAgregado(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_cursoagregado_curso", "co_curso"),
+        Index("ix_cursoagregado_uf", "sigla_estado"),
+        Index("ix_cursoagregado_ano", "nu_ano"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    nu_ano: int
+    co_curso: int
+    ies_nome: str
+    enamed_ies: str
+    sigla_estado: str
+    acertos: int
+    total: int
+    alunos: int
+
+class CursoAgregadoTaxonomia(SQLModel, table=True):
+    __table_args__ = (
+        # Cobre o GROUP BY do referencial nacional sem tocar na tabela
+        Index("ix_cat_taxonomia", "grande_area", "subespecialidade", "diagnostico", "acertos", "total"),
+        Index("ix_cat_curso", "co_curso"),
+        Index("ix_cat_ano", "nu_ano"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    nu_ano: int
+    co_curso: int
+    grande_area: str
+    subespecialidade: str
+    diagnostico: str
+    acertos: int
+    total: int
+
+class CuboTaxonomia(SQLModel, table=True):
+    # CursoAgregadoTaxonomia aberto por conceito e flag P360 (dimensões de aluno);
+    # UF e município vêm de Localidade. Base das comparações por coorte.
+    __table_args__ = (
+        Index("ix_cubo_curso", "co_curso"),
+        Index("ix_cubo_ano", "nu_ano"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    nu_ano: int
+    co_curso: int
+    enamed_ies: str
+    p360: str
+    grande_area: str
+    subespecialidade: str
+    diagnostico: str
+    acertos: int
+    total: int
+
+class DistribuicaoNotas(SQLModel, table=True):
+    # Histograma de notas por curso: nº de alunos em cada faixa (0..100 % de acertos),
+    # geral (grande_area = "Geral") e por grande_area. Ver distribuicao.py.
+    __table_args__ = (
+        Index("ix_distribuicao_curso", "co_curso"),
+        Index("ix_distribuicao_ano", "nu_ano"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    nu_ano: int
+    co_curso: int
+    enamed_ies: str
+    grande_area: str
+    faixa: int
+    alunos: int
+
+class VersaoDados(SQLModel, table=True):
+    versao: Optional[int] = Field(default=None, primary_key=True)
+    criado_em: str
+    escopo: str  # JSON com as partições afetadas: {"completo": true} ou {"aluno": [anos], "gabarito": [cadernos], ...}
+
+class CasoRecomendado(SQLModel, table=True):
+    # Casos do portfólio P360 casados com cada diagnóstico do mapeamento (ver portfolio.py);
+    # até 3 por (subespecialidade, diagnostico), posicao 1 = mais parecido.
+    __table_args__ = (
+        Index("ix_casorecomendado_diag", "subespecialidade", "diagnostico", "posicao"),
+    )
+    id: Optional[int] = Field(default=None, primary_key=True)
+    subespecialidade: str
+    diagnostico: str
+    posicao: int
+    caso_subespecialidade: str
+    caso_diagnostico: str
+    similaridade: float
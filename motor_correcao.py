@@ -0,0 +1,108 @@
+import hashlib
+import numpy as np
+from collections import namedtuple
+
+# --- MOTOR DE CORREÇÃO VETORIZADO ---
+# Converte respostas e gabaritos em matrizes uint8 (um byte por questão) e
+# corrige todos os alunos em uma única passada NumPy.
+
+N_QUESTOES = 100
+N_BYTES_BITS = (N_QUESTOES + 7) // 8  # 100 questões -> 13 bytes por aluno
+ANULADAS = b"XZ*"
+
+GabaritoMatriz = namedtuple("GabaritoMatriz", ["cadernos", "respostas", "anuladas"])
+
+def _maiusculas(matriz):
+    minusculas = (matriz >= ord('a')) & (matriz <= ord('z'))
+    return np.where(minusculas, matriz - 32, matriz).astype(np.uint8)
+
+def respostas_para_matriz(respostas):
+    """Converte uma sequência de strings de respostas em uma matriz (alunos x 100) uint8."""
+    texto = "".join(str(r or "")[:N_QUESTOES].ljust(N_QUESTOES) for r in respostas)
+    buffer = np.frombuffer(texto.encode('latin-1', 'replace'), dtype=np.uint8)
+    return _maiusculas(buffer.reshape(-1, N_QUESTOES))
+
+def montar_gabaritos(gabarito_map):
+    """
+    Monta a matriz (cadernos x 100) a partir do GABARITO_CACHE.
+    Posições ausentes no gabarito ficam com byte 0 (nunca coincidem com a resposta).
+    """
+    cadernos = np.array(sorted(gabarito_map), dtype=np.int64)
+    respostas = np.zeros((len(cadernos), N_QUESTOES), dtype=np.uint8)
+    for i, caderno in enumerate(cadernos):
+        gab = "".join(str(g).strip()[:1] or " " for g in gabarito_map[caderno])[:N_QUESTOES]
+        respostas[i, :len(gab)] = np.frombuffer(gab.encode('latin-1', 'replace'), dtype=np.uint8)
+    respostas = _maiusculas(respostas)
+    anuladas = np.isin(respostas, np.frombuffer(ANULADAS, dtype=np.uint8))
+    return GabaritoMatriz(cadernos, respostas, anuladas)
+
+def indices_caderno(co_cadernos, gabaritos):
+    """Retorna (índice da linha no gabarito, máscara de alunos com gabarito conhecido)."""
+    co_cadernos = np.asarray(co_cadernos, dtype=np.int64)
+    if len(gabaritos.cadernos) == 0:
+        return np.zeros(len(co_cadernos), dtype=np.intp), np.zeros(len(co_cadernos), dtype=bool)
+    idx = np.clip(np.searchsorted(gabaritos.cadernos, co_cadernos), 0, len(gabaritos.cadernos) - 1)
+    return idx, gabaritos.cadernos[idx] == co_cadernos
+
+def corrigir(matriz_respostas, co_cadernos, gabaritos):
+    """
+    Gera a matriz booleana de acertos (alunos x 100). Questões anuladas contam
+    como acerto; alunos de cadernos sem gabarito ficam fora (validos=False).
+    """
+    idx, validos = indices_caderno(co_cadernos, gabaritos)
+    if len(gabaritos.cadernos) == 0:
+        return np.zeros((len(validos), N_QUESTOES), dtype=bool), validos
+    acertos = (matriz_respostas == gabaritos.respostas[idx]) | gabaritos.anuladas[idx]
+    acertos &= validos[:, None]
+    return acertos, validos
+
+def corrigir_respostas(respostas, co_cadernos, gabaritos):
+    return corrigir(respostas_para_matriz(respostas), co_cadernos, gabaritos)
+
+# --- RESULTADO EMPACOTADO (1 BIT POR QUESTÃO) ---
+# O db_creator grava a correção de cada aluno como 13 bytes (aluno.acertos_bits);
+# a API lê os bits em vez da string de 100 respostas e não recorrige.
+
+def empacotar(acertos):
+    """Matriz booleana (alunos x 100) -> (alunos x 13) uint8, questão 1 no bit mais alto do 1º byte."""
+    return np.packbits(np.asarray(acertos, dtype=bool), axis=-1)
+
+def desempacotar(bits):
+    return np.unpackbits(np.asarray(bits, dtype=np.uint8), axis=-1, count=N_QUESTOES).astype(bool)
+
+# np.bitwise_count só existe a partir do NumPy 2.0; antes, tabela de popcount por byte
+_POPCOUNT_BYTE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+def contar_bits(bits):
+    """Popcount por linha (nº de acertos de cada aluno, ou de bits em comum com uma máscara)."""
+    bits = np.asarray(bits, dtype=np.uint8)
+    por_byte = np.bitwise_count(bits) if hasattr(np, "bitwise_count") else _POPCOUNT_BYTE[bits]
+    return por_byte.sum(axis=-1, dtype=np.int64)
+
+def bits_para_bytes(bits, validos):
+    """Linhas empacotadas -> valores da coluna aluno.acertos_bits (None para alunos inválidos)."""
+    return [linha.tobytes() if v else None for linha, v in zip(bits, validos)]
+
+def bytes_para_bits(valores):
+    """Coluna aluno.acertos_bits -> (bits alunos x 13, máscara dos não nulos)."""
+    presentes = np.array([v is not None for v in valores], dtype=bool)
+    bits = np.zeros((len(valores), N_BYTES_BITS), dtype=np.uint8)
+    if presentes.any():
+        bits[presentes] = np.frombuffer(b"".join(v for v in valores if v is not None), dtype=np.uint8).reshape(-1, N_BYTES_BITS)
+    return bits, presentes
+
+def assinatura_gabaritos(gabaritos):
+    """Identifica o conjunto de gabaritos com que os bits foram gerados (manifesto do armazém colunar)."""
+    h = hashlib.sha1(gabaritos.cadernos.astype(np.int64).tobytes())
+    h.update(gabaritos.respostas.tobytes())
+    return h.hexdigest()[:16]
+
+def somar_por_caderno(acertos, validos, co_cadernos, gabaritos):
+    """Soma de acertos e nº de alunos por (caderno, questão) - base do referencial."""
+    idx, _ = indices_caderno(co_cadernos, gabaritos)
+    k = len(gabaritos.cadernos)
+    alunos = np.bincount(idx[validos], minlength=k) if k else np.zeros(0, dtype=np.int64)
+    somas = np.zeros((k, N_QUESTOES), dtype=np.int64)
+    for j in np.flatnonzero(alunos):
+        somas[j] = acertos[validos & (idx == j)].sum(axis=0)
+    return somas, alunos
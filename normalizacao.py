@@ -0,0 +1,24 @@
+import unicodedata
+
+# --- NORMALIZAÇÃO DE TEXTO ---
+# Usada na importação (colunas normalizadas/indexadas) e nos filtros da API,
+# para que as buscas sejam comparações exatas em índice, sem upper() por linha.
+
+def dobrar_acentos(txt):
+    if not isinstance(txt, str): txt = "" if txt is None else str(txt)
+    return "".join(c for c in unicodedata.normalize("NFKD", txt) if not unicodedata.combining(c))
+
+def normalizar_municipio(txt):
+    return " ".join(dobrar_acentos(txt).upper().split())
+
+def corrigir_mojibake(txt):
+    """Desfaz UTF-8 lido como latin-1 ('UNIVERSIDADE FEDERAL DO CEARÃ\x81' -> '...CEARÁ'); texto já correto volta igual."""
+    if not txt: return ""
+    try:
+        return txt.encode("latin-1").decode("utf-8")
+    except (UnicodeEncodeError, UnicodeDecodeError):
+        return txt
+
+def termos_busca(txt):
+    """Termos de busca: sem acentos, maiúsculos, só letras e dígitos."""
+    return "".join(c if c.isalnum() else " " for c in dobrar_acentos(txt).upper()).split()
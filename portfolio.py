@@ -0,0 +1,136 @@
+import math
+import os
+import re
+from collections import Counter
+from difflib import SequenceMatcher
+import pandas as pd
+from normalizacao import termos_busca
+
+# --- ÍNDICE GAP -> CASOS DO PORTFÓLIO P360 ---
+# Na importação, cada par distinto (subespecialidade, diagnostico) do
+# QuestaoMapeamento é casado uma única vez com os casos de portfolio_casos.csv
+# e o resultado vai para a tabela CasoRecomendado. A API só carrega essa tabela
+# em um dict: anexar casos a um gap do dashboard/PDF é uma consulta ao dict.
+#
+# Casamento: termos sem acento e sem stopwords; "Tipo 2" = "tipo II". Dois
+# termos equivalem se são iguais, se diferem só no sufixo (prefixo comum >= 7
+# letras e sobra <= 3 de cada lado: GESTACIONAL/GESTACAO não, PREMATURA/
+# PREMATURO sim) ou se são quase iguais (erro de digitação, ratio >= 0.9). Cada
+# termo pesa pelo IDF no portfólio (termo raro pesa mais) e qualificadores
+# como AGUDA/CRONICA pesam 1/4, para "Diverticulite aguda" não casar com
+# "Rinossinusite aguda". Nota = média entre o Dice ponderado e a fração do
+# caso coberta pelo diagnóstico ("Tuberculose em Sistema Prisional" cobre o
+# caso "Tuberculose" inteiro). Ficam até MAX_CASOS com nota >= LIMIAR; empate
+# favorece o caso da mesma subespecialidade.
+
+ARQUIVO_PORTFOLIO = "portfolio_casos.csv"
+LIMIAR = 0.55
+MAX_CASOS = 3
+PESO_QUALIFICADOR = 0.25
+PARADAS = {"A", "AO", "AS", "COM", "DA", "DAS", "DE", "DO", "DOS", "E", "EM", "NA", "NAS", "NO", "NOS",
+           "O", "OS", "PARA", "POR", "S", "SEM", "ANULADA"}
+QUALIFICADORES = {"AGUDA", "AGUDO", "CRONICA", "CRONICO", "COMPLICADA", "COMPLICACAO", "LEVE", "GRAVE",
+                  "SIMPLES", "PRIMARIA", "SECUNDARIA", "DOENCA", "SINDROME"}
+ROMANOS = {"I": "1", "II": "2", "III": "3", "IV": "4"}
+
+def ler_portfolio(arquivo=ARQUIVO_PORTFOLIO):
+    """Casos distintos (subespecialidade, diagnostico) do CSV do portfólio (UTF-8 com BOM, ';')."""
+    df = pd.read_csv(arquivo, sep=";", encoding="utf-8-sig", dtype=str)
+    df.columns = [termos_busca(c)[0].lower() if termos_busca(c) else c for c in df.columns]
+    df = df[["subespecialidade", "diagnostico"]].fillna("")
+    df = df.apply(lambda col: col.str.strip())
+    return df[df["diagnostico"] != ""].drop_duplicates().reset_index(drop=True)
+
+def termos(txt):
+    """Termos significativos de um diagnóstico ("Endometriose +1" -> {"ENDOMETRIOSE"})."""
+    txt = re.sub(r"\+\s*\d+\s*$", "", str(txt))
+    return frozenset(ROMANOS.get(t, t) for t in termos_busca(txt) if t not in PARADAS)
+
+def termos_equivalentes(a, b):
+    if a == b: return True
+    if len(a) < 5 or len(b) < 5: return False
+    prefixo = len(os.path.commonprefix([a, b]))
+    if prefixo >= 7 and max(len(a), len(b)) - prefixo <= 3: return True
+    return SequenceMatcher(None, a, b).ratio() >= 0.9
+
+class CasadorPortfolio:
+    """Pesos e equivalências montados uma vez sobre o portfólio; casar() é chamado por diagnóstico."""
+
+    def __init__(self, df_casos):
+        self.casos = list(df_casos[["subespecialidade", "diagnostico"]].itertuples(index=False, name=None))
+        self.termos_casos = [termos(d) for _, d in self.casos]
+        frequencia = Counter(t for ts in self.termos_casos for t in ts)
+        n = len(self.casos)
+        self._peso = lambda t: (math.log((n + 1) / (frequencia.get(t, 0) + 1)) + 1) * (PESO_QUALIFICADOR if t in QUALIFICADORES else 1)
+        self.vocabulario = sorted(frequencia)
+        self._equivalentes = {}
+
+    def equivalentes(self, termo):
+        """Termos do portfólio equivalentes a um termo do mapeamento (memoizado: o vocabulário é pequeno)."""
+        if termo not in self._equivalentes:
+            self._equivalentes[termo] = frozenset(v for v in self.vocabulario if termos_equivalentes(termo, v))
+        return self._equivalentes[termo]
+
+    def nota(self, termos_diag, termos_caso):
+        if not termos_diag or not termos_caso: return 0.0
+        cobertos_caso = frozenset().union(*(self.equivalentes(t) for t in termos_diag)) & termos_caso
+        peso_diag = sum(self._peso(t) for t in termos_diag if self.equivalentes(t) & termos_caso)
+        peso_caso = sum(self._peso(t) for t in cobertos_caso)
+        total_caso = sum(self._peso(t) for t in termos_caso)
+        dice = (peso_diag + peso_caso) / (sum(self._peso(t) for t in termos_diag) + total_caso)
+        return (dice + peso_caso / total_caso) / 2
+
+    def casar(self, subespecialidade, diagnostico):
+        """[(caso_subespecialidade, caso_diagnostico, similaridade)] - até MAX_CASOS, melhor primeiro."""
+        termos_diag = termos(diagnostico)
+        mesma_sub = termos_busca(subespecialidade)
+        candidatos = []
+        for (sub, diag), termos_caso in zip(self.casos, self.termos_casos):
+            nota = self.nota(termos_diag, termos_caso)
+            if nota >= LIMIAR:
+                candidatos.append((-round(nota, 4), termos_busca(sub) != mesma_sub, diag, sub))
+        return [(sub, diag, -nota) for nota, _, diag, sub in sorted(candidatos)[:MAX_CASOS]]
+
+def casar_mapeamento(pares, df_casos):
+    """Linhas de CasoRecomendado para os pares (subespecialidade, diagnostico) distintos do mapeamento."""
+    casador = CasadorPortfolio(df_casos)
+    linhas = []
+    for subespecialidade, diagnostico in sorted(set(pares)):
+        for posicao, (caso_sub, caso_diag, nota) in enumerate(casador.casar(subespecialidade, diagnostico), start=1):
+            linhas.append({"subespecialidade": subespecialidade, "diagnostico": diagnostico, "posicao": posicao,
+                           "caso_subespecialidade": caso_sub, "caso_diagnostico": caso_diag, "similaridade": nota})
+    return linhas
+
+class IndicePortfolio:
+    """
+    (subespecialidade, diagnostico) -> casos recomendados, carregado da tabela
+    CasoRecomendado. A cobertura sai do mapeamento em memória: fração dos
+    diagnósticos distintos e das questões mapeadas que têm ao menos um caso.
+    """
+
+    def __init__(self, linhas, df_mapa):
+        self.casos = {}
+        for l in sorted(linhas, key=lambda l: (l["subespecialidade"], l["diagnostico"], l["posicao"])):
+            self.casos.setdefault((l["subespecialidade"], l["diagnostico"]), []).append(
+                {"subespecialidade": l["caso_subespecialidade"], "diagnostico": l["caso_diagnostico"],
+                 "similaridade": round(float(l["similaridade"]), 2)})
+        self.cobertura = self._cobertura(df_mapa)
+
+    def __len__(self):
+        return len(self.casos)
+
+    def casos_de(self, subespecialidade, diagnostico):
+        return self.casos.get((subespecialidade, diagnostico), [])
+
+    def _cobertura(self, df_mapa):
+        """Percentuais (0-100) ou None se não há mapeamento ou o portfólio não foi importado."""
+        if df_mapa.empty or not self.casos: return None
+        chaves = list(zip(df_mapa["subespecialidade"], df_mapa["diagnostico"]))
+        cobertas = [chave in self.casos for chave in chaves]
+        distintas = set(chaves)
+        return {
+            "questoes": round(100 * sum(cobertas) / len(cobertas), 1),
+            "diagnosticos": round(100 * sum(chave in self.casos for chave in distintas) / len(distintas), 1),
+            "diagnosticos_cobertos": sum(chave in self.casos for chave in distintas),
+            "diagnosticos_total": len(distintas),
+        }
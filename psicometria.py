@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+from sqlmodel import Session, text
+from motor_correcao import N_QUESTOES, corrigir, indices_caderno, respostas_para_matriz
+
+# --- ESTATÍSTICAS POR QUESTÃO (PSICOMETRIA) ---
+# Uma passada em blocos por todas as respostas (armazém colunar ou SQLite)
+# acumula, por (curso, caderno), as estatísticas suficientes de cada questão:
+# nº de alunos, acertos, soma e soma dos quadrados da nota total, soma de
+# acerto x nota e quantas vezes cada alternativa foi marcada. Tudo sai de
+# reduceat sobre as matrizes do bloco (alunos x 100), sem laço por questão.
+# A visão nacional é a soma dos cursos; a de um curso, as linhas dele.
+#
+# dificuldade: proporção de acerto (p-value). discriminacao: ponto-bisserial
+# corrigida - correlação entre acertar a questão e a nota nas outras 99
+# (a própria questão fica fora da nota para não inflar a correlação).
+# alternativas: proporção de alunos que marcou cada letra; "outras" = branco,
+# rasura ou qualquer outro símbolo.
+
+ALTERNATIVAS = "ABCDE"
+OUTRAS = "outras"
+TAMANHO_BLOCO = 50_000  # alunos por bloco (limita os temporários alunos x 100 x alternativas)
+
+def lotes_armazem(armazem, tamanho=TAMANHO_BLOCO):
+    """(co_curso, co_caderno, respostas) em blocos a partir do armazém colunar (já ordenado por curso)."""
+    for ini in range(0, len(armazem.co_curso), tamanho):
+        fim = ini + tamanho
+        yield armazem.co_curso[ini:fim], armazem.co_caderno[ini:fim], np.asarray(armazem.respostas[ini:fim])
+
+def lotes_sqlite(session: Session, tamanho=TAMANHO_BLOCO):
+    resultado = session.connection().execution_options(stream_results=True).execute(
+        text("SELECT co_curso, co_caderno, respostas FROM aluno ORDER BY co_curso"))
+    while True:
+        lote = resultado.fetchmany(tamanho)
+        if not lote: break
+        cursos, cadernos, respostas = zip(*lote)
+        yield np.array(cursos, dtype=np.int64), np.array(cadernos, dtype=np.int64), respostas_para_matriz(respostas)
+
+def _somar_por_chave(chaves, *valores):
+    """Soma as linhas de cada array por chave (ordenação + reduceat). Retorna (chaves únicas, somas...)."""
+    ordem = np.argsort(chaves, kind="stable")
+    chaves = chaves[ordem]
+    inicios = np.flatnonzero(np.r_[True, chaves[1:] != chaves[:-1]]) if len(chaves) else np.zeros(0, dtype=np.intp)
+    return (chaves[inicios], *[np.add.reduceat(v[ordem], inicios, axis=0, dtype=np.int64) if len(inicios)
+                               else v[:0].astype(np.int64) for v in valores])
+
+def indicadores(alunos, acertos, soma_nota, soma_nota2, soma_acerto_nota, escolhas):
+    """
+    Dificuldade, discriminação e proporção por alternativa a partir das somas.
+    alunos/soma_nota/soma_nota2: (...,); acertos/soma_acerto_nota: (..., 100); escolhas: (..., 100, A).
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        n = np.asarray(alunos, dtype=np.float64)[..., None]
+        p = acertos / n
+        # Nota sem a questão (R = T - x, com x² = x): somas de R, R² e x.R
+        media_resto = (soma_nota[..., None] - acertos) / n
+        media_resto2 = (soma_nota2[..., None] - 2 * soma_acerto_nota + acertos) / n
+        cov = (soma_acerto_nota - acertos) / n - p * media_resto
+        variancia = p * (1 - p) * (media_resto2 - media_resto ** 2)
+        discriminacao = np.where(variancia > 1e-12, cov / np.sqrt(variancia), np.nan)
+        proporcoes = escolhas / n[..., None]
+    return p, discriminacao, proporcoes
+
+class EstatisticasQuestoes:
+    """Somas por (curso, caderno) em memória; nacional pré-somado por caderno."""
+
+    def __init__(self, gabaritos, df_mapa, lotes):
+        self.gabaritos = gabaritos
+        k = len(gabaritos.cadernos)
+        letras = np.frombuffer(ALTERNATIVAS.encode(), dtype=np.uint8)
+        partes = []
+        for co_cursos, co_cadernos, respostas in lotes:
+            idx, conhecidos = indices_caderno(co_cadernos, gabaritos)
+            if not conhecidos.any(): continue
+            respostas, co_cursos, idx = respostas[conhecidos], np.asarray(co_cursos, dtype=np.int64)[conhecidos], idx[conhecidos]
+            acertos, _ = corrigir(respostas, gabaritos.cadernos[idx], gabaritos)
+            nota = acertos.sum(axis=1, dtype=np.int64)
+            partes.append(_somar_por_chave(co_cursos * max(k, 1) + idx, np.ones(len(nota), dtype=np.int64), acertos,
+                                           nota, nota ** 2, acertos * nota.astype(np.int16)[:, None],
+                                           respostas[:, :, None] == letras))
+
+        if partes:
+            somas = _somar_por_chave(*[np.concatenate(p) for p in zip(*partes)])
+        else:
+            somas = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, N_QUESTOES), dtype=np.int64),
+                     np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros((0, N_QUESTOES), dtype=np.int64),
+                     np.zeros((0, N_QUESTOES, len(letras)), dtype=np.int64))
+        chaves, *self.somas = somas
+        self.co_curso, self.idx_caderno = chaves // max(k, 1), chaves % max(k, 1)
+
+        # Nacional: soma das linhas de cada caderno (k x ...)
+        self.nacional = [np.zeros((k,) + s.shape[1:], dtype=np.int64) for s in self.somas]
+        for total, s in zip(self.nacional, self.somas):
+            np.add.at(total, self.idx_caderno, s)
+
+        # Entradas de QuestaoMapeamento de cadernos com gabarito (rótulos + posição na matriz)
+        mapa = df_mapa if not df_mapa.empty else pd.DataFrame(columns=["co_caderno", "nu_questao", "grande_area", "subespecialidade", "diagnostico"])
+        mapa = mapa[mapa["co_caderno"].isin(gabaritos.cadernos) & mapa["nu_questao"].between(1, N_QUESTOES)]
+        mapa = mapa.sort_values(["co_caderno", "nu_questao"], kind="stable")
+        self.mapa = mapa[["co_caderno", "nu_questao", "grande_area", "subespecialidade", "diagnostico"]].reset_index(drop=True)
+        self.mapa_idx = np.searchsorted(gabaritos.cadernos, self.mapa["co_caderno"].to_numpy(dtype=np.int64))
+        self.mapa_questao = self.mapa["nu_questao"].to_numpy(dtype=np.int64) - 1
+        tabela = self._tabela(self.nacional)
+        self._dificuldade_nacional = tabela["dificuldade"]  # alinhada às linhas do mapeamento (comparação por curso)
+        self.tabela_nacional = tabela[tabela["alunos"] > 0].reset_index(drop=True)
+        self.registros_nacional = registros(self.tabela_nacional)  # resposta pronta: filtrar é percorrer a lista
+
+    @classmethod
+    def construir(cls, gabaritos, df_mapa, session: Session, armazem=None):
+        lotes = lotes_armazem(armazem) if armazem is not None else lotes_sqlite(session)
+        return cls(gabaritos, df_mapa, lotes)
+
+    def __len__(self):
+        return int(self.nacional[0].sum()) if len(self.nacional[0]) else 0
+
+    def _tabela(self, somas):
+        """DataFrame com uma linha por entrada do mapeamento; somas indexadas pelo caderno (k x ...)."""
+        alunos, acertos, soma_nota, soma_nota2, soma_acerto_nota, escolhas = somas
+        p, discriminacao, proporcoes = indicadores(alunos, acertos, soma_nota, soma_nota2, soma_acerto_nota, escolhas)
+        i, q = self.mapa_idx, self.mapa_questao
+        tabela = self.mapa.copy()
+        gabarito = self.gabaritos.respostas[i, q]
+        tabela["gabarito"] = [chr(c).strip() if c else "" for c in gabarito.tolist()]
+        tabela["anulada"] = self.gabaritos.anuladas[i, q]
+        tabela["alunos"] = alunos[i]
+        tabela["dificuldade"] = np.round(p[i, q], 4)
+        tabela["discriminacao"] = np.round(discriminacao[i, q], 4)
+        marcadas = proporcoes[i, q]
+        for j, letra in enumerate(ALTERNATIVAS):
+            tabela[letra] = np.round(marcadas[:, j], 4)
+        tabela[OUTRAS] = np.round(1 - marcadas.sum(axis=1), 4)
+        return tabela
+
+    def tabela_curso(self, co_curso):
+        """Mesma tabela restrita aos alunos de um curso; None se o curso não tiver alunos corrigidos."""
+        ini, fim = np.searchsorted(self.co_curso, co_curso, side="left"), np.searchsorted(self.co_curso, co_curso, side="right")
+        if ini == fim: return None
+        k = len(self.gabaritos.cadernos)
+        somas = []
+        for s in self.somas:
+            por_caderno = np.zeros((k,) + s.shape[1:], dtype=np.int64)
+            por_caderno[self.idx_caderno[ini:fim]] = s[ini:fim]
+            somas.append(por_caderno)
+        tabela = self._tabela(somas)
+        tabela.insert(tabela.columns.get_loc("dificuldade") + 1, "dificuldade_nacional", self._dificuldade_nacional)
+        return tabela[tabela["alunos"] > 0].reset_index(drop=True)
+
+def registros(tabela):
+    """Linhas da tabela no formato da API (alternativas agrupadas, NaN -> None)."""
+    colunas = list(ALTERNATIVAS) + [OUTRAS]
+    alternativas = tabela[colunas].to_dict(orient="records")
+    base = tabela.drop(columns=colunas).astype(object).where(tabela.drop(columns=colunas).notna(), None)
+    return [dict(linha, alternativas=alt) for linha, alt in zip(base.to_dict(orient="records"), alternativas)]
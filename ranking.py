@@ -0,0 +1,58 @@
+from sqlmodel import Session, select
+from models import CursoAgregado
+
+# --- ÍNDICE DE RANKING ---
+# Construído uma vez por versão dos dados a partir de CursoAgregado: ordenação
+# nacional + uma por sigla_estado, com dicionário co_curso -> posição.
+
+class IndiceRanking:
+    def __init__(self, linhas):
+        """linhas: tuplas (co_curso, ies_nome, acertos, total, sigla_estado) em ordem de importação."""
+        resultados = {}
+        for co_curso, nome, acertos, total, uf in linhas:
+            if co_curso not in resultados:
+                resultados[co_curso] = {"nome": nome, "acertos": 0, "total": 0, "uf": uf}
+            resultados[co_curso]["acertos"] += acertos
+            resultados[co_curso]["total"] += total
+
+        itens = []
+        for cid, dados in resultados.items():
+            media = (dados["acertos"] / dados["total"] * 100) if dados["total"] > 0 else 0
+            itens.append(({"co_curso": cid, "nome": dados["nome"], "media": round(media, 1)}, dados["uf"]))
+
+        # sorted é estável: empates mantêm a ordem de importação, como antes
+        itens.sort(key=lambda x: x[0]['media'], reverse=True)
+        self.nacional = [item for item, _ in itens]
+        self.por_uf = {}
+        for item, uf in itens:
+            if uf: self.por_uf.setdefault(uf, []).append(item)
+
+        self.posicoes = {None: {item["co_curso"]: i + 1 for i, item in enumerate(self.nacional)}}
+        for uf, lista in self.por_uf.items():
+            self.posicoes[uf] = {item["co_curso"]: i + 1 for i, item in enumerate(lista)}
+
+    @classmethod
+    def construir(cls, session: Session):
+        statement = select(CursoAgregado.co_curso, CursoAgregado.ies_nome, CursoAgregado.acertos,
+                           CursoAgregado.total, CursoAgregado.sigla_estado).order_by(CursoAgregado.id)
+        return cls(session.exec(statement).all())
+
+    def lista(self, uf=None):
+        return self.nacional if not uf else self.por_uf.get(uf, [])
+
+    def posicao(self, co_curso, uf=None):
+        """Posição 1-based; cursos fora do ranking caem na posição 1 (comportamento legado)."""
+        return self.posicoes.get(uf or None, {}).get(co_curso, 1)
+
+    def pagina(self, uf=None, pagina=1, tamanho=50):
+        lista = self.lista(uf)
+        inicio = max(pagina - 1, 0) * tamanho
+        return [dict(item, posicao=inicio + i + 1) for i, item in enumerate(lista[inicio:inicio + tamanho])]
+
+    def janela(self, co_curso, uf=None, topo=3, vizinhos=1):
+        """Top N + vizinhos do curso (visão do draw_rank do PDF), sem percorrer a lista."""
+        lista = self.lista(uf)
+        pos = self.posicao(co_curso, uf)
+        indices = set(range(min(topo, len(lista))))
+        indices.update(i for i in range(pos - 1 - vizinhos, pos + vizinhos) if 0 <= i < len(lista))
+        return [dict(lista[i], posicao=i + 1) for i in sorted(indices)]
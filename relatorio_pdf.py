@@ -0,0 +1,277 @@
+import threading
+from fpdf import FPDF
+from fpdf.image_datastructures import ImageCache
+from fpdf.image_parsing import preload_image
+
+# ==========================================
+# RELATÓRIO PDF (RENDERIZAÇÃO ISOLADA)
+# ==========================================
+# Este módulo não importa main.py nem o banco: roda dentro do pool de processos
+# da API (ver execucao.py) recebendo apenas dados prontos (dict serializável).
+#
+# As partes fixas do teaser (imagens já decodificadas e recomprimidas, textos
+# já sanitizados) ficam em um ModeloRelatorio montado uma vez por processo;
+# cada PDF só preenche os valores da IES. As fontes são as core do PDF
+# (Helvetica), cujas métricas o fpdf2 já carrega uma vez por processo.
+# O modelo usa o cache de imagens interno do fpdf2 (ImageCache/preload_image),
+# que não é API pública: por isso a faixa do fpdf2 fica fixada no requirements.txt.
+
+def sanitizar_texto(txt):
+    if not isinstance(txt, str): return str(txt)
+    mapa = {'\u201c': '"', '\u201d': '"', '\u2018': "'", '\u2019': "'", '\u2013': '-', '–': '-'}
+    for o, d in mapa.items(): txt = txt.replace(o, d)
+    return txt.encode('latin-1', 'replace').decode('latin-1')
+
+IMAGEM_LOGO = 'logo_branca.png'
+IMAGEM_CENARIO = 'cenario_paciente.png'
+
+class ModeloRelatorio:
+    """Partes fixas do teaser, preparadas uma vez e reaproveitadas por todos os PDFs do processo."""
+
+    def __init__(self):
+        # Decodificar o PNG (RGBA -> RGB + máscara alpha, zlib) é ~90% do custo de um PDF
+        self.imagens = ImageCache()
+        self.disponiveis = set()
+        for arquivo in [IMAGEM_LOGO, IMAGEM_CENARIO]:  # ordem de uso = mesma numeração de XObject
+            try:
+                preload_image(self.imagens, arquivo)
+                self.disponiveis.add(arquivo)
+            except Exception as e:
+                print(f"⚠️ Imagem {arquivo} indisponível para o PDF: {e}")
+        self.titulo = sanitizar_texto("Diagnóstico Microdados ENAMED 2025")
+        self.topicos = [sanitizar_texto(t) for t in ["Feedback imediato para o estudante", "Raciocínio Clínico estruturado e guiado",
+                                                     "Matriz Curricular alinhada aos casos", "Correção por IA individual"]]
+        self.textos = {chave: sanitizar_texto(texto) for chave, texto in {
+            "inteligencia": "Inteligência para o dia a dia",
+            "inteligencia_corpo": "Não basta identificar os erros: é preciso corrigi-los na prática. O Paciente 360 conecta aprendizagem, prática e avaliação.",
+            "cenario_legenda": "Da análise de dados à prática: pacientes padronizados para correção imediata dos gaps identificados.",
+            "questoes": "Do ENAMED 2025 exigem raciocínio clínico e não memorização.",
+            "casos": "Dos casos cobrados no exame já estão prontos na plataforma Paciente 360.",
+            "bloqueado": "CONTEÚDO BLOQUEADO NO TEASER",
+            "consultor": "Solicite a versão completa com seu consultor",
+        }.items()}
+
+    def cache_imagens(self):
+        """Cópia rasa do cache para um PDF novo: os bytes das imagens são compartilhados, só os contadores de uso não."""
+        cache = ImageCache(image_filter=self.imagens.image_filter)
+        cache.images = {nome: type(info)(info, usages=0) for nome, info in self.imagens.images.items()}
+        cache.icc_profiles = dict(self.imagens.icc_profiles)
+        return cache
+
+_MODELO = None
+_LOCK_MODELO = threading.Lock()
+
+def carregar_modelo():
+    """Modelo do processo (single-flight); também usado como initializer do POOL_PDF."""
+    global _MODELO
+    if _MODELO is None:
+        with _LOCK_MODELO:
+            if _MODELO is None: _MODELO = ModeloRelatorio()
+    return _MODELO
+
+class RelatorioP360(FPDF):
+    def __init__(self, modelo=None):
+        super().__init__()
+        self.modelo = modelo or carregar_modelo()
+        self.image_cache = self.modelo.cache_imagens()
+
+    def header(self):
+        self.set_fill_color(30, 58, 95)
+        self.rect(0, 0, 210, 45, 'F')
+        if IMAGEM_LOGO in self.modelo.disponiveis: self.image(IMAGEM_LOGO, x=165, y=10, w=30)
+        self.set_xy(15, 12)
+        self.set_font('Helvetica', 'B', 18); self.set_text_color(255, 255, 255)
+        self.cell(0, 8, self.modelo.titulo, ln=True)
+        if hasattr(self, 'ies_info'):
+            self.set_font('Helvetica', 'B', 11); self.set_text_color(253, 94, 17)
+            self.cell(0, 7, sanitizar_texto(f"IES: {self.ies_info['nome']}"), ln=True)
+            self.set_font('Helvetica', '', 10); self.set_text_color(220, 220, 220)
+            texto_sub = f"{self.ies_info['municipio']} - {self.ies_info['uf']} | Conceito ENAMED: {self.ies_info['conceito']}"
+            self.cell(0, 6, sanitizar_texto(texto_sub), ln=True)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font('Helvetica', 'I', 8)
+        self.set_text_color(150, 150, 150)
+        self.cell(0, 10, f"P360 Analytics - Pagina {self.page_no()}", 0, 0, 'C')
+
+def renderizar_lote(lista_dados, modelo=None):
+    """Vários teasers a partir do mesmo modelo (uma ida ao processo do POOL_PDF para o lote)."""
+    modelo = modelo or carregar_modelo()
+    return [renderizar_pdf(dados, modelo) for dados in lista_dados]
+
+def renderizar_pdf(dados, modelo=None):
+    """Gera os bytes do teaser a partir do dict montado por main.dados_pdf."""
+    co_curso, bench, analise = dados['co_curso'], dados['bench'], dados['analise']
+
+    pdf = RelatorioP360(modelo)
+    textos = pdf.modelo.textos
+    pdf.ies_info = dados['ies_info']
+    pdf.add_page()
+    
+    # --- PÁGINA 1 ---
+    pdf.set_y(55)
+    pdf.set_font('Helvetica', 'B', 14); pdf.set_text_color(30, 58, 95)
+    pdf.cell(0, 10, sanitizar_texto("1. Performance Comparativa"), new_x="LMARGIN", new_y="NEXT")    
+    
+    y_topo_cards = pdf.get_y() + 2
+    w_card, h_card, gap_card = 58, 28, 3
+    for i, (label, valor, cor_fundo, cor_texto) in enumerate([
+        ("Sua Média Geral", f"{bench['performance']['ies_atual']}%", (245, 245, 245), (30, 58, 95)),
+        ("Média Nacional", f"{bench['performance']['media_nacional']}%", (245, 245, 245), (30, 58, 95)),
+        ("Referências Conceito 5", f"{bench['performance']['media_elite_enamed_5']}%", (253, 94, 17), (255, 255, 255))
+    ]):
+        x_pos = 15 + (i * (w_card + gap_card))
+        pdf.set_fill_color(*cor_fundo); pdf.rect(x_pos, y_topo_cards, w_card, h_card, 'F')
+        pdf.set_xy(x_pos, y_topo_cards + 5)
+        pdf.set_font('Helvetica', '', 8); pdf.set_text_color(100 if i < 2 else 255)
+        pdf.cell(w_card, 5, sanitizar_texto(label), align="C", new_x="LMARGIN", new_y="NEXT")
+        pdf.set_x(x_pos); pdf.set_font('Helvetica', 'B', 18); pdf.set_text_color(*cor_texto)
+        pdf.cell(w_card, 12, valor, align="C", new_x="LMARGIN", new_y="NEXT")
+
+    pdf.set_xy(15, y_topo_cards + h_card + 3)
+    pdf.set_font('Helvetica', 'I', 8); pdf.set_text_color(120)
+    pdf.cell(0, 8, sanitizar_texto(f"Gap: {bench['gaps']['vs_elite']:+.1f} pp em relação à elite."), new_x="LMARGIN", new_y="NEXT")
+
+    pdf.ln(5); pdf.set_font('Helvetica', 'B', 14); pdf.set_text_color(30, 58, 95)
+    pdf.cell(0, 10, "2. Posicionamento Competitivo", new_x="LMARGIN", new_y="NEXT")
+
+    def draw_rank(ranking):
+        pdf.set_font('Helvetica', 'B', 10); pdf.set_text_color(30, 58, 95)
+        pdf.cell(0, 8, sanitizar_texto(f"{ranking['titulo']} - {ranking['posicao']} de {ranking['total']}"), new_x="LMARGIN", new_y="NEXT")
+        y_bar = pdf.get_y() + 2
+        for item in ranking['janela']:
+            eh_user = (item['co_curso'] == co_curso)
+            pdf.set_xy(15, y_bar); pdf.set_font('Helvetica', 'B' if eh_user else '', 8); pdf.set_text_color(30, 58, 95)
+            pdf.cell(25, 6, sanitizar_texto("Sua IES" if eh_user else f"{item['posicao']} Lugar"), new_x="RIGHT", new_y="TOP", align='R')
+            pdf.set_fill_color(*(253, 94, 17) if eh_user else (220, 220, 220))
+            largura = (item['media'] / 100) * 120; pdf.rect(45, y_bar, largura, 6, 'F')
+            pdf.set_xy(45 + largura + 2, y_bar); pdf.set_font('Helvetica', '', 8); pdf.set_text_color(100)
+            pdf.cell(15, 6, f"{item['media']}%"); y_bar += 8
+        pdf.set_y(y_bar + 2)
+
+    for ranking in dados['rankings']:
+        draw_rank(ranking)
+
+    # --- PÁGINA 2 ---
+    pdf.add_page(); pdf.set_y(55) 
+    col_area, col_sub, col_diag, col_med, col_gap = 32, 38, 70, 20, 20
+    col_caso = 36  # sai da coluna de diagnóstico quando a tabela mostra os casos recomendados
+    h_linha, w_box, h_box = 7, 16, 5 
+
+    def print_tabela_compacta(titulo, lista, modo_teaser=False, com_casos=False):
+        largura_diag = col_diag - col_caso if com_casos else col_diag
+        pdf.set_font('Helvetica', 'B', 12); pdf.set_text_color(30, 58, 95)
+        pdf.cell(0, 8, sanitizar_texto(titulo), new_x="LMARGIN", new_y="NEXT")
+        pdf.set_fill_color(30, 58, 95); pdf.set_text_color(255, 255, 255); pdf.set_font('Helvetica', 'B', 8)
+        pdf.cell(col_area, h_linha, " Área", 0, 0, 'L', True)
+        pdf.cell(col_sub, h_linha, " Subespecialidade", 0, 0, 'L', True)
+        pdf.cell(largura_diag, h_linha, " Diagnóstico", 0, 0, 'L', True)
+        if com_casos: pdf.cell(col_caso, h_linha, " Caso P360", 0, 0, 'L', True)
+        pdf.cell(col_med, h_linha, " Média", 0, 0, 'C', True)
+        pdf.cell(col_gap, h_linha, " Gap", 0, 1, 'C', True)
+        pdf.set_font('Helvetica', '', 7); pdf.set_text_color(60, 60, 60)
+        y_inicial_dados = pdf.get_y()
+
+        for i, item in enumerate(lista[:5]):
+            fill = (i % 2 == 0); y_at, x_at = pdf.get_y(), pdf.get_x()
+            pdf.set_fill_color(245, 245, 245) if fill else pdf.set_fill_color(255, 255, 255)
+            bloquear = modo_teaser and i > 0 
+            if bloquear:
+                pdf.cell(col_area + col_sub + col_diag + col_med + col_gap, h_linha, "", 0, 1, 'L', fill)
+                pdf.set_fill_color(210, 210, 210) 
+                pdf.rect(x_at + 2, y_at + 2, col_area - 4, 2.5, 'F')
+                pdf.rect(x_at + col_area + 2, y_at + 2, col_sub - 4, 2.5, 'F')
+                pdf.rect(x_at + col_area + col_sub + 2, y_at + 2, col_diag - 15, 2.5, 'F')
+            else:
+                pdf.cell(col_area, h_linha, sanitizar_texto(f" {item['grande_area']}"), 0, 0, 'L', fill)
+                pdf.cell(col_sub, h_linha, sanitizar_texto(f" {item['subespecialidade']}"), 0, 0, 'L', fill)
+                diag = item.get('diagnostico', 'N/A')
+                pdf.cell(largura_diag, h_linha, sanitizar_texto(f" {diag[:21 if com_casos else 45]}..."), 0, 0, 'L', fill)
+                if com_casos:
+                    casos = item.get('casos_recomendados') or []
+                    caso = casos[0]['diagnostico'] if casos else "-"
+                    pdf.cell(col_caso, h_linha, sanitizar_texto(f" {caso[:22]}..." if len(caso) > 25 else f" {caso}"), 0, 0, 'L', fill)
+                
+                # --- CORREÇÃO AQUI: REMOVIDO O *100 QUE CAUSAVA O BUG ---
+                pdf.cell(col_med, h_linha, f"{item['acerto']:.1f}%", 0, 0, 'C', fill)
+                
+                gap_val = item['gap']
+                pdf.set_fill_color(*(200, 0, 0) if gap_val < 0 else (0, 150, 0))
+                bx = x_at + col_area + col_sub + col_diag + col_med + ((col_gap - w_box)/2)
+                by = y_at + ((h_linha - h_box)/2); pdf.rect(bx, by, w_box, h_box, 'F')
+                pdf.set_xy(x_at + col_area + col_sub + col_diag + col_med, y_at)
+                pdf.set_font('Helvetica', 'B', 8); pdf.set_text_color(255, 255, 255)
+                pdf.cell(col_gap, h_linha, f"{gap_val:+.1f}", new_x="LMARGIN", new_y="NEXT", align='C')
+                pdf.set_font('Helvetica', '', 7); pdf.set_text_color(60, 60, 60)
+
+        if modo_teaser:
+            largura_box, altura_box = 130, 22
+            pos_x_central = (210 - largura_box) / 2
+            y_box = y_inicial_dados + h_linha + 2 
+            pdf.set_fill_color(255, 255, 255); pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.6)
+            pdf.rect(pos_x_central, y_box, largura_box, altura_box, 'FD')
+            pdf.set_xy(pos_x_central, y_box + 5)
+            pdf.set_font('Helvetica', 'B', 10); pdf.set_text_color(30, 58, 95)
+            pdf.cell(largura_box, 6, textos["bloqueado"], new_x="LMARGIN", new_y="NEXT", align='C')
+            pdf.set_x(pos_x_central)
+            pdf.set_font('Helvetica', 'B', 11); pdf.set_text_color(253, 94, 17)
+            pdf.cell(largura_box, 7, textos["consultor"], new_x="LMARGIN", new_y="NEXT", align='C')
+
+    pdf.set_x(15)
+    print_tabela_compacta("3. Pontos Críticos (Gap vs Nacional)", analise['atencao'], modo_teaser=False,
+                          com_casos=dados.get('cobertura_portfolio') is not None)
+    pdf.ln(4); pdf.set_x(15) 
+    print_tabela_compacta("4. Destaques Institucionais (Top 5)", analise['fortalezas'], modo_teaser=True)
+    
+    pdf.set_y(pdf.get_y() + 10); y_bloco_comercial = pdf.get_y()
+    pdf.set_draw_color(220); pdf.set_line_width(0.3)
+    pdf.line(15, y_bloco_comercial, 195, y_bloco_comercial); pdf.ln(6)
+
+    y_inicio_conteudo = pdf.get_y()
+    pdf.set_font('Helvetica', 'B', 14); pdf.set_text_color(30, 58, 95)
+    pdf.cell(80, 10, textos["inteligencia"], new_x="LMARGIN", new_y="NEXT")
+    pdf.set_font('Helvetica', '', 9); pdf.set_text_color(60, 60, 60)
+    pdf.multi_cell(80, 4.5, textos["inteligencia_corpo"])
+    pdf.ln(2)
+
+    for topico in pdf.modelo.topicos:
+        pdf.set_fill_color(253, 94, 17); pdf.rect(15, pdf.get_y() + 1.2, 2.5, 2.5, 'F') 
+        pdf.set_x(20); pdf.set_font('Helvetica', 'B', 9)
+        pdf.cell(70, 5, topico, new_x="LMARGIN", new_y="NEXT")
+
+    img_w, img_x, img_y = 92, 103, y_inicio_conteudo
+    if IMAGEM_CENARIO in pdf.modelo.disponiveis:
+        pdf.image(IMAGEM_CENARIO, x=img_x, y=img_y, w=img_w)
+        pdf.set_xy(img_x + 2, img_y + 53) 
+        pdf.set_font('Helvetica', 'I', 8); pdf.set_text_color(100)
+        pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.8)
+        pdf.line(img_x, pdf.get_y(), img_x, pdf.get_y() + 8) 
+        pdf.set_x(img_x + 3)
+        pdf.multi_cell(img_w - 5, 3.5, textos["cenario_legenda"])
+    else:
+        pdf.set_fill_color(245, 245, 245); pdf.rect(img_x, img_y, img_w, 40, 'F')
+
+    pdf.set_y(242); pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.5)
+    pdf.line(15, pdf.get_y() - 2, 195, pdf.get_y() - 2); pdf.ln(5); y_final_nums = pdf.get_y()
+    
+    pdf.set_x(15); pdf.set_font('Helvetica', 'B', 32); pdf.set_text_color(30, 58, 95)
+    pdf.cell(30, 12, "85%", new_x="RIGHT", new_y="TOP")
+    pdf.set_xy(15, y_final_nums + 11); pdf.set_font('Helvetica', 'B', 8); pdf.set_text_color(253, 94, 17)
+    pdf.cell(30, 5, "DAS QUESTÕES", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_xy(50, y_final_nums + 1); pdf.set_font('Helvetica', '', 8.5); pdf.set_text_color(60, 60, 60)
+    pdf.multi_cell(50, 4, textos["questoes"])
+
+    pdf.set_xy(105, y_final_nums)
+    pdf.set_font('Helvetica', 'B', 32); pdf.set_text_color(30, 58, 95)
+    cobertura = dados.get('cobertura_portfolio')
+    pdf.cell(30, 12, f"{cobertura['questoes']:.0f}%" if cobertura else "N/D", new_x="RIGHT", new_y="TOP")
+    pdf.set_xy(105, y_final_nums + 11); pdf.set_font('Helvetica', 'B', 8); pdf.set_text_color(253, 94, 17)
+    pdf.cell(30, 5, "DOS CASOS", new_x="LMARGIN", new_y="NEXT")
+    pdf.set_xy(140, y_final_nums + 1); pdf.set_font('Helvetica', '', 8.5); pdf.set_text_color(60, 60, 60)
+    pdf.multi_cell(55, 4, textos["casos"])
+
+    pdf.ln(12); pdf.set_draw_color(253, 94, 17); pdf.set_line_width(0.5)
+    pdf.line(15, pdf.get_y(), 195, pdf.get_y())
+    
+    return bytes(pdf.output())
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from motor_correcao import N_QUESTOES, desempacotar, contar_bits
+
+# --- ÍNDICE DE TAXONOMIA ---
+# Para cada caderno, uma matriz de incidência (100 questões x T grupos) diz a
+# que grupo (grande_area / subespecialidade / diagnostico) cada questão pertence.
+# Somar acertos por grupo vira um produto matricial sobre a matriz de acertos,
+# sem formato longo (melt) e sem merge com DF_MAPA_CACHE. O índice guarda o
+# GabaritoMatriz com que foi montado: quem corrige com ele usa os mesmos índices
+# de caderno, mesmo que uma carga incremental troque o índice no meio do request.
+#
+# A mesma incidência também vira máscaras de bits (caderno x grupo x 13 bytes):
+# com os acertos empacotados do aluno, a soma por grupo é um popcount(bits & máscara).
+
+# Linhas por vez no popcount (limita o temporário alunos x grupos x 13 bytes)
+BLOCO_POPCOUNT = 4096
+
+NIVEIS = {
+    "grande_area": ["grande_area"],
+    "subespecialidade": ["grande_area", "subespecialidade"],
+    "diagnostico": ["grande_area", "subespecialidade", "diagnostico"],
+}
+
+class IndiceTaxonomia:
+    def __init__(self, df_mapa, gabaritos):
+        self.gabaritos = gabaritos
+        self.cadernos = gabaritos.cadernos
+        self.rotulos, self.incidencia, self.mascaras, self.exato = {}, {}, {}, {}
+        k = len(self.cadernos)
+
+        colunas = NIVEIS["diagnostico"]
+        mapa = df_mapa if not df_mapa.empty else pd.DataFrame(columns=["co_caderno", "nu_questao"] + colunas)
+        mapa = mapa[mapa["co_caderno"].isin(self.cadernos) & mapa["nu_questao"].between(1, N_QUESTOES)]
+        linha = np.searchsorted(self.cadernos, mapa["co_caderno"].to_numpy(dtype=np.int64))
+        questao = mapa["nu_questao"].to_numpy(dtype=np.int64) - 1
+
+        for nivel, chaves in NIVEIS.items():
+            rotulado = mapa[chaves].notna().all(axis=1).to_numpy()  # groupby descarta chaves nulas
+            grupos = mapa.loc[rotulado, chaves].drop_duplicates().sort_values(chaves).reset_index(drop=True)
+            ids = pd.merge(mapa.loc[rotulado, chaves], grupos.reset_index(), on=chaves, how="left")["index"].to_numpy(dtype=np.intp)
+            incidencia = np.zeros((k, N_QUESTOES, len(grupos)), dtype=np.float64)
+            # Mapeamentos duplicados contam em dobro, como no merge original
+            np.add.at(incidencia, (linha[rotulado], questao[rotulado], ids), 1)
+            self.rotulos[nivel] = grupos
+            self.incidencia[nivel] = incidencia
+            self.mascaras[nivel] = np.ascontiguousarray(np.packbits(incidencia > 0, axis=1).transpose(0, 2, 1))
+            self.exato[nivel] = not (incidencia > 1).any()  # máscara não representa questão contada em dobro
+
+    def somas_por_linha(self, somas_questao, idx_caderno, pesos, nivel):
+        """
+        somas_questao: (m x 100) acertos por questão de cada linha (aluno ou grupo de alunos).
+        pesos: nº de alunos de cada linha. Retorna (acertos, total) com forma (m x T).
+        """
+        incidencia = self.incidencia[nivel]
+        m, t = len(idx_caderno), incidencia.shape[2]
+        acertos, total = np.zeros((m, t)), np.zeros((m, t))
+        somas_questao = np.asarray(somas_questao, dtype=np.float64)
+        for j in np.unique(idx_caderno):
+            linhas = idx_caderno == j
+            acertos[linhas] = somas_questao[linhas] @ incidencia[j]
+            total[linhas] = np.asarray(pesos)[linhas, None] * incidencia[j].sum(axis=0)
+        return acertos, total
+
+    def somas_bits(self, bits, idx_caderno, nivel):
+        """
+        (acertos, total) por aluno e grupo (m x T) a partir dos acertos empacotados,
+        por popcount. Com mapeamento duplicado volta ao produto matricial.
+        """
+        if not self.exato[nivel]:
+            return self.somas_por_linha(desempacotar(bits), idx_caderno, np.ones(len(idx_caderno)), nivel)
+        mascaras = self.mascaras[nivel]
+        m, t = len(idx_caderno), mascaras.shape[1]
+        acertos, total = np.zeros((m, t)), np.zeros((m, t))
+        for j in np.unique(idx_caderno):
+            linhas = np.flatnonzero(idx_caderno == j)
+            for ini in range(0, len(linhas), BLOCO_POPCOUNT):
+                bloco = linhas[ini:ini + BLOCO_POPCOUNT]
+                acertos[bloco] = contar_bits(bits[bloco, None, :] & mascaras[j][None])
+            total[linhas] = self.incidencia[nivel][j].sum(axis=0)
+        return acertos, total
+
+    def somas(self, acertos_bool, idx_caderno, nivel):
+        """Totais (acertos, total) por grupo de um conjunto de alunos: soma por caderno e depois projeta."""
+        presentes, alunos = np.unique(idx_caderno, return_counts=True)
+        somas_questao = np.zeros((len(presentes), N_QUESTOES), dtype=np.int64)
+        for i, j in enumerate(presentes):
+            somas_questao[i] = acertos_bool[idx_caderno == j].sum(axis=0)
+        acertos, total = self.somas_por_linha(somas_questao, presentes, alunos, nivel)
+        return acertos.sum(axis=0), total.sum(axis=0)
+
+    def volume_questoes(self, idx_caderno, nivel):
+        """Nº de números de questão distintos por grupo entre os cadernos presentes (nunique de nu_questao)."""
+        presentes = np.unique(idx_caderno)
+        if not len(presentes): return np.zeros(len(self.rotulos[nivel]), dtype=int)
+        return (self.incidencia[nivel][presentes] > 0).any(axis=0).sum(axis=0)
+
+    def questoes_mapeadas(self, idx_caderno):
+        """Máscara (alunos,) de quem tem ao menos uma questão mapeada no seu caderno."""
+        mapeado = self.incidencia["grande_area"].sum(axis=(1, 2)) > 0
+        return mapeado[idx_caderno] if len(mapeado) else np.zeros(len(idx_caderno), dtype=bool)
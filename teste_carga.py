@@ -0,0 +1,334 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+import numpy as np
+import httpx
+from benchmark import DIRETORIO_REPO, commit_atual
+
+# --- TESTE DE CARGA CONCORRENTE ---
+# Simula N consultores simultâneos contra a API, localmente: em processo (ASGI,
+# via httpx.ASGITransport, com o lifespan da API) ou em um uvicorn local com
+# vários workers. Cada usuário virtual sorteia uma categoria pelo mix de tráfego
+# (filtros, dashboard, benchmark, pdf, exportar), escolhe um curso/UF/termo e
+# repete até o fim da janela. Mede latência (p50/p95/p99), vazão, taxa de erro
+# (HTTP >= 400 exceto 503, e falhas de conexão), taxa de 503 (pool cheio, contada
+# à parte) e o pico de RSS de cada processo (API, workers do uvicorn, pool de
+# PDF), lido do /proc. Com --limites, compara com os limites de regressão e sai
+# com código 1 se algum for violado.
+# Requer httpx, além do requirements.txt: pip install -r requirements-dev.txt
+# Ex.: python teste_carga.py --dados dados_sinteticos --concorrencia 50 --duracao 60 --limites limites_carga.json
+
+PERFIS = {
+    "consultores": {"filtros": 30, "dashboard": 30, "benchmark": 20, "pdf": 10, "exportar": 10},
+    "navegacao": {"filtros": 50, "dashboard": 35, "benchmark": 15},
+    "relatorios": {"dashboard": 20, "pdf": 50, "exportar": 30},
+}
+CATEGORIAS = ["filtros", "dashboard", "benchmark", "pdf", "exportar"]
+LIMITES_PADRAO = os.path.join(DIRETORIO_REPO, "limites_carga.json")
+
+def ler_mix(perfil, mix):
+    """Pesos por categoria: o perfil, sobrescrito por --mix 'dashboard=40,pdf=10'."""
+    pesos = dict(PERFIS[perfil])
+    for parte in filter(None, (mix or "").split(",")):
+        nome, _, peso = parte.partition("=")
+        nome = nome.strip()
+        if nome not in CATEGORIAS: raise ValueError(f"Categoria desconhecida no mix: {nome}")
+        pesos[nome] = float(peso)
+    pesos = {c: p for c, p in pesos.items() if p > 0}
+    if not pesos: raise ValueError("Mix de tráfego vazio")
+    return pesos
+
+class Alvos:
+    """Cursos, UFs e termos de busca reais, descobertos na própria API antes da carga."""
+
+    def __init__(self, cursos, ufs, termos):
+        self.cursos, self.ufs, self.termos = cursos, ufs, termos
+
+    def caminho(self, categoria, rng):
+        if categoria == "filtros":
+            return rng.choice([
+                "/filtros/ufs",
+                f"/filtros/ies?uf={rng.choice(self.ufs)}" if self.ufs else "/filtros/ies",
+                f"/filtros/ies/buscar?q={rng.choice(self.termos)}" if self.termos else "/filtros/ufs",
+            ])
+        co_curso = rng.choice(self.cursos)
+        return {"dashboard": f"/ies/{co_curso}/dashboard", "benchmark": f"/ies/{co_curso}/benchmark",
+                "pdf": f"/ies/{co_curso}/pdf", "exportar": f"/ies/{co_curso}/exportar"}[categoria]
+
+async def descobrir_alvos(cliente, quantidade, rng):
+    ranking = (await cliente.get("/ranking", params={"tamanho": 500})).json()
+    cursos = [item["co_curso"] for item in ranking.get("itens", [])]
+    if not cursos: raise RuntimeError("Ranking vazio: a base precisa ter cursos carregados")
+    cursos = rng.sample(cursos, min(quantidade, len(cursos)))
+    ufs = (await cliente.get("/filtros/ufs")).json()
+    termos = sorted({p[:4].lower() for item in ranking["itens"] for p in str(item.get("nome", "")).split() if len(p) >= 4})
+    return Alvos(cursos, ufs, termos[:50])
+
+# --- RSS POR PROCESSO (/proc, sem dependência extra) ---
+
+def _ler_proc(pid, arquivo):
+    try:
+        with open(f"/proc/{pid}/{arquivo}", "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def arvore_processos(raiz):
+    """{pid: profundidade} da raiz e todos os descendentes."""
+    pais = {}
+    for nome in os.listdir("/proc"):
+        if not nome.isdigit(): continue
+        stat = _ler_proc(nome, "stat")
+        if stat is None: continue
+        campos = stat[stat.rfind(b")") + 2:].split()
+        pais[int(nome)] = int(campos[1])
+    profundidade, fronteira = {raiz: 0}, [raiz]
+    while fronteira:
+        atual = fronteira.pop()
+        for pid, pai in pais.items():
+            if pai == atual and pid not in profundidade:
+                profundidade[pid] = profundidade[atual] + 1
+                fronteira.append(pid)
+    return profundidade
+
+def rss_mb(pid):
+    status = _ler_proc(pid, "status")
+    if status is None: return None
+    for linha in status.splitlines():
+        if linha.startswith(b"VmRSS:"):
+            return round(int(linha.split()[1]) / 1024, 1)
+    return None
+
+async def amostrar_rss(raiz, papeis, picos, parar, intervalo=0.5):
+    """Pico de RSS de cada processo da árvore, amostrado até `parar` ser sinalizado."""
+    while True:
+        for pid, profundidade in arvore_processos(raiz).items():
+            valor = rss_mb(pid)
+            if valor is None: continue
+            linha_comando = _ler_proc(pid, "cmdline") or b""
+            papel = "auxiliar" if b"resource_tracker" in linha_comando else papeis(profundidade)
+            atual = picos.setdefault(pid, {"papel": papel, "rss_pico_mb": 0.0})
+            atual["rss_pico_mb"] = max(atual["rss_pico_mb"], valor)
+        try:
+            await asyncio.wait_for(parar.wait(), intervalo)
+            return
+        except asyncio.TimeoutError:
+            pass
+
+# --- CARGA ---
+
+async def usuario(cliente, alvos, pesos, rng, inicio_medicao, fim, registros, pausa):
+    categorias, probabilidades = list(pesos), list(pesos.values())
+    while time.perf_counter() < fim:
+        categoria = rng.choices(categorias, probabilidades)[0]
+        caminho = alvos.caminho(categoria, rng)
+        inicio = time.perf_counter()
+        try:
+            resposta = await cliente.get(caminho)
+            await resposta.aread()
+            status = resposta.status_code
+        except httpx.HTTPError:
+            status = 0  # timeout / conexão recusada
+        termino = time.perf_counter()
+        if inicio >= inicio_medicao:  # o aquecimento não entra nas estatísticas
+            registros.append((categoria, status, termino - inicio, termino))
+        if pausa: await asyncio.sleep(rng.uniform(0, 2 * pausa))
+
+def resumir(registros, janela):
+    """Estatísticas por categoria e do total."""
+    grupos = {"total": registros}
+    for categoria in CATEGORIAS:
+        grupo = [r for r in registros if r[0] == categoria]
+        if grupo: grupos[categoria] = grupo
+    resumo = {}
+    for nome, grupo in grupos.items():
+        if not grupo: continue
+        latencias = np.array([r[2] for r in grupo]) * 1000
+        status = {}
+        for r in grupo: status[str(r[1])] = status.get(str(r[1]), 0) + 1
+        rejeitados = sum(1 for r in grupo if r[1] == 503)
+        erros = sum(1 for r in grupo if r[1] == 0 or r[1] >= 400) - rejeitados
+        resumo[nome] = {
+            "n": len(grupo),
+            "p50_ms": round(float(np.percentile(latencias, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencias, 95)), 2),
+            "p99_ms": round(float(np.percentile(latencias, 99)), 2),
+            "max_ms": round(float(latencias.max()), 2),
+            "vazao_rps": round(len(grupo) / janela, 2) if janela > 0 else None,
+            "taxa_erro": round(erros / len(grupo), 4),
+            "taxa_503": round(rejeitados / len(grupo), 4),
+            "status": dict(sorted(status.items())),
+        }
+    return resumo
+
+async def executar_carga(cliente, args, raiz, papeis):
+    rng = random.Random(args.semente)
+    alvos = await descobrir_alvos(cliente, args.cursos, rng)
+    pesos = ler_mix(args.perfil, args.mix)
+    print(f"🎯 {len(alvos.cursos)} cursos, mix {pesos}, {args.concorrencia} usuários, "
+          f"{args.aquecimento}s de aquecimento + {args.duracao}s medidos")
+
+    picos, parar, registros = {}, asyncio.Event(), []
+    amostrador = asyncio.create_task(amostrar_rss(raiz, papeis, picos, parar))
+    agora = time.perf_counter()
+    inicio_medicao, fim = agora + args.aquecimento, agora + args.aquecimento + args.duracao
+    # Cada usuário tem o próprio gerador (semente derivada): o tráfego é reprodutível
+    await asyncio.gather(*[usuario(cliente, alvos, pesos, random.Random(args.semente * 1000 + i),
+                                   inicio_medicao, fim, registros, args.pausa)
+                           for i in range(args.concorrencia)])
+    janela = max(min(time.perf_counter(), max((r[3] for r in registros), default=fim)) - inicio_medicao, 1e-9)
+    parar.set()
+    await amostrador
+    return {
+        "mix": pesos,
+        "cursos": alvos.cursos,
+        "janela_s": round(janela, 3),
+        "endpoints": resumir(registros, janela),
+        "processos": {str(pid): info for pid, info in sorted(picos.items())},
+    }
+
+async def rodar_asgi(args):
+    """API no mesmo processo (o cliente divide o event loop com ela; o pool de PDF são processos filhos)."""
+    import main
+    transporte = httpx.ASGITransport(app=main.app)
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://p360", timeout=args.timeout) as cliente:
+            return await executar_carga(cliente, args, os.getpid(), lambda p: "api" if p == 0 else "pool_pdf")
+
+async def rodar_uvicorn(args, dados):
+    """uvicorn local em subprocesso (workers reais, como em produção); o cliente só faz HTTP."""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [DIRETORIO_REPO, os.environ.get("PYTHONPATH")])))
+    comando = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(args.porta),
+               "--workers", str(args.workers), "--log-level", "warning"]
+    servidor = subprocess.Popen(comando, cwd=dados, env=env)
+    base = f"http://127.0.0.1:{args.porta}"
+    limites = httpx.Limits(max_connections=args.concorrencia, max_keepalive_connections=args.concorrencia)
+    try:
+        async with httpx.AsyncClient(base_url=base, timeout=args.timeout, limits=limites) as cliente:
+            prazo = time.perf_counter() + args.espera_servidor
+            while True:
+                if servidor.poll() is not None: raise RuntimeError(f"uvicorn saiu com código {servidor.returncode}")
+                try:
+                    if (await cliente.get("/status")).status_code == 200: break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() > prazo: raise RuntimeError("uvicorn não respondeu a tempo")
+                await asyncio.sleep(0.5)
+            # Com 1 worker o uvicorn serve no próprio processo; com mais, a raiz só supervisiona
+            if args.workers > 1:
+                papeis = lambda p: "supervisor" if p == 0 else ("worker" if p == 1 else "pool_pdf")
+            else:
+                papeis = lambda p: "api" if p == 0 else "pool_pdf"
+            return await executar_carga(cliente, args, servidor.pid, papeis)
+    finally:
+        servidor.terminate()
+        try:
+            servidor.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            servidor.kill()
+
+# --- LIMITES DE REGRESSÃO ---
+
+def verificar_limites(relatorio, limites):
+    """Lista de violações (vazia = passou). Ver limites_carga.json para o formato."""
+    violacoes = []
+    endpoints = relatorio["endpoints"]
+    for metrica in ["p50_ms", "p95_ms", "p99_ms"]:
+        for nome, maximo in limites.get(f"{metrica[:-3]}_max_ms", {}).items():
+            if nome in endpoints and endpoints[nome][metrica] > maximo:
+                violacoes.append(f"{nome} {metrica} {endpoints[nome][metrica]} > {maximo}")
+    for metrica in ["taxa_erro", "taxa_503"]:
+        for nome, maximo in limites.get(f"{metrica}_max", {}).items():
+            if nome in endpoints and endpoints[nome][metrica] > maximo:
+                violacoes.append(f"{nome} {metrica} {endpoints[nome][metrica]} > {maximo}")
+    vazao_min = limites.get("vazao_min_rps")
+    if vazao_min is not None and endpoints.get("total", {}).get("vazao_rps", 0) < vazao_min:
+        violacoes.append(f"total vazao_rps {endpoints.get('total', {}).get('vazao_rps', 0)} < {vazao_min}")
+    rss_max = limites.get("rss_max_mb_por_processo")
+    for pid, info in relatorio["processos"].items():
+        if rss_max is not None and info["rss_pico_mb"] > rss_max:
+            violacoes.append(f"processo {pid} ({info['papel']}) rss {info['rss_pico_mb']} MB > {rss_max}")
+    return violacoes
+
+def imprimir(relatorio):
+    print(f"\n{'endpoint':<12}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'erro %':>8}{'503 %':>8}  status")
+    for nome, est in relatorio["endpoints"].items():
+        print(f"{nome:<12}{est['n']:>7}{est['p50_ms']:>10.1f}{est['p95_ms']:>10.1f}{est['p99_ms']:>10.1f}"
+              f"{est['vazao_rps'] or 0:>9.1f}{est['taxa_erro'] * 100:>8.2f}{est['taxa_503'] * 100:>8.2f}  {est['status']}")
+    print("\nRSS pico por processo:")
+    for pid, info in relatorio["processos"].items():
+        print(f"   {pid:>8} {info['papel']:<11}{info['rss_pico_mb']:>9.1f} MB")
+
+def main(args):
+    dados = os.path.abspath(args.dados)
+    saida = os.path.abspath(args.saida) if args.saida else None
+    limites = os.path.abspath(args.limites) if args.limites else None
+    ler_mix(args.perfil, args.mix)  # mix inválido falha antes de subir a API
+    if args.artefatos_frios:
+        # Diretório vazio: o primeiro PDF/Excel de cada curso é gerado de fato
+        os.environ["P360_DIR_ARTEFATOS"] = tempfile.mkdtemp(prefix="p360_carga_artefatos_")
+
+    relatorio = {"meta": {
+        "commit": commit_atual(),
+        "data": datetime.now().isoformat(timespec="seconds"),
+        "cpus": os.cpu_count(),
+        "dados": dados,
+        "modo": args.modo,
+        "workers": args.workers if args.modo == "uvicorn" else 1,
+        "concorrencia": args.concorrencia,
+        "duracao_s": args.duracao,
+        "perfil": args.perfil,
+        "semente": args.semente,
+    }}
+    if args.modo == "asgi":
+        os.chdir(dados)  # main.py usa caminhos relativos (banco, armazém, imagens)
+        sys.path.insert(0, DIRETORIO_REPO)
+        relatorio.update(asyncio.run(rodar_asgi(args)))
+    else:
+        relatorio.update(asyncio.run(rodar_uvicorn(args, dados)))
+    imprimir(relatorio)
+
+    codigo = 0
+    if limites:
+        with open(limites) as f:
+            violacoes = verificar_limites(relatorio, json.load(f))
+        relatorio["violacoes"] = violacoes
+        if violacoes:
+            print("\n❌ Limites de regressão violados:")
+            for v in violacoes: print(f"   - {v}")
+            codigo = 1
+        else:
+            print("\n✅ Dentro dos limites de regressão.")
+    if saida:
+        with open(saida, "w") as f:
+            json.dump(relatorio, f, indent=2, ensure_ascii=False)
+        print(f"💾 Resultados em {saida}")
+    return codigo
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga concorrente da API P360 (local)")
+    parser.add_argument("--dados", default="dados_sinteticos", help="diretório com o banco já criado")
+    parser.add_argument("--modo", choices=["asgi", "uvicorn"], default="asgi", help="API em processo ou uvicorn local")
+    parser.add_argument("--workers", type=int, default=2, help="workers do uvicorn (modo uvicorn)")
+    parser.add_argument("--porta", type=int, default=8360, help="porta do uvicorn (modo uvicorn)")
+    parser.add_argument("--concorrencia", type=int, default=50, help="usuários virtuais simultâneos")
+    parser.add_argument("--duracao", type=float, default=30, help="segundos medidos")
+    parser.add_argument("--aquecimento", type=float, default=5, help="segundos iniciais fora das estatísticas")
+    parser.add_argument("--perfil", choices=sorted(PERFIS), default="consultores", help="mix de tráfego base")
+    parser.add_argument("--mix", help="sobrescreve pesos do perfil, ex.: 'dashboard=40,pdf=10,exportar=0'")
+    parser.add_argument("--cursos", type=int, default=50, help="cursos sorteados para o tráfego")
+    parser.add_argument("--pausa", type=float, default=0.0, help="tempo médio de pensar entre requests (s)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="timeout por request (s)")
+    parser.add_argument("--espera-servidor", type=float, default=120.0, help="prazo para o uvicorn subir (s)")
+    parser.add_argument("--artefatos-frios", action="store_true", help="PDF/Excel em cache de artefatos vazio")
+    parser.add_argument("--semente", type=int, default=360)
+    parser.add_argument("--limites", nargs="?", const=LIMITES_PADRAO, help="JSON de limites (sem valor: limites_carga.json)")
+    parser.add_argument("--saida", help="grava o relatório em JSON")
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,42 @@
+import os
+import shutil
+import pytest
+
+# Antes de qualquer import de main: PDF renderizado no pool de análise (sem
+# processos spawn) e versão dos dados verificada a cada request.
+os.environ.setdefault("P360_PROCESSOS_PDF", "0")
+os.environ.setdefault("P360_INTERVALO_VERSAO", "0")
+
+DIRETORIO_REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture(scope="session")
+def base_sintetica(tmp_path_factory):
+    """
+    Base sintética carregada pelo db_creator. O diretório fica como cwd durante a
+    sessão: main, db_creator e os caches em disco usam caminhos relativos.
+    """
+    from sqlmodel import create_engine
+    from gerar_dados_sinteticos import gerar
+    import db_creator
+    diretorio = tmp_path_factory.mktemp("base_sintetica")
+    gerar(str(diretorio), alunos=3000, cadernos=4, cursos=60, anos=(2025,), semente=7)
+    shutil.copy(os.path.join(DIRETORIO_REPO, "portfolio_casos.csv"), diretorio)
+    anterior = os.getcwd()
+    os.chdir(diretorio)
+    # O engine do db_creator guarda o caminho absoluto de quando o módulo foi importado
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(db_creator, "engine", create_engine(db_creator.CONN_STR))
+        try:
+            db_creator.main()
+            yield diretorio
+        finally:
+            db_creator.engine.dispose()
+            os.chdir(anterior)
+
+@pytest.fixture(scope="session")
+def api(base_sintetica):
+    """Módulo main (aquecido pelo lifespan) e um TestClient da API."""
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as cliente:
+        yield main, cliente
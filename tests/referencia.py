@@ -0,0 +1,30 @@
+# --- CORREÇÃO DE REFERÊNCIA (LINHA A LINHA) ---
+# A correção do main.py original, questão por questão, com as regras que o
+# motor vetorizado unificou: respostas valem com 100 posições (brancos à
+# direita), letras comparadas em maiúsculas, X/Z/* no gabarito anulam a questão,
+# posições além do gabarito nunca são acerto e caderno sem gabarito fica fora.
+
+N_QUESTOES = 100
+ANULADAS = ["X", "Z", "*"]
+
+def corrigir_linha(respostas, gabarito):
+    """Lista de 100 acertos (bool) de um aluno; None se o caderno não tem gabarito."""
+    if not gabarito: return None
+    respostas = list(str(respostas or "")[:N_QUESTOES].ljust(N_QUESTOES))
+    acertos = []
+    for i in range(N_QUESTOES):
+        if i >= len(gabarito):
+            acertos.append(False)
+            continue
+        resp_al = str(respostas[i]).strip().upper()
+        resp_gab = str(gabarito[i]).strip().upper()
+        acertos.append(resp_gab in ANULADAS or resp_al == resp_gab)
+    return acertos
+
+def corrigir_alunos(alunos, gabarito_map):
+    """alunos: (respostas, co_caderno). Retorna [(acertos, valido)], acertos todos False para inválidos."""
+    resultado = []
+    for respostas, co_caderno in alunos:
+        acertos = corrigir_linha(respostas, gabarito_map.get(co_caderno))
+        resultado.append((acertos or [False] * N_QUESTOES, acertos is not None))
+    return resultado
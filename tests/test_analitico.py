@@ -0,0 +1,161 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+from sqlmodel import Session, create_engine, text
+from models import Aluno, Gabarito, Localidade, QuestaoMapeamento
+from banco import migrar
+from db_creator import importar_agregados
+from analitico import BackendSQLite, BackendDuckDB, abrir_backend, exportar_parquet
+from ranking import IndiceRanking
+from motor_correcao import N_QUESTOES
+from referencia import corrigir_alunos
+
+# Base pequena com os casos de borda da correção: letras minúsculas, anuladas,
+# gabarito curto, respostas curtas ou vazias, caderno sem gabarito, conceito com
+# espaços, curso sem localidade e questão mapeada duas vezes. O BackendSQLite é
+# comparado com a correção linha a linha (roda sem duckdb); o BackendDuckDB, com
+# o BackendSQLite.
+
+LETRAS = "ABCDE"
+
+def gabarito(rng, tamanho=N_QUESTOES):
+    return "".join(rng.choice(LETRAS) for _ in range(tamanho))
+
+def resposta(rng, gab):
+    return "".join(g if rng.random() < 0.6 else rng.choice(LETRAS + "abcde ") for g in gab.ljust(N_QUESTOES, "A"))
+
+@pytest.fixture(scope="module")
+def base(tmp_path_factory):
+    rng = random.Random(7)
+    diretorio = tmp_path_factory.mktemp("analitico")
+    engine = create_engine(f"sqlite:///{diretorio / 'base.db'}")
+    migrar(engine)
+
+    gabaritos = {1: gabarito(rng), 2: gabarito(rng), 3: gabarito(rng, 96)}
+    gabaritos[2] = "X" + gabaritos[2][1:50] + "*" + gabaritos[2][51:]
+    gabaritos[3] = gabaritos[3][:10] + " " + gabaritos[3][11:]
+    mapa, alunos = [], []
+    cursos = {101: ("SP", "5"), 102: ("SP", " 5"), 103: ("RJ", "3"), 104: ("MG", "4"), 105: (None, "2")}
+    with Session(engine) as session:
+        session.add_all([Gabarito(co_caderno=c, respostas_gabarito=g) for c, g in gabaritos.items()])
+        for caderno in gabaritos:
+            for q in range(1, N_QUESTOES + 1):
+                area = f"Area {q % 4}"
+                mapa.append((caderno, q, area, f"{area} / Sub {q % 7}", f"Diag {q % 11}"))
+        mapa.append((1, 5, "Area 9", "Sub 9", "Diag 9"))
+        session.add_all([QuestaoMapeamento(co_caderno=c, nu_questao=q, grande_area=g, subespecialidade=s, diagnostico=d)
+                         for c, q, g, s, d in mapa])
+        for co_curso, (uf, _) in cursos.items():
+            if uf: session.add(Localidade(co_curso=co_curso, ies_estado=uf, ies_munic="Cidade", sigla_estado=uf))
+        for i in range(400):
+            co_curso = rng.choice(list(cursos))
+            caderno = rng.choice([1, 2, 3, 3, 9] if i % 50 == 0 else [1, 2, 3])
+            respostas = resposta(rng, gabaritos.get(caderno, gabaritos[1]))
+            if i % 37 == 0: respostas = respostas[:rng.randint(0, 60)]
+            alunos.append((co_curso, caderno, respostas))
+            session.add(Aluno(nu_ano=2025, co_curso=co_curso, co_caderno=caderno, ies_nome=f"IES {co_curso}",
+                              p360=rng.choice("SN"), enamed_ies=cursos[co_curso][1], respostas=respostas))
+        session.commit()
+
+        importar_agregados(session)
+        assert session.exec(text("SELECT COUNT(*) FROM cursoagregado")).one()[0] > 0
+    yield engine, cursos, {c: list(g) for c, g in gabaritos.items()}, alunos, mapa
+    engine.dispose()
+
+@pytest.fixture(scope="module")
+def parquet(base, tmp_path_factory):
+    pytest.importorskip("duckdb")
+    pytest.importorskip("pyarrow")
+    diretorio = str(tmp_path_factory.mktemp("parquet"))
+    with Session(base[0]) as session:
+        exportar_parquet(session, diretorio)
+    return diretorio
+
+@pytest.fixture(scope="module")
+def backends(parquet):
+    return BackendSQLite(), BackendDuckDB(parquet)
+
+def referencia_por_curso(base):
+    """{co_curso: [acertos, total, conceito]} e acertos por grupo da taxonomia, corrigindo aluno por aluno."""
+    _, cursos, gabaritos, alunos, mapa = base
+    corrigidos = corrigir_alunos([(r, c) for _, c, r in alunos], gabaritos)
+    por_curso = {co_curso: [0, 0, conceito.strip()] for co_curso, (_, conceito) in cursos.items()}
+    longo = []
+    for (co_curso, caderno, _), (acertos, valido) in zip(alunos, corrigidos):
+        if not valido: continue
+        por_curso[co_curso][0] += sum(acertos)
+        por_curso[co_curso][1] += N_QUESTOES
+        longo += [(g, s, d, acertos[q - 1]) for c, q, g, s, d in mapa if c == caderno]
+    chaves = ["grande_area", "subespecialidade", "diagnostico"]
+    referencial = pd.DataFrame(longo, columns=chaves + ["acerto"]).groupby(chaves)["acerto"].mean()
+    return por_curso, referencial
+
+def test_sqlite_igual_a_correcao_por_linha(base):
+    engine, cursos, _, _, _ = base
+    por_curso, _ = referencia_por_curso(base)
+    sqlite = BackendSQLite()
+    with Session(engine) as session:
+        indice = IndiceRanking(sqlite.linhas_ranking(session))
+        nacional, conceito5, somas = sqlite.somas_benchmark(list(cursos) + [999], session)
+
+    medias = {c: round(a / t * 100, 1) if t else 0 for c, (a, t, _) in por_curso.items()}
+    assert {item["co_curso"]: item["media"] for item in indice.nacional} == medias
+    assert [item["media"] for item in indice.nacional] == sorted(medias.values(), reverse=True)
+    assert {uf: {item["co_curso"] for item in lista} for uf, lista in indice.por_uf.items()} == \
+        {"SP": {101, 102}, "RJ": {103}, "MG": {104}}
+    assert nacional == (sum(a for a, _, _ in por_curso.values()), sum(t for _, t, _ in por_curso.values()))
+    assert conceito5 == (sum(a for a, _, c in por_curso.values() if c == "5"), sum(t for _, t, c in por_curso.values() if c == "5"))
+    assert somas == {**{c: (a, t) for c, (a, t, _) in por_curso.items()}, 999: (0, 0)}
+
+def test_referencial_sqlite_igual_a_correcao_por_linha(base):
+    engine = base[0]
+    _, esperado = referencia_por_curso(base)
+    chaves = ["grande_area", "subespecialidade", "diagnostico"]
+    with Session(engine) as session:
+        obtido = BackendSQLite().referencial_nacional(session).set_index(chaves)["acerto"].sort_index()
+    assert obtido.index.equals(esperado.sort_index().index)
+    np.testing.assert_allclose(obtido.to_numpy(), esperado.sort_index().to_numpy(), rtol=0, atol=1e-12)
+
+def test_abrir_backend_sem_parquet_usa_sqlite(base, tmp_path):
+    with Session(base[0]) as session:
+        assert abrir_backend(session, "sqlite", str(tmp_path)).nome == "sqlite"
+        assert abrir_backend(session, "duckdb", str(tmp_path / "inexistente")).nome == "sqlite"
+
+def test_ranking_igual(base, backends):
+    engine = base[0]
+    sqlite, duck = backends
+    with Session(engine) as session:
+        esperado = IndiceRanking(sqlite.linhas_ranking(session))
+    obtido = IndiceRanking(duck.linhas_ranking())
+    assert obtido.nacional == esperado.nacional
+    assert obtido.por_uf == esperado.por_uf
+
+def test_benchmark_igual(base, backends):
+    engine, cursos = base[:2]
+    sqlite, duck = backends
+    consulta = list(cursos) + [999]  # curso inexistente soma (0, 0) nos dois
+    with Session(engine) as session:
+        assert duck.somas_benchmark(consulta) == sqlite.somas_benchmark(consulta, session)
+
+def test_referencial_igual(base, backends):
+    engine = base[0]
+    sqlite, duck = backends
+    chaves = ["grande_area", "subespecialidade", "diagnostico"]
+    with Session(engine) as session:
+        esperado = sqlite.referencial_nacional(session).set_index(chaves)["acerto"].sort_index()
+    obtido = duck.referencial_nacional().set_index(chaves)["acerto"].sort_index()
+    assert len(esperado) > 0
+    assert obtido.index.equals(esperado.index)
+    np.testing.assert_allclose(obtido.to_numpy(), esperado.to_numpy(), rtol=0, atol=1e-12)
+
+def test_abrir_backend_exige_parquet_em_dia(base, parquet):
+    engine = base[0]
+    with Session(engine) as session:
+        assert abrir_backend(session, "duckdb", parquet).nome == "duckdb"
+        assert abrir_backend(session, "sqlite", parquet).nome == "sqlite"
+        session.add(Aluno(nu_ano=2025, co_curso=101, co_caderno=1, ies_nome="IES 101", p360="N",
+                          enamed_ies="5", respostas="A" * N_QUESTOES))
+        session.flush()
+        assert abrir_backend(session, "duckdb", parquet).nome == "sqlite"
+        session.rollback()
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import threading
+import pytest
+from starlette.requests import Request
+from artefatos import CacheArtefatos, etag_confere
+
+def test_gravar_concorrente_mesmo_artefato(tmp_path):
+    cache = CacheArtefatos(str(tmp_path))
+    erros, inicio = [], threading.Barrier(8)
+
+    def gravar(n):
+        inicio.wait()
+        try:
+            for i in range(100):
+                cache.gravar("pdf", 1, 1, f"{n}-{i}".encode() * 100)
+        except Exception as e:
+            erros.append(e)
+
+    threads = [threading.Thread(target=gravar, args=(n,)) for n in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert erros == []
+    assert os.listdir(tmp_path) == [os.path.basename(cache.caminho("pdf", 1, 1))]
+    conteudo = cache.obter("pdf", 1, 1)
+    assert conteudo == conteudo[:len(conteudo) // 100] * 100  # uma gravação inteira, nunca misturada
+
+def test_obter_e_remocao_lru(tmp_path):
+    cache = CacheArtefatos(str(tmp_path), limite_bytes=250)
+    assert cache.obter("pdf", 1, 1) is None
+    cache.gravar("pdf", 1, 1, b"a" * 100)
+    cache.gravar("pdf", 2, 1, b"b" * 100)
+    os.utime(cache.caminho("pdf", 1, 1), (1, 1))  # curso 1 é o menos usado
+    cache.gravar("pdf", 3, 1, b"c" * 100)
+    assert cache.obter("pdf", 1, 1) is None
+    assert cache.obter("pdf", 2, 1) == b"b" * 100
+    assert cache.obter("pdf", 3, 1) == b"c" * 100
+    assert (cache.hits, cache.misses) == (2, 2)
+
+def test_etag_confere():
+    etag = CacheArtefatos().etag("pdf", 7, 3)
+    assert etag_confere(etag, etag)
+    assert etag_confere(f'"outra", W/{etag}', etag)
+    assert etag_confere("*", etag)
+    assert not etag_confere(None, etag)
+    assert not etag_confere(CacheArtefatos().etag("pdf", 7, 2), etag)
+
+def requisicao(cabecalhos=()):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": list(cabecalhos)})
+
+@pytest.fixture
+def servidor(api, tmp_path, monkeypatch):
+    main, _ = api
+    monkeypatch.setattr(main, "CACHE_ARTEFATOS", CacheArtefatos(str(tmp_path)))
+    return main
+
+def test_servir_artefato_single_flight(servidor):
+    main = servidor
+    chamadas = []
+
+    async def gerar():
+        chamadas.append(1)
+        await asyncio.sleep(0.05)
+        return b"%PDF relatorio"
+
+    async def simultaneos():
+        return await asyncio.gather(*[main.servir_artefato(requisicao(), "pdf", 42, gerar, "application/pdf", "x.pdf")
+                                      for _ in range(10)])
+
+    respostas = asyncio.run(simultaneos())
+    assert len(chamadas) == 1
+    assert {r.body for r in respostas} == {b"%PDF relatorio"}
+    assert len({r.headers["etag"] for r in respostas}) == 1
+
+    # Em cache: nem gera de novo, e a ETag devolvida pelo cliente vira 304
+    etag = respostas[0].headers["etag"]
+    assert asyncio.run(main.servir_artefato(requisicao(), "pdf", 42, gerar, "application/pdf", "x.pdf")).body == b"%PDF relatorio"
+    condicional = requisicao([(b"if-none-match", etag.encode())])
+    assert asyncio.run(main.servir_artefato(condicional, "pdf", 42, gerar, "application/pdf", "x.pdf")).status_code == 304
+    assert len(chamadas) == 1
+
+def test_servir_artefato_falha_nao_trava_quem_espera(servidor):
+    main = servidor
+    chamadas = []
+
+    async def gerar():
+        chamadas.append(1)
+        await asyncio.sleep(0.05)
+        if len(chamadas) == 1: raise RuntimeError("falha na primeira geração")
+        return b"%PDF segunda"
+
+    async def simultaneos():
+        return await asyncio.gather(*[main.servir_artefato(requisicao(), "pdf", 43, gerar, "application/pdf", "x.pdf")
+                                      for _ in range(5)], return_exceptions=True)
+
+    respostas = asyncio.run(simultaneos())
+    assert sum(isinstance(r, RuntimeError) for r in respostas) == 1
+    assert {r.body for r in respostas if not isinstance(r, Exception)} == {b"%PDF segunda"}
+    assert len(chamadas) == 2
+    assert main._GERANDO_ARTEFATOS == {}
+
+def test_rota_pdf(api):
+    main, cliente = api
+    co_curso = cliente.get("/ranking").json()["itens"][0]["co_curso"]
+    resposta = cliente.get(f"/ies/{co_curso}/pdf")
+    assert resposta.status_code == 200
+    assert resposta.content.startswith(b"%PDF")
+    assert cliente.get(f"/ies/{co_curso}/pdf", headers={"If-None-Match": resposta.headers["etag"]}).status_code == 304
@@ -0,0 +1,51 @@
+from busca_ies import IndiceIES
+
+PARES = [
+    (1, "UNIVERSIDADE FEDERAL DO CEARÁ"),
+    (2, "UNIVERSIDADE ESTADUAL DO CEARA"),
+    (3, "FACULDADE DE MEDICINA DE SÃO PAULO"),
+    (4, "UNIVERSIDADE DE SÃO PAULO"),
+    (5, "CENTRO UNIVERSITÁRIO SÃO CAMILO"),
+    (6, "UNIVERSIDADE FEDERAL DE GOIÁS".encode("utf-8").decode("latin-1")),  # gravado com mojibake
+    (12345, "ESCOLA BAHIANA DE MEDICINA"),
+]
+LOCAIS = [
+    (1, "CE", "Fortaleza", "FORTALEZA"), (2, "CE", "Fortaleza", "FORTALEZA"),
+    (3, "SP", "São Paulo", "SAO PAULO"), (4, "SP", "São Paulo", "SAO PAULO"), (5, "SP", "São Paulo", "SAO PAULO"),
+    (6, "GO", "Goiânia", "GOIANIA"), (12345, "BA", "Salvador", "SALVADOR"),
+]
+
+def cursos(resultado):
+    return [r["co_curso"] for r in resultado]
+
+def test_busca_ignora_acentos_e_caixa():
+    indice = IndiceIES(PARES, LOCAIS)
+    for q in ("ceara", "Ceará", "CEARÁ", " ceará "):
+        assert cursos(indice.buscar(q)) == [1, 2]  # mesma posição do termo: nome mais curto antes
+    assert cursos(indice.buscar("são paulo")) == cursos(indice.buscar("SAO PAULO"))
+    goias = indice.buscar("goias")
+    assert cursos(goias) == [6] and goias[0]["nome"] == "UNIVERSIDADE FEDERAL DE GOIÁS"
+    assert goias[0]["uf"] == "GO" and goias[0]["municipio"] == "Goiânia"
+
+def test_ordem_dos_resultados():
+    indice = IndiceIES(PARES, LOCAIS)
+    # termos inteiros no nome (termo mais cedo primeiro) > casou pelo município
+    assert cursos(indice.buscar("sao paulo")) == [4, 3, 5]
+    # nome começando pela frase (nome mais curto, depois ordem de nome) > termo como prefixo no meio do nome
+    assert cursos(indice.buscar("univ")) == [4, 6, 1, 2, 5]
+    assert cursos(indice.buscar("univ", limite=2)) == [4, 6]
+    # código exato vem primeiro
+    assert cursos(indice.buscar("12345")) == [12345]
+    assert cursos(indice.buscar("medicina")) == [3, 12345]  # termo mais cedo no nome
+    assert cursos(indice.buscar("fortaleza")) == [1, 2]  # só pelo município
+    assert cursos(indice.buscar("federal ceara")) == [1]
+
+def test_filtros():
+    indice = IndiceIES(PARES, LOCAIS)
+    assert cursos(indice.buscar("universidade", uf="ce")) == [1, 2]
+    assert indice.buscar("universidade", uf="RS") == []
+    assert indice.buscar("   ") == [] and indice.buscar("inexistente") == []
+    assert IndiceIES([], []).buscar("ceara") == []
+    assert cursos(indice.listar(uf="sp")) == [5, 3, 4]
+    assert cursos(indice.listar(municipio="sao paulo")) == [5, 3, 4]
+    assert indice.ufs == ["BA", "CE", "GO", "SP"]
@@ -0,0 +1,54 @@
+import pandas as pd
+from sqlmodel import Session, select
+from models import CursoAgregado
+import db_creator
+
+def sincronizar(main):
+    with Session(main.engine) as session:
+        main.sincronizar_versao(session, forcar=True)
+
+def agregado(main, co_curso):
+    with Session(main.engine) as session:
+        linhas = session.exec(select(CursoAgregado.acertos, CursoAgregado.total).where(CursoAgregado.co_curso == co_curso)).all()
+    return sum(l[0] for l in linhas), sum(l[1] for l in linhas)
+
+def test_recarga_de_particao_atualiza_rankings_agregados_e_caches(api, base_sintetica, tmp_path):
+    main, cliente = api
+    ranking = cliente.get("/ranking", params={"tamanho": 1000}).json()["itens"]
+    ultimo = ranking[-1]["co_curso"]
+    dashboard = cliente.get(f"/ies/{ultimo}/dashboard").json()
+    versao, ranking_cache, antes = main.VERSAO_DADOS, main.RANKING_CACHE, agregado(main, ultimo)
+    assert main.CACHE_RESULTADOS.estatisticas()["entradas"] > 0
+
+    # Mesma partição (2025) com o último colocado gabaritando a prova
+    original = str(base_sintetica / "base_alunos.csv")
+    df = pd.read_csv(original, sep=";", dtype=str, encoding="latin1", keep_default_na=False)
+    colunas_q = [c for c in df.columns if c.startswith("DS_VT_ESC_OBJ.")]
+    for i in df.index[df["CO_CURSO"] == str(ultimo)]:
+        gab = main.GABARITO_CACHE[int(df.at[i, "CO_CADERNO"])]
+        df.loc[i, colunas_q] = [str(g)[:1] or "." for g in gab]
+    alterado = str(tmp_path / "base_alunos_2025.csv")
+    df.to_csv(alterado, sep=";", index=False, encoding="latin1")
+
+    try:
+        db_creator.carga_incremental(alunos=alterado)
+        sincronizar(main)
+        assert main.VERSAO_DADOS == versao + 1
+        assert main.CACHE_RESULTADOS.versao == main.VERSAO_DADOS
+        assert main.CACHE_RESULTADOS.estatisticas()["entradas"] == 0
+        assert main.RANKING_CACHE is not ranking_cache
+
+        acertos, total = agregado(main, ultimo)
+        assert total == antes[1] and acertos > antes[0]
+        novo = cliente.get("/ranking", params={"tamanho": 1000}).json()["itens"]
+        assert novo[0]["co_curso"] == ultimo and novo[0]["media"] > ranking[-1]["media"]
+        assert cliente.get(f"/ies/{ultimo}/dashboard").json() != dashboard
+    finally:
+        # Volta a partição original: os demais testes usam a mesma base
+        db_creator.carga_incremental(alunos=original)
+        sincronizar(main)
+
+    assert main.VERSAO_DADOS == versao + 2
+    assert agregado(main, ultimo) == antes
+    assert cliente.get("/ranking", params={"tamanho": 1000}).json()["itens"] == ranking
+    assert cliente.get(f"/ies/{ultimo}/dashboard").json() == dashboard
@@ -0,0 +1,67 @@
+import json
+import numpy as np
+import pytest
+from sqlmodel import Session, create_engine, text
+from models import Aluno, Gabarito, VersaoDados
+from banco import migrar
+from colunar import abrir_armazem, exportar_colunas, carimbar_versao, versao_aluno
+from motor_correcao import N_QUESTOES
+
+def publicar(session, escopo):
+    session.add(VersaoDados(criado_em="2026-01-01T00:00:00", escopo=json.dumps(escopo)))
+    session.commit()
+
+@pytest.fixture
+def sessao(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'base.db'}")
+    migrar(engine)
+    with Session(engine) as session:
+        session.add(Gabarito(co_caderno=1, respostas_gabarito="A" * N_QUESTOES))
+        for i, (ano, co_curso) in enumerate([(2024, 20), (2024, 10), (2025, 10), (2025, 30)]):
+            session.add(Aluno(nu_ano=ano, co_curso=co_curso, co_caderno=1, ies_nome="IES", p360="N",
+                              enamed_ies="3", respostas="AB"[i % 2] * N_QUESTOES))
+        session.commit()
+        publicar(session, {"completo": True})
+        yield session
+    engine.dispose()
+
+def test_armazem_ordenado_por_curso(sessao, tmp_path):
+    assert exportar_colunas(sessao, str(tmp_path / "colunas")) == 4
+    armazem = abrir_armazem(sessao, str(tmp_path / "colunas"))
+    assert armazem.co_curso.tolist() == [10, 10, 20, 30]
+    ids, _, respostas = armazem.fatia_curso(10)
+    assert ids.tolist() == [2, 3]
+    assert bytes(respostas[0, :3]) == b"BBB"
+    assert armazem.fatia_curso(99)[0].size == 0
+
+def test_particao_recarregada_com_mesmos_ids_invalida_armazem(sessao, tmp_path):
+    diretorio = str(tmp_path / "colunas")
+    exportar_colunas(sessao, diretorio)
+    assert abrir_armazem(sessao, diretorio) is not None
+
+    # Versão que não mexe em alunos (ex.: localidades) mantém o armazém válido
+    publicar(sessao, {"localidade": [10]})
+    assert abrir_armazem(sessao, diretorio) is not None
+
+    # Partição de maior id apagada e recarregada: mesma contagem e mesmo maior id
+    antes = sessao.exec(text("SELECT COUNT(*), MAX(id) FROM aluno")).one()
+    sessao.exec(text("DELETE FROM aluno WHERE nu_ano = 2025"))
+    for co_curso in [40, 50]:
+        sessao.add(Aluno(nu_ano=2025, co_curso=co_curso, co_caderno=1, ies_nome="IES", p360="N",
+                         enamed_ies="3", respostas="C" * N_QUESTOES))
+    sessao.commit()
+    assert sessao.exec(text("SELECT COUNT(*), MAX(id) FROM aluno")).one() == antes
+    publicar(sessao, {"aluno": [2025]})
+    assert abrir_armazem(sessao, diretorio) is None  # exportação falhou: armazém antigo não vale
+
+    exportar_colunas(sessao, diretorio)
+    armazem = abrir_armazem(sessao, diretorio)
+    assert np.isin([40, 50], armazem.co_curso).all()
+
+def test_carimbo_da_versao_publicada(sessao, tmp_path):
+    diretorio = str(tmp_path / "colunas")
+    exportar_colunas(sessao, diretorio)  # db_creator exporta antes de publicar...
+    publicar(sessao, {"aluno": [2025]})
+    assert abrir_armazem(sessao, diretorio) is None
+    carimbar_versao(versao_aluno(sessao), diretorio)  # ...e carimba com a versão publicada
+    assert abrir_armazem(sessao, diretorio) is not None
@@ -0,0 +1,93 @@
+import pytest
+from collections import defaultdict
+from sqlmodel import Session, select
+from models import Aluno, Localidade
+from cubo import interpretar_cohort
+from referencia import corrigir_alunos
+
+def chave(item):
+    return (item["grande_area"], item["subespecialidade"], item["diagnostico"])
+
+@pytest.fixture(scope="module")
+def alunos_corrigidos(api):
+    """Alunos válidos com as dimensões da coorte e os acertos por grande_area, corrigidos linha a linha."""
+    main, _ = api
+    with Session(main.engine) as session:
+        alunos = session.exec(select(Aluno.nu_ano, Aluno.co_curso, Aluno.enamed_ies, Aluno.p360,
+                                     Aluno.respostas, Aluno.co_caderno)).all()
+        ufs = dict(session.exec(select(Localidade.co_curso, Localidade.sigla_estado)).all())
+    questoes = defaultdict(list)
+    for m in main.DF_MAPA_CACHE.itertuples():
+        questoes[m.co_caderno].append((m.grande_area, m.nu_questao - 1))
+    linhas = []
+    for aluno, (acertos, valido) in zip(alunos, corrigir_alunos([(a.respostas, a.co_caderno) for a in alunos], main.GABARITO_CACHE)):
+        if not valido: continue
+        por_area = defaultdict(lambda: [0, 0])
+        for area, q in questoes[aluno.co_caderno]:
+            por_area[area][0] += acertos[q]
+            por_area[area][1] += 1
+        linhas.append(({"co_curso": aluno.co_curso, "ano": str(aluno.nu_ano), "conceito": str(aluno.enamed_ies).strip(),
+                        "p360": aluno.p360, "uf": str(ufs.get(aluno.co_curso) or "").strip().upper()}, por_area))
+    return linhas
+
+def esperado(alunos_corrigidos, filtro):
+    somas = defaultdict(lambda: [0, 0])
+    for dimensoes, por_area in alunos_corrigidos:
+        if filtro(dimensoes):
+            for area, (a, t) in por_area.items():
+                somas[area][0] += a
+                somas[area][1] += t
+    return somas
+
+def curso_com_uf(cliente, alunos_corrigidos):
+    com_uf = {d["co_curso"] for d, _ in alunos_corrigidos if d["uf"]}
+    return next(i["co_curso"] for i in cliente.get("/ranking", params={"tamanho": 1000}).json()["itens"] if i["co_curso"] in com_uf)
+
+def test_coorte_nacional_reproduz_o_dashboard(api, alunos_corrigidos):
+    _, cliente = api
+    co_curso = curso_com_uf(cliente, alunos_corrigidos)
+    dashboard = cliente.get(f"/ies/{co_curso}/dashboard").json()
+    comparacao = cliente.get(f"/ies/{co_curso}/comparar").json()
+    assert comparacao["cohort"] == {"nacional": True}
+    assert comparacao["media_ies"] == dashboard["media_geral"]
+    for lista in ("fortalezas", "atencao"):
+        assert [(chave(i), i["acerto"], i["media_nacional"], i["gap"]) for i in dashboard["analise"][lista]] == \
+               [(chave(i), i["acerto"], i["media_cohort"], i["gap"]) for i in comparacao["analise"][lista]]
+
+@pytest.mark.parametrize("cohort", [None, "uf", "conceito", "p360", "ano:2025", "uf,p360", "conceito:5", "p360:S", "municipio"])
+def test_coorte_igual_ao_filtro_aluno_a_aluno(api, alunos_corrigidos, cohort):
+    _, cliente = api
+    co_curso = curso_com_uf(cliente, alunos_corrigidos)
+    do_curso = next(d for d, _ in alunos_corrigidos if d["co_curso"] == co_curso)
+    resposta = cliente.get(f"/ies/{co_curso}/comparar", params={"cohort": cohort} if cohort else {})
+    if cohort == "municipio":  # sem município no teste aluno a aluno: só confere o valor usado
+        assert resposta.status_code == 200 and resposta.json()["cohort"]["municipio"]
+        return
+    filtros = {d: (v if v is not None else do_curso[d]) for d, v in interpretar_cohort(cohort).items()}
+    somas = esperado(alunos_corrigidos, lambda d: all(d[k].upper() == str(v).upper() for k, v in filtros.items()))
+    if not any(t for _, t in somas.values()):
+        assert resposta.status_code == 404
+        return
+    comparacao = resposta.json()
+    assert comparacao["cohort"] == (filtros or {"nacional": True})
+    assert comparacao["cursos_cohort"] == len({d["co_curso"] for d, _ in alunos_corrigidos
+                                                if all(d[k].upper() == str(v).upper() for k, v in filtros.items())})
+    proprio = esperado(alunos_corrigidos, lambda d: d["co_curso"] == co_curso and d["ano"] == filtros.get("ano", d["ano"]))
+    for area in comparacao["grandes_areas"]:
+        a, t = somas[area["grande_area"]]
+        assert area["media_cohort"] == round(a / t * 100, 2)
+        a, t = proprio[area["grande_area"]]
+        assert area["acerto"] == round(a / t * 100, 2)
+    total = [sum(v) for v in zip(*somas.values())]
+    assert comparacao["media_cohort"] == round(total[0] / total[1] * 100, 2)
+
+def test_excluir_proprio_e_erros(api, alunos_corrigidos):
+    _, cliente = api
+    co_curso = curso_com_uf(cliente, alunos_corrigidos)
+    somas = esperado(alunos_corrigidos, lambda d: d["co_curso"] != co_curso)
+    total = [sum(v) for v in zip(*somas.values())]
+    comparacao = cliente.get(f"/ies/{co_curso}/comparar", params={"excluir_proprio": True}).json()
+    assert comparacao["media_cohort"] == round(total[0] / total[1] * 100, 2)
+    assert cliente.get(f"/ies/{co_curso}/comparar", params={"cohort": "regiao:sul"}).status_code == 400
+    assert cliente.get("/ies/999999/comparar").status_code == 404
+    assert cliente.get(f"/ies/{co_curso}/comparar", params={"cohort": "ano:1999"}).status_code == 404
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlmodel import Session, select
+from models import Aluno
+from distribuicao import DistribuicoesReferencia, GERAL, N_FAIXAS, QUANTIS, faixas, histograma, quantis, percentis
+from referencia import corrigir_alunos
+
+def percentil_numpy(notas):
+    """Quantis sobre as notas de cada aluno: menor nota com F(nota) >= q."""
+    return {nome: int(np.percentile(notas, q * 100, method="inverted_cdf")) for nome, q in QUANTIS.items()}
+
+@pytest.mark.parametrize("n", [1, 2, 3, 10, 30, 99, 257, 5000])
+def test_quantis_iguais_a_np_percentile(n):
+    rng = np.random.default_rng(n)
+    for notas in (rng.integers(0, N_FAIXAS, n), np.clip(rng.normal(62, 12, n), 0, 100).astype(int), np.full(n, 100)):
+        assert quantis(histograma(notas)) == percentil_numpy(notas)
+    assert quantis(np.zeros(N_FAIXAS, dtype=np.int64)) == {nome: None for nome in QUANTIS}
+
+def test_percentis_meio_rank():
+    notas = np.random.default_rng(15).integers(40, 90, 777)
+    pr = percentis(histograma(notas))
+    for faixa in (0, 40, 55, 70, 89, 100):
+        esperado = ((notas < faixa).sum() + 0.5 * (notas == faixa).sum()) / len(notas) * 100
+        assert pr[faixa] == pytest.approx(esperado, abs=1e-9)
+    assert np.isnan(percentis(np.zeros(N_FAIXAS))).all()
+
+def test_faixas():
+    acertos = np.array([0, 1, 7, 33, 99, 100, 3, 0])
+    total = np.array([100, 3, 7, 100, 100, 100, 0, 0])
+    assert faixas(acertos, total).tolist() == [0, 33, 100, 33, 99, 100, -1, -1]
+    assert histograma(faixas(acertos, total)).sum() == 6
+
+def test_referencia_soma_cursos_por_mascara_e_ano():
+    df = pd.DataFrame([(2024, 1, "SP", "5", GERAL, 50, 2), (2025, 1, "SP", "5", GERAL, 60, 3),
+                       (2025, 2, "RJ", "3", GERAL, 60, 4), (2025, 2, "RJ", "3", "Clínica", 10, 1)],
+                      columns=["nu_ano", "co_curso", "sigla_estado", "enamed_ies", "grande_area", "faixa", "alunos"])
+    referencias = DistribuicoesReferencia(df)
+    assert referencias.areas == [GERAL, "Clínica"]
+    nacional = referencias.referencia(np.ones(2, dtype=bool))
+    assert nacional[0, 50] == 2 and nacional[0, 60] == 7 and nacional[1, 10] == 1
+    assert referencias.referencia(referencias.uf == "SP")[0].sum() == 5
+    assert referencias.referencia(np.ones(2, dtype=bool), ano=2024)[0].sum() == 2
+    assert referencias.referencia(np.ones(2, dtype=bool), ano=2023).sum() == 0
+    assert referencias.indice_curso(2) == 1 and referencias.indice_curso(3) is None
+
+def test_endpoint_igual_as_notas_aluno_a_aluno(api):
+    main, cliente = api
+    co_curso = cliente.get("/ranking", params={"tamanho": 5}).json()["itens"][2]["co_curso"]
+    with Session(main.engine) as session:
+        alunos = session.exec(select(Aluno.co_curso, Aluno.respostas, Aluno.co_caderno)).all()
+    corrigidos = corrigir_alunos([(r, c) for _, r, c in alunos], main.GABARITO_CACHE)
+    notas = np.array([sum(a) for a, valido in corrigidos if valido])
+    do_curso = np.array([sum(a) for (curso, _, _), (a, valido) in zip(alunos, corrigidos) if valido and curso == co_curso])
+
+    geral = cliente.get(f"/ies/{co_curso}/distribuicao").json()["distribuicoes"][GERAL]
+    assert geral["curso"]["alunos"] == len(do_curso)
+    assert geral["curso"]["quantis"] == percentil_numpy(do_curso)
+    assert geral["curso"]["media"] == round(float(do_curso.mean()), 2)
+    nacional = geral["referencias"]["nacional"]
+    assert nacional["alunos"] == len(notas)
+    assert nacional["quantis"] == percentil_numpy(notas)
+    assert nacional["histograma"] == np.bincount(notas, minlength=N_FAIXAS).tolist()
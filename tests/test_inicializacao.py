@@ -0,0 +1,36 @@
+import json
+import os
+import pandas as pd
+from sqlmodel import Session
+from contexto import MANIFESTO, gravar_snapshot, ler_snapshot
+
+def test_aquecer_le_versao_e_armazem(api):
+    main, cliente = api
+    with Session(main.engine) as session:
+        assert main.VERSAO_DADOS == main.versao_atual(session) > 0
+    assert main.ARMAZEM_COLUNAR is not None
+    assert main.CACHE_RESULTADOS.versao == main.VERSAO_DADOS
+    assert main.METRICAS_INICIALIZACAO["origem_contexto"] == "snapshot"
+    assert cliente.get("/status").json()["versao_dados"] == main.VERSAO_DADOS
+
+def test_snapshot_vazio_ou_incompleto_e_ignorado(api, tmp_path):
+    main, _ = api
+    diretorio = str(tmp_path)
+    with Session(main.engine) as session:
+        gravar_snapshot(session, 7, diretorio)
+    gabaritos, mapa, referencial = ler_snapshot(7, diretorio)
+    assert gabaritos and not mapa.empty and not referencial.empty
+    assert ler_snapshot(8, diretorio) is None  # outra versão
+
+    # Gravação interrompida: referencial com menos linhas que o manifesto
+    referencial.head(3).to_parquet(os.path.join(diretorio, "referencial.parquet"), index=False)
+    assert ler_snapshot(7, diretorio) is None
+
+    # Snapshot vazio, mesmo com manifesto coerente
+    pd.DataFrame(columns=referencial.columns).to_parquet(os.path.join(diretorio, "referencial.parquet"), index=False)
+    with open(os.path.join(diretorio, MANIFESTO)) as f:
+        manifesto = json.load(f)
+    manifesto["linhas"]["referencial"] = 0
+    with open(os.path.join(diretorio, MANIFESTO), "w") as f:
+        json.dump(manifesto, f)
+    assert ler_snapshot(7, diretorio) is None
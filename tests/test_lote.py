@@ -0,0 +1,38 @@
+import json
+
+def ndjson(resposta):
+    assert resposta.status_code == 200
+    assert resposta.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(linha) for linha in resposta.text.splitlines()]
+
+def cursos_do_ranking(cliente, n=7):
+    itens = cliente.get("/ranking", params={"tamanho": 1000}).json()["itens"]
+    return [item["co_curso"] for item in itens[::max(len(itens) // n, 1)][:n]]
+
+def test_lote_dashboard_igual_ao_endpoint_avulso(api, monkeypatch):
+    main, cliente = api
+    monkeypatch.setattr(main, "TAMANHO_BLOCO_LOTE", 3)  # vários blocos no mesmo stream
+    cursos = cursos_do_ranking(cliente) + [999999]
+    linhas = ndjson(cliente.post("/ies/batch/dashboard", json={"cursos": cursos + cursos[:2]}))
+    assert [linha["co_curso"] for linha in linhas] == cursos  # repetidos saem uma vez, na ordem pedida
+    for linha in linhas:
+        avulso = cliente.get(f"/ies/{linha['co_curso']}/dashboard")
+        if avulso.status_code == 404:
+            assert linha == {"co_curso": linha["co_curso"], "erro": avulso.json()["detail"]}
+        else:
+            assert linha == {"co_curso": linha["co_curso"], **avulso.json()}
+    assert "erro" in linhas[-1]
+
+def test_lote_benchmark_igual_ao_endpoint_avulso(api):
+    main, cliente = api
+    cursos = cursos_do_ranking(cliente)
+    linhas = ndjson(cliente.post("/ies/batch/benchmark", json={"cursos": cursos}))
+    assert [linha["co_curso"] for linha in linhas] == cursos
+    for linha in linhas:
+        assert linha == {"co_curso": linha["co_curso"], **cliente.get(f"/ies/{linha['co_curso']}/benchmark").json()}
+
+def test_lote_invalido(api, monkeypatch):
+    main, cliente = api
+    assert cliente.post("/ies/batch/dashboard", json={"cursos": []}).status_code == 400
+    monkeypatch.setattr(main, "MAX_CURSOS_LOTE", 2)
+    assert cliente.post("/ies/batch/benchmark", json={"cursos": [1, 2, 3]}).status_code == 400
@@ -0,0 +1,96 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+from collections import namedtuple
+from memoizacao import CacheResultados, tamanho_bytes
+
+Metricas = namedtuple("Metricas", ["acertos", "indice"])
+
+def test_leitor_recebe_copia_do_payload():
+    cache = CacheResultados(versao=1)
+    primeiro = cache.obter("dashboard", 10, lambda: {"areas": [{"nome": "Clínica", "gap": 1.0}]}, 1)
+    primeiro["areas"][0]["gap"] = 99  # quem calculou altera o seu resultado
+    segundo = cache.obter("dashboard", 10, lambda: pytest.fail("deveria vir do cache"), 1)
+    assert segundo == {"areas": [{"nome": "Clínica", "gap": 1.0}]}
+    segundo["areas"].clear()
+    assert cache.obter("dashboard", 10, None, 1)["areas"]
+
+    df = cache.obter("matriz", 10, lambda: pd.DataFrame({"acerto": [0.5]}), 1)
+    df.loc[0, "acerto"] = 0
+    assert cache.obter("matriz", 10, None, 1).loc[0, "acerto"] == 0.5
+
+def test_arrays_guardados_ficam_somente_leitura():
+    cache = CacheResultados(versao=1)
+    indice = object()
+    metricas = cache.obter("metricas", 10, lambda: Metricas(np.zeros(5), indice), 1)
+    assert metricas.indice is indice  # objetos compartilhados não são copiados
+    with pytest.raises(ValueError):
+        metricas.acertos[0] = 1
+    assert cache.obter("metricas", 10, None, 1).acertos is metricas.acertos
+
+def test_limite_em_bytes_remove_o_menos_usado():
+    tamanho = tamanho_bytes(np.zeros(1000))
+    cache = CacheResultados(limite_bytes=3 * tamanho, versao=1)
+    for co_curso in (1, 2, 3):
+        cache.obter("metricas", co_curso, lambda: np.zeros(1000), 1)
+    cache.obter("metricas", 1, None, 1)  # 1 passa a ser o mais recente
+    cache.obter("metricas", 4, lambda: np.zeros(1000), 1)
+    estatisticas = cache.estatisticas()
+    assert estatisticas["entradas"] == 3 and estatisticas["remocoes"] == 1
+    assert estatisticas["bytes"] == 3 * tamanho <= cache.limite_bytes
+    assert ("metricas", 2, 1) not in cache._itens and ("metricas", 1, 1) in cache._itens
+
+    # Resultado maior que o limite é devolvido mas não entra
+    cache.obter("metricas", 5, lambda: np.zeros(4000), 1)
+    assert ("metricas", 5, 1) not in cache._itens and cache.estatisticas()["bytes"] == 3 * tamanho
+
+def test_single_flight_calcula_uma_vez():
+    cache = CacheResultados(versao=1)
+    chamadas, resultados = [], []
+    def calcular():
+        chamadas.append(1)
+        time.sleep(0.2)
+        return {"media": 71.5}
+    threads = [threading.Thread(target=lambda: resultados.append(cache.obter("benchmark", 7, calcular, 1)))
+               for _ in range(8)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert len(chamadas) == 1
+    assert resultados == [{"media": 71.5}] * 8
+    assert len({id(r) for r in resultados}) == 8  # cada um com a sua cópia
+    assert cache.estatisticas()["misses"] == 1 and cache.estatisticas()["hits"] == 7
+
+def test_falha_libera_quem_espera():
+    cache = CacheResultados(versao=1)
+    iniciou = threading.Event()
+    def falhar():
+        iniciou.set()
+        time.sleep(0.1)
+        raise RuntimeError("falhou")
+    erros = []
+    def lider():
+        try: cache.obter("matriz", 3, falhar, 1)
+        except RuntimeError as e: erros.append(e)
+    t = threading.Thread(target=lider)
+    t.start()
+    iniciou.wait()
+    assert cache.obter("matriz", 3, lambda: [1, 2], 1) == [1, 2]  # recalcula depois da falha
+    t.join()
+    assert len(erros) == 1
+
+def test_resultado_de_versao_antiga_nao_entra():
+    cache = CacheResultados(versao=1)
+    def calcular_durante_troca():
+        cache.limpar(2)  # sincronizar_versao publicou a versão 2 durante o cálculo
+        return {"versao": 1}
+    assert cache.obter("dashboard", 1, calcular_durante_troca, 1) == {"versao": 1}
+    assert cache.estatisticas()["entradas"] == 0
+    assert cache.obter("dashboard", 1, lambda: {"versao": 0}, 0) == {"versao": 0}  # versão já substituída
+    assert cache.estatisticas()["entradas"] == 0
+
+    assert cache.obter("dashboard", 1, lambda: {"versao": 2}, 2) == {"versao": 2}
+    assert cache.obter("dashboard", 1, lambda: pytest.fail("deveria vir do cache"), 2) == {"versao": 2}
+    cache.limpar(3)
+    assert cache.estatisticas()["entradas"] == 0 and cache.estatisticas()["bytes"] == 0
@@ -0,0 +1,111 @@
+import random
+import numpy as np
+import pytest
+from motor_correcao import (N_QUESTOES, N_BYTES_BITS, respostas_para_matriz, montar_gabaritos, corrigir,
+                            corrigir_respostas, indices_caderno, empacotar, desempacotar, contar_bits,
+                            bits_para_bytes, bytes_para_bits)
+from referencia import corrigir_alunos
+
+def gabarito(texto):
+    return list(texto)
+
+# Caderno 1: letras; 2: anuladas X/Z/* (e x minúsculo) e uma posição em branco;
+# 3: gabarito curto (90 posições) em minúsculas
+GABARITOS = {
+    1: gabarito("ABCDE" * 20),
+    2: gabarito("X" + "BCDE" * 12 + "Z" + "*" + " " + "x" + "ABCD" * 11 + "A"),
+    3: gabarito(("abcde" * 18)),
+}
+
+CASOS = [
+    ("ABCDE" * 20, 1),                  # tudo certo
+    ("abcde" * 20, 1),                  # minúsculas valem
+    ("EDCBA" * 20, 1),                  # quase tudo errado
+    (" " * 100, 1),                     # em branco
+    ("." * 50 + "ABCDE" * 10, 1),       # rasuras
+    ("ABC", 1),                         # resposta curta
+    ("", 1),                            # vazia
+    (None, 1),                          # nula
+    ("ABCDE" * 24, 1),                  # além de 100 posições
+    ("?" * 100, 2),                     # anuladas contam como acerto
+    ("B" * 100, 2),
+    (" " * 100, 2),                     # branco do aluno diante do branco do gabarito
+    ("ABCDE" * 20, 3),                  # posições 91-100 sem gabarito nunca são acerto
+    ("abcde" * 20, 3),
+    ("ABCDE" * 20, 99),                 # caderno desconhecido: fora
+]
+
+def comparar(casos, gabarito_map):
+    gabaritos = montar_gabaritos(gabarito_map)
+    acertos, validos = corrigir_respostas([r for r, _ in casos], [c for _, c in casos], gabaritos)
+    esperado = corrigir_alunos(casos, gabarito_map)
+    np.testing.assert_array_equal(validos, [v for _, v in esperado])
+    np.testing.assert_array_equal(acertos, [a for a, _ in esperado])
+    return acertos, validos
+
+def test_casos_de_borda_iguais_a_referencia():
+    acertos, validos = comparar(CASOS, GABARITOS)
+    assert acertos[0].all() and acertos[1].all()
+    assert acertos[9].sum() == 4  # só as anuladas (X, Z, * e x)
+    assert not acertos[12][90:].any()
+    assert not validos[-1] and not acertos[-1].any()
+
+def test_aleatorio_igual_a_referencia():
+    rng = random.Random(360)
+    simbolos = "ABCDEabcde .*XZ"
+    gabarito_map = {c: gabarito("".join(rng.choice("ABCDEXZ* abcde") for _ in range(rng.choice([80, 99, 100]))))
+                    for c in [10, 20, 30]}
+    casos = [("".join(rng.choice(simbolos) for _ in range(rng.choice([0, 40, 100, 120]))), rng.choice([10, 20, 30, 40]))
+             for _ in range(500)]
+    comparar(casos, gabarito_map)
+
+def test_respostas_para_matriz():
+    matriz = respostas_para_matriz(["abc", None, "Z" * 120])
+    assert matriz.shape == (3, N_QUESTOES) and matriz.dtype == np.uint8
+    assert bytes(matriz[0, :4]) == b"ABC "
+    assert bytes(matriz[1]) == b" " * N_QUESTOES
+    assert bytes(matriz[2]) == b"Z" * N_QUESTOES
+
+def test_montar_gabaritos_e_indices():
+    gabaritos = montar_gabaritos(GABARITOS)
+    assert gabaritos.cadernos.tolist() == [1, 2, 3]
+    assert gabaritos.anuladas[1, [0, 49, 50, 52]].all() and gabaritos.anuladas[1].sum() == 4
+    assert (gabaritos.respostas[2, 90:] == 0).all()  # posição sem gabarito: byte 0
+    idx, conhecidos = indices_caderno([3, 99, 1], gabaritos)
+    assert idx[0] == 2 and idx[2] == 0
+    assert conhecidos.tolist() == [True, False, True]
+    vazio = montar_gabaritos({})
+    assert corrigir(respostas_para_matriz(["A"]), [1], vazio)[1].tolist() == [False]
+
+def test_empacotar_ida_e_volta():
+    acertos, validos = comparar(CASOS, GABARITOS)
+    bits = empacotar(acertos)
+    assert bits.shape == (len(CASOS), N_BYTES_BITS)
+    np.testing.assert_array_equal(desempacotar(bits), acertos)
+    np.testing.assert_array_equal(contar_bits(bits), acertos.sum(axis=1))
+
+    valores = bits_para_bytes(bits, validos)
+    assert valores[-1] is None and all(len(v) == N_BYTES_BITS for v in valores[:-1])
+    lidos, presentes = bytes_para_bits(valores)
+    np.testing.assert_array_equal(presentes, validos)
+    np.testing.assert_array_equal(lidos[presentes], bits[validos])
+    assert not lidos[~presentes].any()
+
+@pytest.mark.parametrize("nativo", [True, False], ids=["bitwise_count", "tabela"])
+def test_contar_bits_igual_a_soma_da_matriz(monkeypatch, nativo):
+    if nativo and not hasattr(np, "bitwise_count"):
+        pytest.skip("NumPy sem np.bitwise_count")
+    if not nativo:
+        monkeypatch.delattr(np, "bitwise_count", raising=False)
+    rng = np.random.default_rng(20)
+    acertos = rng.random((1000, N_QUESTOES)) < 0.6
+    validos = rng.random(1000) < 0.9
+    acertos &= validos[:, None]
+    bits, presentes = bytes_para_bits(bits_para_bytes(empacotar(acertos), validos))
+    np.testing.assert_array_equal(contar_bits(bits), acertos.sum(axis=1))
+    np.testing.assert_array_equal(contar_bits(bits).sum(), acertos.sum())
+    # bits em comum com uma máscara de questões (somas por tema)
+    mascara = empacotar(rng.random(N_QUESTOES) < 0.3)
+    np.testing.assert_array_equal(contar_bits(bits & mascara), (acertos & desempacotar(mascara)).sum(axis=1))
+    np.testing.assert_array_equal(contar_bits(np.arange(256, dtype=np.uint8)[:, None]),
+                                  [bin(b).count("1") for b in range(256)])
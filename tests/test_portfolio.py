@@ -0,0 +1,64 @@
+import pandas as pd
+from portfolio import CasadorPortfolio, IndicePortfolio, casar_mapeamento, termos, termos_equivalentes, MAX_CASOS
+
+CASOS = pd.DataFrame([
+    ("Endocrinologia", "Diabetes Mellitus Tipo II"),
+    ("Endocrinologia", "Diabetes Mellitus Tipo I"),
+    ("Obstetrícia", "Gestação de alto risco"),
+    ("Obstetrícia", "Diabetes Gestacional"),
+    ("Gastroenterologia", "Diverticulite Aguda"),
+    ("Otorrinolaringologia", "Rinossinusite Aguda"),
+    ("Pneumologia", "Tuberculose"),
+    ("Clínica Médica", "Hipertensão Arterial Sistêmica"),
+    ("Cardiologia", "Hipertensão Arterial Sistêmica"),
+    ("Pediatria", "Icterícia neonatal"),
+], columns=["subespecialidade", "diagnostico"])
+
+def diagnosticos(casados):
+    return [diag for _, diag, _ in casados]
+
+def test_termos():
+    assert termos("Diabetes mellitus tipo 2") == termos("DIABETES MELLITUS TIPO II") == {"DIABETES", "MELLITUS", "TIPO", "2"}
+    assert termos("Endometriose +1") == {"ENDOMETRIOSE"}
+    assert termos("Icterícia do recém-nascido") == {"ICTERICIA", "RECEM", "NASCIDO"}
+    assert not termos_equivalentes("GESTACIONAL", "GESTACAO")
+    assert termos_equivalentes("PREMATURA", "PREMATURO")
+    assert termos_equivalentes("PNEUMONIA", "PNEUMNIA")  # erro de digitação
+
+def test_casos_documentados():
+    casador = CasadorPortfolio(CASOS)
+    tipo2 = casador.casar("Endocrinologia", "Diabetes mellitus tipo 2")
+    assert tipo2[0] == ("Endocrinologia", "Diabetes Mellitus Tipo II", 1.0)
+    assert "Diabetes Mellitus Tipo I" not in diagnosticos(tipo2)[:1]
+
+    # GESTACIONAL não equivale a GESTACAO
+    assert "Gestação de alto risco" not in diagnosticos(casador.casar("Obstetrícia", "Diabetes gestacional"))
+    assert diagnosticos(casador.casar("Obstetrícia", "Diabetes gestacional"))[0] == "Diabetes Gestacional"
+
+    # AGUDA é qualificador: não basta para casar doenças diferentes
+    diverticulite = diagnosticos(casador.casar("Gastroenterologia", "Diverticulite aguda"))
+    assert diverticulite[0] == "Diverticulite Aguda" and "Rinossinusite Aguda" not in diverticulite
+    assert casador.casar("Cirurgia", "Apendicite aguda") == []
+
+    # O diagnóstico cobre o caso inteiro
+    assert diagnosticos(casador.casar("Infectologia", "Tuberculose em Sistema Prisional")) == ["Tuberculose"]
+
+def test_empate_favorece_mesma_subespecialidade():
+    casador = CasadorPortfolio(CASOS)
+    for sub in ("Cardiologia", "Clínica Médica"):
+        casados = casador.casar(sub, "Hipertensão arterial sistêmica")
+        assert casados[0][0] == sub and casados[0][2] == casados[1][2]
+        assert len(casados) <= MAX_CASOS
+
+def test_casar_mapeamento_e_indice():
+    pares = [("Endocrinologia", "Diabetes mellitus tipo 2"), ("Cirurgia", "Apendicite aguda"),
+             ("Endocrinologia", "Diabetes mellitus tipo 2")]
+    linhas = casar_mapeamento(pares, CASOS)
+    assert {l["diagnostico"] for l in linhas} == {"Diabetes mellitus tipo 2"}
+    assert [l["posicao"] for l in linhas] == list(range(1, len(linhas) + 1))
+
+    df_mapa = pd.DataFrame(pares, columns=["subespecialidade", "diagnostico"])
+    indice = IndicePortfolio(linhas, df_mapa)
+    assert indice.casos_de("Endocrinologia", "Diabetes mellitus tipo 2")[0]["diagnostico"] == "Diabetes Mellitus Tipo II"
+    assert indice.casos_de("Cirurgia", "Apendicite aguda") == []
+    assert indice.cobertura == {"questoes": 66.7, "diagnosticos": 50.0, "diagnosticos_cobertos": 1, "diagnosticos_total": 2}
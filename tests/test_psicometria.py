@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+from motor_correcao import N_QUESTOES, montar_gabaritos, respostas_para_matriz, corrigir
+from psicometria import EstatisticasQuestoes, ALTERNATIVAS, OUTRAS, registros
+
+def preparar():
+    rng = np.random.default_rng(22)
+    gabarito_map = {c: list("".join(rng.choice(list(ALTERNATIVAS), N_QUESTOES))) for c in (1, 2)}
+    gabarito_map[2][9] = "X"  # anulada: todos acertam, discriminação indefinida
+    gabaritos = montar_gabaritos(gabarito_map)
+    n = 900
+    co_cursos = np.sort(rng.choice([11, 12, 13], n))
+    co_cadernos = rng.choice([1, 2, 7], n, p=[0.45, 0.45, 0.1])  # 7: sem gabarito
+    habilidade = rng.normal(0, 1, n)
+    dificuldade = rng.normal(0, 1, N_QUESTOES)
+    acerta = rng.random((n, N_QUESTOES)) < 1 / (1 + np.exp(-(habilidade[:, None] - dificuldade)))
+    respostas = []
+    for i in range(n):
+        gab = gabarito_map.get(co_cadernos[i], gabarito_map[1])
+        linha = [g if a else rng.choice(list("ABCDE .")) for g, a in zip(gab, acerta[i])]
+        respostas.append("".join(linha).lower() if i % 10 == 0 else "".join(linha))
+    matriz = respostas_para_matriz(respostas)
+    mapa = pd.DataFrame([(c, q, f"Area {q % 3}", f"Sub {q % 5}", f"Diag {q}") for c in (1, 2, 7) for q in range(1, N_QUESTOES + 1)],
+                        columns=["co_caderno", "nu_questao", "grande_area", "subespecialidade", "diagnostico"])
+    lotes = [(co_cursos[i:i + 250], co_cadernos[i:i + 250], matriz[i:i + 250]) for i in range(0, n, 250)]
+    return EstatisticasQuestoes(gabaritos, mapa, lotes), gabaritos, co_cursos, co_cadernos, matriz
+
+def esperado(gabaritos, co_cadernos, matriz, caderno, questao):
+    """Dificuldade, ponto-bisserial corrigida (np.corrcoef) e proporções, aluno por aluno."""
+    alunos = co_cadernos == caderno
+    acertos, _ = corrigir(matriz[alunos], co_cadernos[alunos], gabaritos)
+    x = acertos[:, questao].astype(float)
+    resto = acertos.sum(axis=1) - x
+    discriminacao = np.corrcoef(x, resto)[0, 1] if x.std() > 0 and resto.std() > 0 else np.nan
+    marcadas = [np.mean(matriz[alunos, questao] == ord(l)) for l in ALTERNATIVAS]
+    return alunos.sum(), x.mean(), discriminacao, marcadas
+
+def conferir(tabela, gabaritos, co_cadernos, matriz):
+    assert set(tabela["co_caderno"]) == {1, 2}  # caderno sem gabarito fica fora
+    for linha in tabela.itertuples():
+        alunos, p, r, marcadas = esperado(gabaritos, co_cadernos, matriz, linha.co_caderno, linha.nu_questao - 1)
+        assert linha.alunos == alunos
+        assert linha.dificuldade == round(p, 4)
+        if np.isnan(r):
+            assert np.isnan(linha.discriminacao)
+        else:
+            assert abs(linha.discriminacao - r) <= 5e-5
+        for letra, proporcao in zip(ALTERNATIVAS, marcadas):
+            assert getattr(linha, letra) == round(proporcao, 4)
+        assert abs(getattr(linha, OUTRAS) - (1 - sum(marcadas))) <= 1e-4
+
+def test_nacional_igual_a_corrcoef():
+    estatisticas, gabaritos, _, co_cadernos, matriz = preparar()
+    tabela = estatisticas.tabela_nacional
+    assert len(tabela) == 2 * N_QUESTOES
+    conferir(tabela, gabaritos, co_cadernos, matriz)
+    anulada = tabela[(tabela["co_caderno"] == 2) & (tabela["nu_questao"] == 10)].iloc[0]
+    assert anulada["anulada"] and anulada["dificuldade"] == 1 and np.isnan(anulada["discriminacao"])
+    assert (tabela["discriminacao"].dropna() > 0).mean() > 0.9  # itens alinhados à habilidade
+    linhas = registros(tabela)
+    assert all(set(linha["alternativas"]) == set(ALTERNATIVAS) | {OUTRAS} for linha in linhas)
+    assert linhas[anulada.name]["discriminacao"] is None  # NaN vira null no JSON
+
+def test_curso_igual_a_corrcoef():
+    estatisticas, gabaritos, co_cursos, co_cadernos, matriz = preparar()
+    tabela = estatisticas.tabela_curso(12)
+    do_curso = co_cursos == 12
+    conferir(tabela, gabaritos, np.where(do_curso, co_cadernos, -1), matriz)
+    assert (tabela["dificuldade_nacional"].to_numpy() == estatisticas.tabela_nacional["dificuldade"].to_numpy()).all()
+    assert estatisticas.tabela_curso(99) is None
+    assert len(estatisticas) == int(np.isin(co_cadernos, [1, 2]).sum())
@@ -0,0 +1,23 @@
+from relatorio_pdf import renderizar_pdf, renderizar_lote, sanitizar_texto
+
+def test_dados_pdf_avulso_igual_ao_lote(api):
+    main, cliente = api
+    cursos = [item["co_curso"] for item in cliente.get("/ranking?tamanho=8").json()["itens"]]
+    lote = main.com_sessao(main.dados_pdf_lote, cursos)
+    assert [dados["co_curso"] for dados in lote] == cursos
+    for dados in lote:
+        assert main.com_sessao(main.dados_pdf, dados["co_curso"]) == dados
+
+def test_renderizar_pdf_e_lote(api):
+    main, cliente = api
+    cursos = [item["co_curso"] for item in cliente.get("/ranking?tamanho=2").json()["itens"]]
+    lote = main.com_sessao(main.dados_pdf_lote, cursos)
+    pdfs = renderizar_lote(lote)
+    assert len(pdfs) == 2
+    assert all(pdf.startswith(b"%PDF") for pdf in pdfs)
+    assert renderizar_pdf(lote[0]).startswith(b"%PDF")
+
+def test_sanitizar_texto():
+    assert sanitizar_texto("“São Paulo” – Conceito 5") == '"São Paulo" - Conceito 5'
+    assert sanitizar_texto("Emoji 🩺") == "Emoji ?"
+    assert sanitizar_texto(5) == "5"
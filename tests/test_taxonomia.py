@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+from motor_correcao import N_QUESTOES, montar_gabaritos, corrigir_respostas, indices_caderno, empacotar
+from taxonomia import IndiceTaxonomia, NIVEIS
+
+AREAS = ["Clínica", "Cirurgia", "Pediatria"]
+
+def mapa_sintetico(cadernos, rng, duplicado=False):
+    linhas = []
+    for caderno in cadernos:
+        for q in range(1, N_QUESTOES + 1):
+            if q % 17 == 0: continue  # questões sem mapeamento
+            area = AREAS[(q + caderno) % 3]
+            sub = None if q % 23 == 0 else f"{area}-{q % 4}"  # chave nula sai do groupby
+            linhas.append((caderno, q, area, sub, f"{sub}-d{q % 2}" if sub else None))
+    linhas += [(99, 1, "Clínica", "Clínica-0", "x"), (cadernos[0], 101, "Clínica", "Clínica-0", "x")]  # fora do índice
+    if duplicado:
+        linhas.append(linhas[4])                                 # mesma questão, mesmo grupo
+        linhas.append((cadernos[1], 3, "Pediatria", "Pediatria-9", "Pediatria-9-d0"))  # questão em dois grupos
+    return pd.DataFrame(linhas, columns=["co_caderno", "nu_questao"] + NIVEIS["diagnostico"])
+
+def preparar(duplicado):
+    rng = np.random.default_rng(11)
+    gabarito_map = {c: list("".join(rng.choice(list("ABCDE"), N_QUESTOES))) for c in (1, 2, 3)}
+    gabaritos = montar_gabaritos(gabarito_map)
+    respostas = ["".join(rng.choice(list("ABCDE"), N_QUESTOES)) for _ in range(300)]
+    co_cadernos = rng.choice([1, 2, 3], 300)
+    acertos, _ = corrigir_respostas(respostas, co_cadernos, gabaritos)
+    mapa = mapa_sintetico([1, 2, 3], rng, duplicado)
+    return IndiceTaxonomia(mapa, gabaritos), mapa, acertos, co_cadernos, indices_caderno(co_cadernos, gabaritos)[0]
+
+def formato_longo(acertos, co_cadernos, mapa):
+    """O caminho original: melt dos acertos (alunos x 100 linhas) + merge com o mapa."""
+    colunas_q = list(range(1, N_QUESTOES + 1))
+    df = pd.DataFrame(acertos.astype(int), columns=colunas_q)
+    df.insert(0, "co_caderno", co_cadernos)
+    df.insert(0, "aluno", np.arange(len(df)))
+    df_long = df.melt(id_vars=["aluno", "co_caderno"], value_vars=colunas_q, var_name="nu_questao", value_name="acerto")
+    df_long["nu_questao"] = pd.to_numeric(df_long["nu_questao"]).astype(int)
+    return pd.merge(df_long, mapa, on=["nu_questao", "co_caderno"], how="inner")
+
+def alinhar(indice, nivel, agrupado):
+    """Reindexa o groupby do pandas na ordem dos rótulos do índice."""
+    chave = pd.MultiIndex.from_frame(indice.rotulos[nivel]) if len(NIVEIS[nivel]) > 1 else indice.rotulos[nivel][NIVEIS[nivel][0]]
+    return agrupado.reindex(chave).to_numpy()
+
+@pytest.mark.parametrize("duplicado", [False, True], ids=["unico", "duplicado"])
+@pytest.mark.parametrize("nivel", list(NIVEIS))
+def test_somas_iguais_ao_melt_merge(duplicado, nivel):
+    indice, mapa, acertos, co_cadernos, idx = preparar(duplicado)
+    assert indice.exato[nivel] is (not duplicado)
+    chaves = NIVEIS[nivel]
+    agrupado = formato_longo(acertos, co_cadernos, mapa).groupby(chaves)["acerto"].agg(["sum", "count"])
+
+    acertos_grupo, total_grupo = indice.somas(acertos, idx, nivel)
+    np.testing.assert_array_equal(acertos_grupo, alinhar(indice, nivel, agrupado["sum"]))
+    np.testing.assert_array_equal(total_grupo, alinhar(indice, nivel, agrupado["count"]))
+
+    volume = mapa[mapa["co_caderno"].isin([1, 2, 3]) & mapa["nu_questao"].between(1, N_QUESTOES)].groupby(chaves)["nu_questao"].nunique()
+    np.testing.assert_array_equal(indice.volume_questoes(idx, nivel), alinhar(indice, nivel, volume))
+
+@pytest.mark.parametrize("duplicado", [False, True], ids=["unico", "duplicado"])
+@pytest.mark.parametrize("nivel", list(NIVEIS))
+def test_somas_bits_iguais_a_somas(duplicado, nivel):
+    indice, mapa, acertos, co_cadernos, idx = preparar(duplicado)
+    por_aluno, total_aluno = indice.somas_bits(empacotar(acertos), idx, nivel)
+    np.testing.assert_array_equal(por_aluno.sum(axis=0), indice.somas(acertos, idx, nivel)[0])
+    np.testing.assert_array_equal(total_aluno.sum(axis=0), indice.somas(acertos, idx, nivel)[1])
+
+    # aluno a aluno, igual ao groupby do formato longo
+    agrupado = formato_longo(acertos, co_cadernos, mapa).groupby(["aluno"] + NIVEIS[nivel])["acerto"].sum()
+    for aluno in (0, 1, 150, 299):
+        np.testing.assert_array_equal(np.nan_to_num(alinhar(indice, nivel, agrupado.loc[aluno])), por_aluno[aluno])
+
+def test_mapa_vazio_e_sem_mapeamento():
+    gabaritos = montar_gabaritos({1: list("A" * N_QUESTOES)})
+    indice = IndiceTaxonomia(pd.DataFrame(), gabaritos)
+    idx = np.zeros(3, dtype=np.intp)
+    assert not indice.questoes_mapeadas(idx).any()
+    acertos, total = indice.somas(np.ones((3, N_QUESTOES), dtype=bool), idx, "grande_area")
+    assert acertos.shape == total.shape == (0,)